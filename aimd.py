@@ -0,0 +1,111 @@
+"""
+Adaptive Concurrency
+AIMD (additive increase, multiplicative decrease) limit for Groq calls: the allowed
+number of in-flight requests grows while latency and errors stay healthy and is cut on
+429s, error bursts or latency spikes. The scheduler hands out the slots.
+"""
+
+import time
+from collections import deque
+
+from metrics import metrics
+
+
+class AIMDLimiter:
+    """Concurrency limit tuned by AIMD - slots are taken with try_acquire() and returned with release()"""
+
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0, decrease=0.5,
+                 latency_tolerance=2.0, error_threshold=0.2, cooldown=1.0, window=50,
+                 metric_prefix='groq'):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.metric_prefix = metric_prefix
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.on_change = None
+        self._outcomes = deque(maxlen=window)
+        self._last_decrease = 0.0
+        self._publish()
+
+    @classmethod
+    def fixed(cls, limit, **options):
+        """A limiter that never moves - same interface as the adaptive one"""
+        return cls(initial=limit, minimum=limit, maximum=limit, increase=0.0, decrease=1.0, **options)
+
+    def _publish(self):
+        metrics.set_gauge(f"{self.metric_prefix}_concurrency_limit", int(self.limit))
+        metrics.set_gauge(f"{self.metric_prefix}_in_flight", self.in_flight)
+
+    def _changed(self):
+        self._publish()
+        if self.on_change is not None:
+            self.on_change()
+
+    # ==================== SLOTS ====================
+    def available(self, reserve=0):
+        """Free slots, keeping `reserve` of the current limit back"""
+        return int(self.limit) - reserve - self.in_flight
+
+    def try_acquire(self, reserve=0):
+        """Take a slot if one is free above the reserve"""
+        if self.available(reserve) <= 0:
+            return False
+        self.in_flight += 1
+        self._publish()
+        return True
+
+    def release(self, notify=True):
+        """Return a slot - notify=False skips on_change (used when a grant is rolled back)"""
+        self.in_flight -= 1
+        if notify:
+            self._changed()
+        else:
+            self._publish()
+
+    # ==================== FEEDBACK ====================
+    def _cut(self, reason):
+        """Multiplicative decrease, at most once per cooldown so one burst counts once"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        metrics.inc(f"{self.metric_prefix}_concurrency_decreases_{reason}")
+        self._publish()
+
+    def _error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def on_success(self, latency):
+        """Healthy response - grow the limit by about `increase` per round trip"""
+        self._outcomes.append(True)
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        elif latency > self.baseline_latency * self.latency_tolerance:
+            self._cut('latency')
+            return
+        else:
+            # Slow-moving baseline so a gradual rise doesn't become the new normal too fast
+            self.baseline_latency = 0.95 * self.baseline_latency + 0.05 * latency
+
+        self.limit = min(self.maximum, self.limit + self.increase / max(1.0, self.limit))
+        self._changed()
+
+    def on_throttle(self):
+        """429 from the provider"""
+        self._outcomes.append(False)
+        self._cut('throttle')
+
+    def on_error(self):
+        """Timeout or 5xx - only cut once errors are a real share of recent calls"""
+        self._outcomes.append(False)
+        if self._error_rate() >= self.error_threshold:
+            self._cut('errors')
@@ -0,0 +1,353 @@
+"""
+Listing Generation API
+HTTP service for the listing platform over the same generation functions as the UI.
+
+    python api_service.py --port 8000
+    uvicorn api_service:app --port 8000 --workers 1
+
+    POST /v1/generate        {"property": {...}, "provider": "groq", "variation_seed": 0}
+    POST /v1/enhance         {"property": {...}, "description": "...", "style": "...", "length": "..."}
+    POST /v1/batch           {"listings": [{...}, ...], "provider": "groq", "languages": ["hi"]}  -> 202 + job id
+    GET  /v1/jobs/{job_id}   batch job status and, once done, its results
+    GET  /healthz, /metrics
+
+The provider key comes from the X-Provider-Key header or the provider's environment
+variable; X-Tenant names the caller for fair scheduling of batch work. Identical in-flight
+generate/enhance requests share one upstream call. When the work queues are full the
+service answers 429 with a Retry-After estimated from the queue and recent service times.
+Jobs live in this process's memory - run one uvicorn worker per replica.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from generation import generate_batch_with_groq, generate_description, generate_enhanced_description
+from listing import Listing, listing_key
+from metrics import metrics
+from providers import DEFAULT_PROVIDER, get_provider
+from quota import key_id
+from scheduler import DEFAULT_TENANT
+from translation import LANGUAGES
+
+API_WORKERS = int(os.environ.get("API_WORKERS", "16"))
+API_QUEUE_LIMIT = int(os.environ.get("API_QUEUE_LIMIT", "64"))
+BATCH_WORKERS = int(os.environ.get("API_BATCH_WORKERS", "2"))
+BATCH_QUEUE_LIMIT = int(os.environ.get("API_BATCH_QUEUE_LIMIT", "8"))
+# Set API_RECORD_HISTORY=0 to keep batch listings out of the generation history (load tests)
+RECORD_HISTORY = os.environ.get("API_RECORD_HISTORY", "1") != "0"
+MAX_BATCH_LISTINGS = 500
+# Finished jobs are forgotten after this many seconds
+JOB_TTL = 3600.0
+
+
+class Overloaded(Exception):
+    """Work queue is full - retry_after is the suggested wait in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# ==================== WORKER POOL ====================
+class WorkerPool:
+    """
+    Fixed set of asyncio workers draining a bounded queue. The generation functions block,
+    so each worker runs its item on a dedicated thread while the event loop keeps serving.
+    """
+
+    def __init__(self, name, workers, limit):
+        self.name = name
+        self.workers = workers
+        self.limit = limit
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+        # Smoothed seconds per item, for Retry-After
+        self._service_time = 1.0
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.limit)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"api-{self.name}")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def retry_after(self):
+        """Seconds until a new item would likely get a worker"""
+        return max(1, math.ceil((self.depth() + 1) * self._service_time / self.workers))
+
+    def submit(self, function, *args):
+        """Queue a blocking call - returns a future, raises Overloaded when the queue is full"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((function, args, future))
+        except asyncio.QueueFull:
+            metrics.inc(f"api_{self.name}_rejected_total")
+            raise Overloaded(self.retry_after())
+        metrics.set_gauge(f"api_{self.name}_queue", self.depth())
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            function, args, future = await self._queue.get()
+            metrics.set_gauge(f"api_{self.name}_queue", self.depth())
+            if future.cancelled():
+                continue
+            started = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self._executor, function, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            elapsed = time.monotonic() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            metrics.observe(f"api_{self.name}_service_seconds", elapsed)
+
+
+class Coalescer:
+    """Identical in-flight requests await one shared future instead of each calling upstream"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, start):
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.inc("api_coalesced_total")
+        else:
+            future = start()
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._inflight.pop(key, None))
+        # A caller that disconnects must not cancel the work the others are waiting on
+        return await asyncio.shield(future)
+
+
+# ==================== STATE ====================
+interactive_pool = WorkerPool('interactive', API_WORKERS, API_QUEUE_LIMIT)
+batch_pool = WorkerPool('batch', BATCH_WORKERS, BATCH_QUEUE_LIMIT)
+coalescer = Coalescer()
+jobs = {}
+
+
+def _error(status, message, headers=None):
+    return JSONResponse({'error': message}, status_code=status, headers=headers)
+
+
+def _overloaded(error):
+    return _error(429, "Too many requests in flight - retry later", {'Retry-After': str(error.retry_after)})
+
+
+def _property(data):
+    """Normalized property_data from a request body - ValueError when fields are missing or malformed"""
+    if not isinstance(data, dict):
+        raise ValueError("property must be an object")
+    try:
+        return Listing.from_property_data(data).to_property_data()
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid property: {e}")
+
+
+def _seed(body):
+    """variation_seed from a request body - ValueError unless it is an integer"""
+    try:
+        return int(body.get('variation_seed', 0))
+    except (TypeError, ValueError):
+        raise ValueError("variation_seed must be an integer")
+
+
+def _provider(body):
+    """Provider name from the request - 'template' for the no-API generator"""
+    name = body.get('provider') or DEFAULT_PROVIDER
+    if not isinstance(name, str):
+        raise ValueError("provider must be a string")
+    if name != 'template' and get_provider(name) is None:
+        raise ValueError(f"Unknown provider: {name}")
+    return name
+
+
+async def _body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ValueError("Body must be JSON")
+    if not isinstance(body, dict):
+        raise ValueError("Body must be a JSON object")
+    return body
+
+
+def _expire_jobs():
+    cutoff = time.time() - JOB_TTL
+    for job_id in [job_id for job_id, job in jobs.items() if job.get('finished_at') and job['finished_at'] < cutoff]:
+        del jobs[job_id]
+
+
+# ==================== ENDPOINTS ====================
+async def generate(request):
+    try:
+        body = await _body(request)
+        property_data = _property(body.get('property'))
+        provider = _provider(body)
+        seed = _seed(body)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    api_key = request.headers.get('x-provider-key')
+    key = ('generate', listing_key(property_data), seed, provider, key_id(api_key) if api_key else '')
+    try:
+        result = await coalescer.run(key, lambda: interactive_pool.submit(
+            generate_description, property_data, provider, api_key, seed))
+    except Overloaded as e:
+        return _overloaded(e)
+    metrics.inc("api_generate_total")
+    return JSONResponse({'result': result, 'listing_hash': key[1], 'variation_seed': seed})
+
+
+async def enhance(request):
+    try:
+        body = await _body(request)
+        property_data = _property(body.get('property'))
+        provider = _provider(body)
+        description = str(body.get('description') or '').strip()
+        if not description:
+            raise ValueError("description is required")
+    except ValueError as e:
+        return _error(400, str(e))
+
+    style = body.get('style', "More Detailed & Elaborate")
+    length = body.get('length', "Medium (200-250 words)")
+    api_key = request.headers.get('x-provider-key')
+    provider_config = get_provider(provider)
+    if provider_config is None or not provider_config.ready(api_key):
+        return _error(400, "Enhancement needs an LLM provider with a key")
+
+    key = ('enhance', listing_key(property_data), hash(description), style, length, provider,
+           key_id(api_key) if api_key else '')
+    try:
+        enhanced = await coalescer.run(key, lambda: interactive_pool.submit(
+            generate_enhanced_description, description, property_data, style, length, api_key, provider))
+    except Overloaded as e:
+        return _overloaded(e)
+    if enhanced is None:
+        return _error(502, "Enhancement failed upstream")
+    metrics.inc("api_enhance_total")
+    return JSONResponse({'enhanced_description': enhanced})
+
+
+async def submit_batch(request):
+    try:
+        body = await _body(request)
+        listings = body.get('listings')
+        if not isinstance(listings, list) or not listings:
+            raise ValueError("listings must be a non-empty list")
+        if len(listings) > MAX_BATCH_LISTINGS:
+            raise ValueError(f"At most {MAX_BATCH_LISTINGS} listings per batch")
+        listings = [_property(data) for data in listings]
+        provider = _provider(body)
+        seed = _seed(body)
+        languages = [code for code in body.get('languages') or () if isinstance(code, str) and code in LANGUAGES]
+    except (TypeError, ValueError) as e:
+        return _error(400, str(e))
+
+    api_key = request.headers.get('x-provider-key')
+    provider_config = get_provider(provider)
+    if provider_config is None or not provider_config.ready(api_key):
+        return _error(400, "Batch jobs need an LLM provider with a key")
+    tenant = request.headers.get('x-tenant') or DEFAULT_TENANT
+
+    _expire_jobs()
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'status': 'queued', 'listings': len(listings), 'tenant': tenant,
+           'created_at': time.time(), 'finished_at': None}
+
+    def _run():
+        job['status'] = 'running'
+        return generate_batch_with_groq(listings, api_key, seed, tenant=tenant, provider=provider,
+                                        record_history=RECORD_HISTORY, languages=languages or None)
+
+    try:
+        future = batch_pool.submit(_run)
+    except Overloaded as e:
+        return _overloaded(e)
+    jobs[job_id] = job
+
+    def _finish(done):
+        job['finished_at'] = time.time()
+        if done.cancelled() or done.exception() is not None:
+            job['status'] = 'failed'
+            job['error'] = 'cancelled' if done.cancelled() else str(done.exception())
+            return
+        results = done.result()
+        job['status'] = 'done'
+        job['results'] = results
+        job['generated'] = sum(result is not None for result in results)
+
+    future.add_done_callback(_finish)
+    metrics.inc("api_batch_jobs_total")
+    return JSONResponse({'job_id': job_id, 'status': 'queued', 'status_url': f"/v1/jobs/{job_id}"},
+                        status_code=202)
+
+
+async def job_status(request):
+    job = jobs.get(request.path_params['job_id'])
+    if job is None:
+        return _error(404, "Unknown job")
+    return JSONResponse(job)
+
+
+async def health(request):
+    return JSONResponse({'ok': True, 'queue': {'interactive': interactive_pool.depth(), 'batch': batch_pool.depth()},
+                         'jobs': len(jobs)})
+
+
+async def metrics_text(request):
+    return PlainTextResponse(metrics.render_text())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await interactive_pool.start()
+    await batch_pool.start()
+    yield
+    await interactive_pool.stop()
+    await batch_pool.stop()
+
+
+app = Starlette(routes=[
+    Route('/v1/generate', generate, methods=['POST']),
+    Route('/v1/enhance', enhance, methods=['POST']),
+    Route('/v1/batch', submit_batch, methods=['POST']),
+    Route('/v1/jobs/{job_id}', job_status, methods=['GET']),
+    Route('/healthz', health, methods=['GET']),
+    Route('/metrics', metrics_text, methods=['GET']),
+], lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Listing generation HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,296 @@
+"""
+App Load Test
+Simulates concurrent users of the Streamlit app against a real `streamlit run` server,
+with the mock Groq server behind it. Each user is a headless client speaking the
+frontend's websocket protocol: it fills the form, generates, regenerates, enhances and
+downloads. The run reports per-step rerun latency and payload size, the server
+process's CPU and RSS growth, API concurrency, and the sessions-per-core capacity that
+follows.
+
+    python app_load_test.py --users 20
+    python app_load_test.py --users 50 --think-time 2 --max-p95 2.5        (exit 1 when slower)
+
+AppTest can't stand in here - it swaps a process-wide runtime on every run, so its
+sessions can't run concurrently. A download click is a plain rerun, which is all a
+download_button click costs the server.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from benchmark import sample_listings
+from load_test import percentile
+from mock_groq import start_mock_server
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deepseek_python_20251126_9f83cf.py")
+STEPS = ('open', 'fill', 'generate', 'regenerate', 'enhance', 'download')
+# Share of a core the capacity estimate plans to use
+TARGET_UTILIZATION = 0.7
+RERUN_TIMEOUT = 120.0
+
+
+# ==================== SERVER PROCESS ====================
+def start_app_server(mock_url, scratch_dir, port=None):
+    """
+    `streamlit run` the app in a subprocess pointed at the mock - returns (process, base url).
+    History, result store and translation cache live in scratch_dir, away from ~/.airent.
+    """
+    if port is None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+    env = dict(os.environ, GROQ_API_URL=mock_url,
+               HISTORY_DB_PATH=os.path.join(scratch_dir, "history.db"),
+               RESULT_STORE_DIR=os.path.join(scratch_dir, "results"),
+               TRANSLATION_DB_PATH=os.path.join(scratch_dir, "translations.db"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_SCRIPT, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false", "--logger.level", "error"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{base_url}/_stcore/health", timeout=1).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    else:
+        process.terminate()
+        raise RuntimeError("Streamlit server did not come up")
+    return process, base_url
+
+
+def process_usage(pid):
+    """(CPU seconds, RSS bytes) of a process from procfs"""
+    with open(f"/proc/{pid}/stat") as stat:
+        # Fields after the parenthesised command name; utime and stime are the 12th and 13th
+        fields = stat.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    with open(f"/proc/{pid}/statm") as statm:
+        rss = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    return cpu, rss
+
+
+class ConcurrencyMonitor(threading.Thread):
+    """Samples the mock server's in-flight requests - peak and mean API concurrency"""
+
+    def __init__(self, mock, interval=0.02):
+        super().__init__(name="app-load-monitor", daemon=True)
+        self.mock = mock
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.samples.append(self.mock.in_flight)
+
+    def stop(self):
+        self._done.set()
+        self.join(1)
+
+
+# ==================== HEADLESS CLIENT ====================
+class HeadlessSession:
+    """
+    One browser tab. Like the frontend it remembers the widget values it has set and sends
+    them with every rerun; widget ids are picked up from the elements each run renders.
+    """
+
+    def __init__(self, base_url):
+        self.url = base_url.replace("http://", "ws://") + "/_stcore/stream"
+        self.widgets = {}
+        self.values = {}
+        self._socket = None
+
+    async def connect(self):
+        self._socket = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._socket is not None:
+            await self._socket.close()
+
+    def widget(self, label):
+        """Widget id by label (or label prefix) from the latest run"""
+        if label in self.widgets:
+            return self.widgets[label]
+        for name, widget_id in self.widgets.items():
+            if name.startswith(label):
+                return widget_id
+        raise KeyError(f"No widget labelled {label!r}")
+
+    def set(self, label, field, value):
+        """Change a widget - field is the WidgetState value field (string_value, int_value...)"""
+        self.values[self.widget(label)] = (field, value)
+
+    async def rerun(self, trigger=None):
+        """Run the script once - returns (seconds, bytes received); raises on a script exception"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        for widget_id, (field, value) in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+        if trigger is not None:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = self.widget(trigger)
+            state.trigger_value = True
+
+        started = time.perf_counter()
+        received = 0
+        await self._socket.send(message.SerializeToString())
+        while True:
+            data = await asyncio.wait_for(self._socket.recv(), RERUN_TIMEOUT)
+            received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    raise RuntimeError(element.exception.message)
+                proto = getattr(element, element_type)
+                if getattr(proto, 'id', '') and getattr(proto, 'label', ''):
+                    self.widgets[proto.label] = proto.id
+            elif kind == 'script_finished':
+                # st.rerun() ends a run early and starts the next one straight away
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return time.perf_counter() - started, received
+
+    async def click(self, label):
+        return await self.rerun(trigger=label)
+
+
+async def run_user(index, base_url, listing, api_key, think_time, measurements, errors, finished, hold):
+    """One simulated user through the whole flow - (seconds, bytes) per step go into measurements[step]"""
+    session = HeadlessSession(base_url)
+
+    async def _fill():
+        session.set("🔑 Groq API Key", 'string_value', api_key)
+        session.set("City *", 'string_value', listing['city'])
+        session.set("Locality *", 'string_value', listing['locality'])
+        session.set("Monthly Rent", 'int_value', listing['rent_amount'])
+        return await session.rerun()
+
+    steps = (('open', session.rerun), ('fill', _fill),
+             ('generate', lambda: session.click("🚀 Generate Premium")),
+             ('regenerate', lambda: session.click("🔄 Regenerate")),
+             ('enhance', lambda: session.click("✨ Generate Enhanced Version")),
+             ('download', session.rerun))
+    try:
+        await session.connect()
+        for name, step in steps:
+            measurements[name].append(await step())
+            if think_time:
+                await asyncio.sleep(think_time)
+    except Exception as e:
+        errors.append(f"user {index}: {type(e).__name__}: {e}")
+    finished.append(index)
+    # Stay connected until everyone is done, so session state counts towards RSS
+    await hold.wait()
+    await session.close()
+
+
+async def run_load(base_url, server_pid, users, ramp, think_time, api_key="gsk_load_test"):
+    """Run `users` concurrent sessions - returns the measurements dict"""
+    measurements = {step: [] for step in STEPS}
+    errors = []
+    finished = []
+    listings = sample_listings(users, seed=11)
+    hold = asyncio.Event()
+
+    cpu_before, rss_before = process_usage(server_pid)
+    started = time.perf_counter()
+    tasks = []
+    for index in range(users):
+        tasks.append(asyncio.create_task(
+            run_user(index, base_url, listings[index], api_key, think_time, measurements, errors, finished, hold)))
+        if ramp:
+            await asyncio.sleep(ramp / users)
+    while len(finished) < users:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    cpu_after, rss_after = process_usage(server_pid)
+    hold.set()
+    await asyncio.gather(*tasks)
+
+    return {'measurements': measurements, 'errors': errors, 'elapsed': elapsed, 'cpu': cpu_after - cpu_before,
+            'rss': rss_after, 'rss_growth': rss_after - rss_before,
+            'reruns': sum(len(values) for values in measurements.values())}
+
+
+def print_report(result, users, think_time, mock, monitor):
+    print(f"{users} sessions in {result['elapsed']:.1f}s, {len(result['errors'])} failed")
+    print(f"{'step':<12}{'reruns':>8}{'p50 s':>9}{'p95 s':>9}{'max s':>9}{'KiB':>9}")
+    for step, values in result['measurements'].items():
+        if values:
+            seconds = [value[0] for value in values]
+            size = sum(value[1] for value in values) / len(values) / 1024
+            print(f"{step:<12}{len(values):>8}{percentile(seconds, 0.5):>9.3f}{percentile(seconds, 0.95):>9.3f}"
+                  f"{max(seconds):>9.3f}{size:>9.0f}")
+
+    cpu_per_rerun = result['cpu'] / max(1, result['reruns'])
+    print(f"server CPU: {result['cpu']:.1f}s ({result['cpu'] / result['elapsed']:.2f} cores busy), "
+          f"{cpu_per_rerun * 1000:.0f} ms per rerun")
+    print(f"server RSS: {result['rss'] / 2 ** 20:.0f} MiB, +{result['rss_growth'] / 2 ** 20:.1f} MiB "
+          f"({result['rss_growth'] / users / 2 ** 10:.0f} KiB per session)")
+    samples = monitor.samples
+    print(f"API concurrency: peak {mock.max_in_flight}, mean {sum(samples) / max(1, len(samples)):.1f}, "
+          f"upstream calls {sum(1 for entry in mock.requests_log if entry['status'] == 200)}, "
+          f"throttled {sum(1 for entry in mock.requests_log if entry['status'] == 429)}")
+    # A session costs one rerun of server CPU every think_time seconds
+    sessions = think_time / cpu_per_rerun * TARGET_UTILIZATION if cpu_per_rerun else 0
+    print(f"capacity: ~{sessions:.0f} sessions per core at one interaction per {think_time:g}s "
+          f"({TARGET_UTILIZATION:.0%} CPU)")
+    for error in result['errors'][:5]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit app")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions start")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a user's steps")
+    parser.add_argument("--capacity-think-time", type=float, default=10.0,
+                        help="interaction interval assumed for the sessions-per-core estimate")
+    parser.add_argument("--time-scale", type=float, default=0.2, help="scale simulated model latency")
+    parser.add_argument("--throttle-rps", type=int, default=None)
+    parser.add_argument("--max-p95", type=float, default=None, help="exit 1 when any step's p95 exceeds this")
+    args = parser.parse_args()
+
+    mock = start_mock_server(time_scale=args.time_scale, throttle_rps=args.throttle_rps)
+    scratch = tempfile.TemporaryDirectory(prefix="airent-load-")
+    server, base_url = start_app_server(mock.url, scratch.name)
+    monitor = ConcurrencyMonitor(mock)
+    monitor.start()
+    try:
+        result = asyncio.run(run_load(base_url, server.pid, args.users, args.ramp, args.think_time))
+    finally:
+        monitor.stop()
+        server.terminate()
+        server.wait(10)
+        mock.shutdown()
+        scratch.cleanup()
+    print_report(result, args.users, args.capacity_think_time, mock, monitor)
+
+    slow = [step for step, values in result['measurements'].items() if values and args.max_p95 is not None
+            and percentile([value[0] for value in values], 0.95) > args.max_p95]
+    if slow:
+        print(f"REGRESSION: p95 above {args.max_p95}s for {', '.join(slow)}")
+    if slow or result['errors']:
+        sys.exit(1)
@@ -0,0 +1,359 @@
+"""
+Async Generation Engine
+One engine per LLM provider. Its traffic runs as asyncio tasks on a background event
+loop, bounded by the provider's concurrency limit and paced by its daily quota, with
+per-task timeouts and cancellation. Streamlit and other sync callers use the blocking
+facade (run / submit / cancel).
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+
+from aimd import AIMDLimiter
+from cassette import generation_call, transport_from_env
+from keyword_index import KEYWORD_SEED, keyword_index
+from metrics import metrics
+from prompts import VARIATION_PROMPTS, build_prompt, select_prompt_version
+from providers import DEFAULT_PROVIDER, LISTING_MODEL, get_provider
+from quota import QuotaExceeded, QuotaPlanner
+from scheduler import BATCH, DEFAULT_TENANT, INTERACTIVE, RequestScheduler
+from token_budget import token_budget
+
+# Batch work can afford to wait out throttling longer than an interactive click
+BATCH_RETRY_COUNT = 6
+
+
+def parse_json_content(content):
+    """Parse a JSON completion, stripping markdown code fences"""
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content.replace('```json', '').replace('```', '').strip()
+    elif content.startswith('```'):
+        content = content.replace('```', '').strip()
+    return json.loads(content)
+
+
+def variation_temperature(variation_seed):
+    """Sampling temperature for a variation seed"""
+    temperature = 0.8 + (variation_seed * 0.05)
+    if temperature > 1.0:
+        temperature = 0.8 + ((variation_seed % 3) * 0.05)
+    return temperature
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying a 429 - Retry-After when the provider sends one"""
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return (attempt + 1) * 2
+
+
+class GenerationEngine:
+    """
+    Concurrency-bounded asyncio engine for one provider's chat completion calls.
+    With provider.adaptive the bound is an AIMD limit between 1 and max_concurrency,
+    otherwise a fixed max_concurrency. Slots are handed out by the priority scheduler.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.api_url = provider.chat_url
+        self.max_concurrency = provider.max_concurrency
+        self.timeout = provider.timeout
+        # Record/replay transport under the HTTP client (LLM_CASSETTE) - None goes to the network
+        self.transport = transport_from_env(provider.name, provider.max_concurrency)
+        prefix = provider.name
+        if provider.adaptive:
+            self.limiter = AIMDLimiter(initial=min(4, self.max_concurrency), maximum=self.max_concurrency,
+                                       metric_prefix=prefix)
+        else:
+            self.limiter = AIMDLimiter.fixed(self.max_concurrency, metric_prefix=prefix)
+        self.scheduler = RequestScheduler(self.limiter, metric_prefix=prefix)
+        self.quota = QuotaPlanner(provider.daily_tokens, provider.daily_requests, metric_prefix=prefix)
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._tasks = set()
+        self._start_lock = threading.Lock()
+
+    # ==================== EVENT LOOP ====================
+    def _ensure_loop(self):
+        """Start the background event loop on first use"""
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name=f"generation-engine-{self.provider.name}",
+                                          daemon=True)
+                thread.start()
+                self._thread = thread
+                self._loop = loop
+        return self._loop
+
+    def _get_client(self):
+        """Shared HTTP client - created on the engine loop"""
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout, transport=self.transport)
+        return self._client
+
+    def set_transport(self, transport):
+        """Send this engine's requests through a cassette transport from now on (None for the network)"""
+        client, self._client = self._client, None
+        self.transport = transport
+        if client is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), self._loop)
+
+    # ==================== ASYNC API ====================
+    async def post(self, payload, api_key, timeout=None, priority=INTERACTIVE, tenant=DEFAULT_TENANT,
+                   budget_key=None, call=None):
+        """
+        One chat completion POST. "model" may be a logical role (LISTING_MODEL, EDIT_MODEL)
+        mapped through the provider. The call is booked against the daily quota (waiting out
+        batch pacing, QuotaExceeded when it can't fit), then waits for a scheduler slot.
+        call tags the request for a cassette transport (see cassette.generation_call).
+        """
+        payload = {**self.provider.extra_body, **payload,
+                   'model': self.provider.model(payload.get('model', LISTING_MODEL))}
+        # Keyless local servers still get their usage counted
+        quota_key = self.provider.resolve_key(api_key) or self.provider.name
+        estimated = self.quota.estimate(payload, budget_key)
+        while True:
+            delay = self.quota.try_reserve(quota_key, estimated, priority)
+            if not delay:
+                break
+            await asyncio.sleep(delay)
+
+        usage = None
+        try:
+            response = await self._send(payload, api_key, timeout, priority, tenant, call)
+            if response.status_code == 200:
+                try:
+                    usage = response.json().get('usage')
+                except ValueError:
+                    pass
+                # Prompt tokens the server served from its prefix cache, where it reports them
+                cached = ((usage or {}).get('prompt_tokens_details') or {}).get('cached_tokens')
+                if cached:
+                    metrics.inc(f"{self.provider.name}_cached_prompt_tokens_total", cached)
+            return response
+        finally:
+            prompt_chars = sum(len(message.get('content', '')) for message in payload.get('messages', []))
+            self.quota.settle(quota_key, estimated, usage, priority, prompt_chars)
+
+    async def _send(self, payload, api_key, timeout, priority, tenant, call=None):
+        """POST inside a scheduler slot, feeding the outcome to the concurrency limiter"""
+        prefix = self.provider.name
+        async with self.scheduler.slot(priority, tenant):
+            started = time.monotonic()
+            try:
+                response = await self._get_client().post(
+                    self.api_url,
+                    headers=self.provider.headers(api_key),
+                    json=payload,
+                    timeout=timeout or self.timeout,
+                    extensions={'cassette_call': call} if call and self.transport is not None else None
+                )
+            except (httpx.TimeoutException, httpx.TransportError):
+                metrics.inc(f"{prefix}_errors_total")
+                self.limiter.on_error()
+                raise
+
+            latency = time.monotonic() - started
+            metrics.inc(f"{prefix}_requests_total")
+            metrics.observe(f"{prefix}_latency_seconds", latency)
+            if response.status_code == 429:
+                metrics.inc(f"{prefix}_throttled_total")
+                self.limiter.on_throttle()
+            elif response.status_code >= 500:
+                metrics.inc(f"{prefix}_errors_total")
+                self.limiter.on_error()
+            else:
+                self.limiter.on_success(latency)
+            return response
+
+    def _prompt(self, property_data, variation_seed, prompt_version, seo_seed):
+        """(system, user, budget key, seo seed) for one listing generation"""
+        prompt_version = prompt_version or select_prompt_version(property_data)
+        if seo_seed is None and KEYWORD_SEED:
+            seo_seed = keyword_index.seed_for(property_data)
+        system_message, prompt = build_prompt(property_data, variation_seed, prompt_version, seo_seed)
+        # max_tokens follows the completion sizes observed for this prompt version + style
+        # (seeded prompts skip two fields, so they are budgeted separately)
+        budget_version = f"{prompt_version}+seo" if seo_seed else prompt_version
+        budget_key = (self.provider.name, budget_version, variation_seed % len(VARIATION_PROMPTS))
+        return system_message, prompt, budget_key, seo_seed
+
+    async def generate(self, property_data, api_key, variation_seed=0, prompt_version=None, retry_count=3,
+                       priority=INTERACTIVE, tenant=DEFAULT_TENANT, seo_seed=None):
+        """
+        Generate one listing - returns the parsed JSON dict or None.
+        seo_seed supplies the keywords and meta title instead of the model (KEYWORD_SEED=1
+        takes them from the keyword index whenever it has history for the locality).
+        """
+        system_message, prompt, budget_key, seo_seed = self._prompt(property_data, variation_seed, prompt_version,
+                                                                     seo_seed)
+        max_tokens = token_budget.max_tokens(budget_key)
+        call = generation_call(property_data, variation_seed) if self.transport is not None else None
+
+        for attempt in range(retry_count):
+            try:
+                started = time.time()
+                response = await self.post({
+                    "model": LISTING_MODEL,
+                    "messages": [
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": variation_temperature(variation_seed),
+                    "max_tokens": max_tokens,
+                    "top_p": 0.9
+                }, api_key, priority=priority, tenant=tenant, budget_key=budget_key, call=call)
+
+                if response.status_code == 200:
+                    result = response.json()
+                    choice = result['choices'][0]
+                    truncated = choice.get('finish_reason') == 'length'
+                    token_budget.record(budget_key, result.get('usage'), time.time() - started, truncated)
+
+                    if truncated:
+                        # Budget was too tight for this one - retry with the full ceiling
+                        max_tokens = token_budget.ceiling
+                        continue
+
+                    listing = parse_json_content(choice['message']['content'])
+                    if seo_seed:
+                        listing.update(seo_keywords=seo_seed['seo_keywords'], meta_title=seo_seed['meta_title'])
+                    return listing
+
+                elif response.status_code == 429:
+                    if attempt < retry_count - 1:
+                        await asyncio.sleep(retry_delay(response, attempt))
+                        continue
+                    return None
+                else:
+                    return None
+
+            except asyncio.CancelledError:
+                raise
+            except QuotaExceeded:
+                return None
+            except Exception:
+                if attempt < retry_count - 1:
+                    await asyncio.sleep(2)
+                    continue
+                return None
+
+        return None
+
+    def estimate_tokens(self, property_data, variation_seed=0, prompt_version=None, seo_seed=None):
+        """Quota estimate for one generate() call - prompt size plus expected completion"""
+        system_message, prompt, budget_key, _ = self._prompt(property_data, variation_seed, prompt_version, seo_seed)
+        return self.quota.estimate({
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": token_budget.max_tokens(budget_key)
+        }, budget_key)
+
+    def throughput(self):
+        """Requests per second at the current concurrency limit and mean latency - None before any call"""
+        latency = metrics.snapshot()['timings'].get(f"{self.provider.name}_latency_seconds")
+        if not latency or not latency['count']:
+            return None
+        return int(self.limiter.limit) / latency['mean']
+
+    async def generate_many(self, listings, api_key, variation_seed=0, timeout=None, retry_count=BATCH_RETRY_COUNT,
+                            priority=BATCH, tenant=DEFAULT_TENANT, then=None):
+        """
+        Generate many listings concurrently - one result (or None) per listing, in order.
+        then(result, property_data) is an optional coroutine run on each result as it lands
+        (inside the same timeout), so follow-up work doesn't wait for the whole batch.
+        """
+        async def _pipeline(property_data):
+            result = await self.generate(property_data, api_key, variation_seed, retry_count=retry_count,
+                                         priority=priority, tenant=tenant)
+            if result and then is not None:
+                result = await then(result, property_data)
+            return result
+
+        async def _one(property_data):
+            try:
+                return await asyncio.wait_for(_pipeline(property_data), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        return await asyncio.gather(*(_one(property_data) for property_data in listings))
+
+    # ==================== SYNC FACADE ====================
+    def submit(self, coro, timeout=None):
+        """Schedule a coroutine on the engine loop - returns a concurrent.futures.Future (cancel() stops the task)"""
+        if timeout:
+            coro = asyncio.wait_for(coro, timeout)
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        self._tasks.add(future)
+        future.add_done_callback(self._tasks.discard)
+        return future
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the engine loop and block for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Streamlit stops the script thread on rerun/navigation - don't leave the call running
+            future.cancel()
+            raise
+
+    def pending(self):
+        """Number of submitted tasks still running"""
+        return len(self._tasks)
+
+    def cancel_all(self):
+        """Cancel every submitted task"""
+        for future in list(self._tasks):
+            future.cancel()
+
+    def close(self):
+        """Cancel outstanding work and stop the loop"""
+        if self._loop is None:
+            return
+        self.cancel_all()
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(5)
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(provider=DEFAULT_PROVIDER):
+    """The shared engine for a provider (name, UI label or Provider), created on first use"""
+    provider = get_provider(provider)
+    if provider is None:
+        raise KeyError("Unknown LLM provider")
+    with _engines_lock:
+        if provider.name not in _engines:
+            _engines[provider.name] = GenerationEngine(provider)
+        return _engines[provider.name]
+
+
+# Default provider's engine, shared by every session in this process
+engine = get_engine(DEFAULT_PROVIDER)
+
+
+def groq_post(payload, api_key, timeout=None, priority=INTERACTIVE, tenant=DEFAULT_TENANT, provider=DEFAULT_PROVIDER):
+    """Blocking chat completion POST through a provider's shared engine (httpx.Response)"""
+    target = get_engine(provider)
+    return target.run(target.post(payload, api_key, timeout, priority, tenant))
@@ -0,0 +1,164 @@
+"""
+Generation Benchmark
+Runs sample listings through generate_with_groq against the local mock Groq server
+and reports tokens and latency per listing for each prompt version.
+
+    python benchmark.py --listings 100
+"""
+
+import argparse
+import random
+import threading
+import time
+
+import generation
+from async_engine import engine
+from metrics import metrics
+from mock_groq import start_mock_server
+from prompts import PROMPT_VERSIONS
+from token_budget import token_budget
+
+CITIES = {
+    'Mumbai': ['Andheri West', 'Bandra East', 'Powai', 'Thane West', 'Malad'],
+    'Pune': ['Baner', 'Kothrud', 'Hinjewadi', 'Viman Nagar'],
+    'Bengaluru': ['Whitefield', 'Koramangala', 'HSR Layout', 'Indiranagar'],
+    'Delhi': ['Dwarka', 'Saket', 'Rohini', 'Lajpat Nagar'],
+}
+AMENITIES = ['Lift', 'Parking', 'Power Backup', 'Security', 'CCTV', 'Gym', 'Pool', 'Garden',
+             'Club House', 'Balcony', 'Modular Kitchen', 'AC', 'WiFi', 'Wardrobe']
+NEARBY = ['Metro Station', 'Bus Stop', 'Railway Station', 'School', 'Hospital', 'Mall']
+
+
+def sample_listings(count, seed=42):
+    """Deterministic property_data dicts shaped like show_property_form output"""
+    rng = random.Random(seed)
+    listings = []
+    for _ in range(count):
+        city = rng.choice(list(CITIES))
+        bhk = rng.choice(['1 BHK', '2 BHK', '3 BHK', '4 BHK'])
+        total_floors = rng.randint(4, 30)
+        listings.append({
+            'property_type': rng.choice(['flat', 'villa', 'studio apartment', 'penthouse']),
+            'bhk': bhk,
+            'area_sqft': rng.randrange(450, 3000, 50),
+            'state': 'Maharashtra' if city in ('Mumbai', 'Pune') else 'Other',
+            'city': city,
+            'locality': rng.choice(CITIES[city]),
+            'landmark': rng.choice(['', 'Near Phoenix Mall', 'Opp. Central Park']),
+            'floor_no': rng.randint(0, total_floors),
+            'total_floors': total_floors,
+            'furnishing_status': rng.choice(['unfurnished', 'semi-furnished', 'fully furnished']),
+            'rent_amount': rng.randrange(8000, 150000, 1000),
+            'deposit_amount': rng.randrange(20000, 500000, 5000),
+            'maintenance': rng.randrange(0, 8000, 500),
+            'available_from': '2026-11-01',
+            'preferred_tenants': ', '.join(rng.sample(['Family', 'Bachelors', 'Students', 'Company Lease'], rng.randint(1, 2))),
+            'amenities': rng.sample(AMENITIES, rng.randint(3, 8)),
+            'nearby_points': rng.sample(NEARBY, rng.randint(0, 3)),
+            'rough_description': rng.choice(['', '', 'Corner flat with sea view', 'Recently renovated, premium fittings']),
+        })
+    return listings
+
+
+def run_version(server, listings, version, variations):
+    """Generate every listing x variation with one prompt version"""
+    server.reset_log()
+    token_budget.reset()
+    failures = 0
+    started = time.time()
+    for listing in listings:
+        for seed in range(variations):
+            if not generation.generate_with_groq(listing, "mock-key", variation_seed=seed, prompt_version=version):
+                failures += 1
+    elapsed = time.time() - started
+
+    log = [entry for entry in server.requests_log if entry['status'] == 200]
+    generated = len(listings) * variations
+    return {
+        'version': version,
+        'calls': len(log),
+        'failures': failures,
+        'prompt_tokens': sum(entry['prompt_tokens'] for entry in log) / generated,
+        'completion_tokens': sum(entry['completion_tokens'] for entry in log) / generated,
+        'max_tokens': sum(entry['max_tokens'] for entry in log) / max(1, len(log)),
+        'latency': sum(entry['latency'] for entry in log) / generated,
+        'wall': elapsed / generated,
+    }
+
+
+def print_report(rows):
+    """Per-listing averages and savings against the first version"""
+    print(f"{'version':<12} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} {'max_tokens':>11} {'latency s':>10} {'wall s':>8}")
+    for row in rows:
+        print(f"{row['version']:<12} {row['calls']:>6} {row['prompt_tokens']:>11.1f} {row['completion_tokens']:>10.1f} "
+              f"{row['max_tokens']:>11.0f} {row['latency']:>10.3f} {row['wall']:>8.3f}")
+
+    baseline = rows[0]
+    for row in rows[1:]:
+        prompt_saving = 1 - row['prompt_tokens'] / baseline['prompt_tokens']
+        reserved_saving = 1 - (row['prompt_tokens'] + row['max_tokens']) / (baseline['prompt_tokens'] + baseline['max_tokens'])
+        latency_saving = 1 - row['wall'] / baseline['wall']
+        print(f"\n{row['version']} vs {baseline['version']}: "
+              f"prompt tokens -{prompt_saving:.0%}, "
+              f"reserved tokens (prompt + max_tokens) -{reserved_saving:.0%}, "
+              f"latency per listing -{latency_saving:.0%}")
+
+
+def run_throttle_scenario(server, listings, interval=0.5):
+    """Batch-generate against a throttling mock and trace the AIMD concurrency limit"""
+    server.reset_log()
+    trace = []
+    done = threading.Event()
+
+    def _sample():
+        started = time.time()
+        while not done.is_set():
+            trace.append((time.time() - started, metrics.get(f"{engine.provider.name}_concurrency_limit"), server.in_flight))
+            done.wait(interval)
+
+    plan = generation.plan_batch(listings, "mock-key")
+    print(f"quota plan: {plan['decision']}, ~{plan['tokens']:,} tokens over {plan['requests']} requests, "
+          f"starts in {plan['start_in']:.0f}s, projected {plan['eta_seconds'] or 0:.0f}s\n")
+
+    sampler = threading.Thread(target=_sample, daemon=True)
+    sampler.start()
+    started = time.time()
+    results = generation.generate_batch_with_groq(listings, "mock-key", record_history=False)
+    elapsed = time.time() - started
+    done.set()
+    sampler.join()
+
+    throttled = sum(1 for entry in server.requests_log if entry['status'] == 429)
+    print(f"{'t (s)':>6} {'limit':>6} {'in flight':>10}")
+    for at, limit, in_flight in trace:
+        print(f"{at:>6.1f} {limit:>6} {in_flight:>10}")
+    print(f"\n{sum(result is not None for result in results)}/{len(listings)} generated in {elapsed:.1f}s, "
+          f"{throttled} throttled responses, {len(listings) / elapsed:.1f} listings/s "
+          f"(server allows {server.throttle_rps} req/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prompt versions against the mock Groq server")
+    parser.add_argument("--listings", type=int, default=50)
+    parser.add_argument("--variations", type=int, default=2)
+    parser.add_argument("--versions", nargs="+", default=list(PROMPT_VERSIONS), choices=list(PROMPT_VERSIONS))
+    parser.add_argument("--time-scale", type=float, default=0.1, help="scale simulated model latency")
+    parser.add_argument("--throttle-rps", type=int, default=None,
+                        help="run the adaptive concurrency scenario against a mock that throttles above this rate")
+    parser.add_argument("--daily-tokens", type=int, default=None, help="daily token quota to plan and pace against")
+    parser.add_argument("--daily-requests", type=int, default=None, help="daily request quota to plan and pace against")
+    args = parser.parse_args()
+
+    engine.quota.daily_tokens = args.daily_tokens or engine.quota.daily_tokens
+    engine.quota.daily_requests = args.daily_requests or engine.quota.daily_requests
+    server = start_mock_server(time_scale=args.time_scale, throttle_rps=args.throttle_rps)
+    engine.api_url = server.url
+
+    listings = sample_listings(args.listings)
+    if args.throttle_rps:
+        run_throttle_scenario(server, listings)
+        server.shutdown()
+        raise SystemExit
+    rows = [run_version(server, listings, version, args.variations) for version in args.versions]
+    print_report(rows)
+    server.shutdown()
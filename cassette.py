@@ -0,0 +1,247 @@
+"""
+LLM Traffic Cassettes
+Record/replay transports that sit under an engine's httpx client. Recording captures
+each chat completion exchange - request payload, status, rate-limit headers, response
+body, latency and arrival time - one JSON line per exchange (gzipped for .gz paths),
+with API keys redacted. Replaying answers the same requests offline from the cassette
+at the recorded latency, scaled by `speed`.
+
+    LLM_CASSETTE=day.jsonl.gz streamlit run deepseek_python_20251126_9f83cf.py   (records)
+    LLM_CASSETTE=day.jsonl.gz LLM_CASSETTE_MODE=replay LLM_CASSETTE_SPEED=10 ...  (replays)
+
+Replay matches a request to the recording of the identical payload first, otherwise to
+the next unused exchange of the same kind (listing generation or other), in recorded
+order, so a day of real traffic keeps its latency, throttling and output shapes even when
+the prompts have changed since.
+"""
+
+import asyncio
+import atexit
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+
+from metrics import metrics
+
+CASSETTE_PATH = os.environ.get("LLM_CASSETTE")
+# record | replay
+CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "record")
+# Replay latency divisor - 1 is the recorded speed, 0 answers instantly
+CASSETTE_SPEED = float(os.environ.get("LLM_CASSETTE_SPEED", "1"))
+# Response headers worth keeping - the rest is per-connection noise
+KEPT_HEADERS = ('content-type', 'retry-after')
+KEPT_HEADER_PREFIXES = ('x-ratelimit-',)
+
+_SECRET = re.compile(r'(gsk_|sk-)[A-Za-z0-9_\-]{8,}|Bearer\s+[^\s"\\]+')
+_call_ids = itertools.count(1)
+
+
+def redact(text):
+    """Strip anything that looks like an API key or bearer token"""
+    return _SECRET.sub('[REDACTED]', text)
+
+
+def fingerprint(payload):
+    """
+    Stable id of a request payload. The model name and max_tokens are left out - role remaps
+    and the adaptive token budget shouldn't stop a replayed prompt from matching its recording.
+    """
+    canonical = json.dumps({key: value for key, value in payload.items() if key not in ('model', 'max_tokens')},
+                           sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def generation_call(property_data, variation_seed):
+    """Request tag naming the listing generation an exchange belongs to (retries share the id)"""
+    return {'kind': 'generate', 'id': next(_call_ids), 'property_data': property_data,
+            'variation_seed': variation_seed}
+
+
+def _kept_headers(headers):
+    return {name: value for name, value in headers.items()
+            if name.lower() in KEPT_HEADERS or name.lower().startswith(KEPT_HEADER_PREFIXES)}
+
+
+class Cassette:
+    """
+    Exchanges of one cassette file - streamed to the file while recording (only a count is
+    kept in memory), loaded whole for replay
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.recorded = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        cassette = cls(path)
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as handle:
+                for line in handle:
+                    if line.strip():
+                        cassette.entries.append(json.loads(line))
+        except EOFError:
+            # Recorder was killed mid-write - everything flushed before that is intact
+            pass
+        return cassette
+
+    def append(self, entry):
+        line = redact(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                opener = gzip.open if self.path.endswith('.gz') else open
+                self._file = opener(self.path, 'at', encoding='utf-8')
+                atexit.register(self.close)
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.recorded += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ==================== TRANSPORTS ====================
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to the network and appends every exchange to the cassette"""
+
+    def __init__(self, cassette, provider, inner=None):
+        self.cassette = cassette
+        self.provider = provider
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        at = time.time()
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.monotonic() - started
+
+        payload = json.loads(request.content or b'{}')
+        entry = {'at': round(at, 3), 'provider': self.provider, 'path': request.url.path,
+                 'request': payload, 'status': response.status_code,
+                 'headers': _kept_headers(response.headers), 'elapsed': round(elapsed, 4)}
+        call = request.extensions.get('cassette_call')
+        if call:
+            entry['call'] = call
+        try:
+            entry['json'] = json.loads(body)
+        except ValueError:
+            entry['text'] = body.decode('utf-8', 'replace')
+        self.cassette.append(entry)
+        metrics.inc("cassette_recorded_total")
+
+        # The body is already decoded - don't let the client decode it again
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Answers requests from a cassette. Exact payload matches are used first, then the next
+    unused exchange of the same kind; once every exchange is used the cassette starts over.
+    Latency and Retry-After are divided by `speed` (0 answers at once).
+    """
+
+    def __init__(self, cassette, speed=CASSETTE_SPEED, provider=None):
+        self.speed = speed
+        self.entries = [entry for entry in cassette.entries if provider is None or entry.get('provider') == provider]
+        self._lock = threading.Lock()
+        self._rewind()
+
+    def _rewind(self):
+        self._used = set()
+        self._by_fingerprint = defaultdict(deque)
+        self._by_kind = defaultdict(deque)
+        for index, entry in enumerate(self.entries):
+            self._by_fingerprint[fingerprint(entry['request'])].append(index)
+            self._by_kind[(entry.get('call') or {}).get('kind')].append(index)
+
+    def _take(self, queue):
+        while queue:
+            index = queue.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                return self.entries[index]
+        return None
+
+    def match(self, payload, kind=None):
+        """The recorded exchange to answer a request with - None for an empty cassette"""
+        if not self.entries:
+            return None
+        with self._lock:
+            entry = self._take(self._by_fingerprint.get(fingerprint(payload), deque()))
+            if entry is not None:
+                metrics.inc("cassette_exact_total")
+                return entry
+            if len(self._used) == len(self.entries):
+                metrics.inc("cassette_rewinds_total")
+                self._rewind()
+            entry = self._take(self._by_kind[kind]) or self._take(deque(range(len(self.entries))))
+            metrics.inc("cassette_fallback_total")
+            return entry
+
+    async def handle_async_request(self, request):
+        payload = json.loads(await request.aread() or b'{}')
+        entry = self.match(payload, (request.extensions.get('cassette_call') or {}).get('kind'))
+        if entry is None:
+            raise httpx.ConnectError("Cassette has no recorded exchanges", request=request)
+        if self.speed:
+            await asyncio.sleep(entry['elapsed'] / self.speed)
+
+        headers = dict(entry.get('headers') or {})
+        if self.speed and 'retry-after' in headers:
+            try:
+                headers['retry-after'] = f"{float(headers['retry-after']) / self.speed:.3f}"
+            except ValueError:
+                pass
+        if 'json' in entry:
+            content = json.dumps(entry['json'], ensure_ascii=False).encode('utf-8')
+        else:
+            content = entry.get('text', '').encode('utf-8')
+        metrics.inc("cassette_replayed_total")
+        return httpx.Response(entry['status'], headers=headers, content=content, request=request)
+
+
+_cassettes = {}
+
+
+def shared_cassette(path):
+    """One Cassette per path, so every engine in the process appends to the same file"""
+    if path not in _cassettes:
+        _cassettes[path] = Cassette.load(path) if CASSETTE_MODE == 'replay' else Cassette(path)
+    return _cassettes[path]
+
+
+def transport_from_env(provider, max_connections):
+    """Transport for an engine per LLM_CASSETTE / LLM_CASSETTE_MODE - None for plain network access"""
+    if not CASSETTE_PATH:
+        return None
+    cassette = shared_cassette(CASSETTE_PATH)
+    if CASSETTE_MODE == 'replay':
+        return ReplayTransport(cassette, CASSETTE_SPEED, provider)
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return RecordingTransport(cassette, provider, httpx.AsyncHTTPTransport(limits=limits))
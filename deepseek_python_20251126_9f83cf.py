@@ -7,10 +7,29 @@ Beautiful Modern Interface with Streamlit
 import streamlit as st
 import pandas as pd
 import json
-import requests
+import os
+import sqlite3
+import uuid
 from datetime import datetime
 from io import BytesIO
-import time
+
+from async_engine import get_engine
+from generation import test_groq_api, generate_description, generate_enhanced_description
+from history_db import history_db, rent_band, rent_band_label
+from incremental import needs_regeneration, update_result
+from keyword_index import keyword_index
+from listing import Listing
+from metrics import metrics
+from prefetch import (SPECULATIVE_DEBOUNCE_SECONDS, SPECULATIVE_GENERATION, cancel_speculation, prefetcher,
+                      speculate, speculative_stats)
+from profiling import PROFILE_RERUNS, begin_rerun, end_rerun, profiled, section
+from prompts import VARIATION_PROMPTS, get_variation
+from providers import DEFAULT_PROVIDER, get_provider, provider_labels
+from quality import pick_best
+from result_store import result_store
+from session_memory import SessionMemory, track_session
+from translation import LANGUAGES, translate_result
+from validation import META_DESCRIPTION_LIMIT, META_TITLE_LIMIT
 
 # Page Configuration
 st.set_page_config(
@@ -20,8 +39,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ==================== PROFILING ====================
+if 'profiles' not in st.session_state:
+    st.session_state.profiles = []
+    st.session_state.rerun_count = 0
+if 'memory' not in st.session_state:
+    st.session_state.memory = SessionMemory()
+st.session_state.rerun_count += 1
+rerun_profile = None
+if st.session_state.get('profiling', PROFILE_RERUNS):
+    rerun_profile = begin_rerun(f"#{st.session_state.rerun_count} {datetime.now().strftime('%H:%M:%S')}")
+
 # ==================== CUSTOM CSS FOR ENHANCED UI ====================
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     /* Import Google Font */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
@@ -431,331 +461,252 @@ st.markdown("""
         font-weight: 500;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
+with section('css'):
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
-# ==================== AI GENERATION FUNCTIONS ====================
-def test_groq_api(api_key):
-    """Test Groq API connection"""
-    try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key.strip()}"
-            },
-            json={
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": "Say 'API is working!'"}],
-                "temperature": 0.5,
-                "max_tokens": 50
-            },
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            return True, "✅ API Connection Successful!"
-        else:
-            return False, f"Error {response.status_code}: {response.text[:200]}"
-    except Exception as e:
-        return False, f"Connection Error: {str(e)}"
 
+# ==================== RESULT HISTORY ====================
+# Identity headers of an authenticating reverse proxy (oauth2-proxy and the like). Any client
+# can send them, so they only count with TRUSTED_PROXY_AUTH=1 - set it only when the app is
+# reachable through a proxy that strips them from incoming requests.
+TRUSTED_PROXY_AUTH = os.environ.get("TRUSTED_PROXY_AUTH", "0") == "1"
+PROXY_USER_HEADERS = ("X-Forwarded-User", "X-Forwarded-Email", "X-Auth-Request-User")
 
-def generate_with_groq(property_data, api_key, retry_count=3, variation_seed=0):
-    """Generate PREMIUM description using Groq API with variation support"""
-    
-    variation_prompts = [
-        {
-            'focus': 'lifestyle and experience',
-            'tone': 'aspirational and emotional',
-            'instruction': 'Focus on the lifestyle transformation and daily experiences this property offers.'
-        },
-        {
-            'focus': 'investment value and practicality',
-            'tone': 'professional and value-driven',
-            'instruction': 'Emphasize the practical benefits, value for money, and smart investment aspects.'
-        },
-        {
-            'focus': 'location benefits and connectivity',
-            'tone': 'convenience-focused and modern',
-            'instruction': 'Highlight the strategic location, connectivity advantages, and nearby conveniences.'
-        },
-        {
-            'focus': 'comfort and luxury features',
-            'tone': 'premium and sophisticated',
-            'instruction': 'Emphasize the premium features, comfort elements, and luxurious living experience.'
-        },
-        {
-            'focus': 'community and safety',
-            'tone': 'warm and family-oriented',
-            'instruction': 'Focus on the safe neighborhood, community aspects, and family-friendly environment.'
-        }
-    ]
-    
-    variation = variation_prompts[variation_seed % len(variation_prompts)]
-    
-    for attempt in range(retry_count):
-        try:
-            api_key = api_key.strip()
-            
-            bhk = property_data['bhk']
-            prop_type = property_data['property_type'].title()
-            locality = property_data['locality']
-            city = property_data['city']
-            district = property_data.get('district', '')
-            state = property_data.get('state', '')
-            pincode = property_data.get('pincode', '')
-            area = property_data['area_sqft']
-            rent = property_data['rent_amount']
-            furnishing = property_data['furnishing_status']
-            amenities = ', '.join(property_data['amenities']) if property_data['amenities'] else 'Standard amenities'
-            tenants = property_data['preferred_tenants']
-            deposit = property_data['deposit_amount']
-            available = property_data['available_from']
-            nearby = ', '.join(property_data.get('nearby_points', []))
-            landmark = property_data.get('landmark', '')
-            floor_no = property_data.get('floor_no', '')
-            total_floors = property_data.get('total_floors', '')
-            maintenance = property_data.get('maintenance', 0)
-            
-            rough_desc = property_data.get('rough_description', '').strip()
-            rough_desc_section = ""
-            if rough_desc:
-                rough_desc_section = f"""
 
-**Owner's Additional Notes/Description:**
-"{rough_desc}"
-(IMPORTANT: Please incorporate these owner-provided details naturally and prominently into the description!)
-"""
-            
-            full_location = f"{locality}, {city}"
-            if district:
-                full_location += f", {district}"
-            if state:
-                full_location += f", {state}"
-            if pincode:
-                full_location += f" - {pincode}"
-            
-            location_details = full_location
-            if landmark:
-                location_details += f" (Near {landmark})"
-            
-            floor_info = ""
-            if floor_no and total_floors:
-                floor_info = f"\n- Floor: {floor_no} of {total_floors} floors"
-            
-            maintenance_info = ""
-            if maintenance and maintenance > 0:
-                maintenance_info = f"\n- Maintenance: ₹{maintenance}/month"
+def current_user_id():
+    """
+    Stable user id - the proxy's authenticated user with TRUSTED_PROXY_AUTH=1, else an id
+    kept in the URL. The ?uid= id is the whole identity: anyone given a URL carrying it
+    shares that history and its stored versions.
+    """
+    if TRUSTED_PROXY_AUTH:
+        headers = st.context.headers
+        for header in PROXY_USER_HEADERS:
+            if headers.get(header):
+                return headers.get(header)
+    if 'uid' not in st.query_params:
+        st.query_params['uid'] = uuid.uuid4().hex
+    return st.query_params['uid']
 
-            prompt = f"""You are an expert real estate copywriter specializing in premium property listings.
 
-Create a compelling rental property listing for:
+def restore_version(summary, record):
+    """Load a stored version into the session without regenerating it"""
+    st.session_state.property_data = summary['property_data']
+    st.session_state.generated_result = record['result']
+    st.session_state.generation_count = record['generation_count']
+    st.session_state.enhanced_description = record.get('enhanced_description')
+    st.session_state.use_enhanced = False
+    st.session_state.stored_listing = summary['listing_hash']
+    st.session_state.stored_version = record['version']
 
-**Property Details:**
-- Type: {bhk} BHK {prop_type}
-- Location: {location_details}
-- Area: {area} square feet{floor_info}
-- Monthly Rent: ₹{rent:,}
-- Security Deposit: ₹{deposit:,}{maintenance_info}
-- Furnishing: {furnishing} furnished
-- Amenities: {amenities}
-- Preferred Tenants: {tenants}
-- Available From: {available}
-- Nearby: {nearby if nearby else 'Various conveniences'}
-{rough_desc_section}
-**CREATIVE DIRECTION (Version #{variation_seed + 1}):**
-- Primary Focus: {variation['focus']}
-- Tone: {variation['tone']}
-- Instruction: {variation['instruction']}
 
-**Requirements:**
-1. **Title**: Attention-grabbing, emotional title (8-12 words). DO NOT start with "Discover" or "Welcome".
-2. **Teaser**: Compelling hook (15-20 words) with urgency
-3. **Full Description**: Engaging 150-200 word description with lifestyle benefits
-4. **Bullet Points**: 5 benefit-focused features
-5. **SEO Keywords**: 5 search-optimized keywords
-6. **Meta Title**: Under 60 chars
-7. **Meta Description**: Under 160 chars with CTA
+def load_version(listing_hash, version):
+    """A stored version - from the session's memory while it's still there, else from the store"""
+    user_id = st.session_state.user_id
+    return st.session_state.memory.get(('version', listing_hash, version),
+                                       lambda: result_store.get_version(user_id, listing_hash, version))
 
-Return ONLY valid JSON:
-{{
-    "title": "captivating title here",
-    "teaser_text": "compelling teaser here",
-    "full_description": "detailed description here",
-    "bullet_points": ["benefit 1", "benefit 2", "benefit 3", "benefit 4", "benefit 5"],
-    "seo_keywords": ["keyword1", "keyword2", "keyword3", "keyword4", "keyword5"],
-    "meta_title": "SEO meta title",
-    "meta_description": "SEO meta description with CTA"
-}}"""
 
-            temperature = 0.8 + (variation_seed * 0.05)
-            if temperature > 1.0:
-                temperature = 0.8 + ((variation_seed % 3) * 0.05)
+def save_current_result(provider_name):
+    """Store the session's current result as the next version of its listing"""
+    listing_hash, version = result_store.save_version(
+        st.session_state.user_id, st.session_state.property_data, st.session_state.generated_result,
+        st.session_state.generation_count, provider_name
+    )
+    st.session_state.stored_listing = listing_hash
+    st.session_state.stored_version = version
+    if version:
+        st.session_state.memory.put(('version', listing_hash, version), {
+            'generation_count': st.session_state.generation_count,
+            'style': get_variation(st.session_state.generation_count)['focus'],
+            'provider': provider_name, 'created_at': datetime.now().isoformat(timespec='seconds'),
+            'result': st.session_state.generated_result, 'version': version, 'enhanced_description': None,
+        })
+    try:
+        history_db.record(st.session_state.property_data, st.session_state.generated_result,
+                          st.session_state.generation_count, provider_name, st.session_state.user_id, version)
+        keyword_index.update()
+    except sqlite3.Error:
+        metrics.inc("history_db_errors_total")
 
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}"
-                },
-                json={
-                    "model": "llama-3.3-70b-versatile",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": f"You are an expert real estate copywriter. Focus: {variation['focus']}. Tone: {variation['tone']}. Return only valid JSON."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": 2000,
-                    "top_p": 0.9
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content'].strip()
-                
-                if content.startswith('```json'):
-                    content = content.replace('```json', '').replace('```', '').strip()
-                elif content.startswith('```'):
-                    content = content.replace('```', '').strip()
-                
-                return json.loads(content)
-            
-            elif response.status_code == 429:
-                if attempt < retry_count - 1:
-                    time.sleep((attempt + 1) * 2)
-                    continue
-                return None
-            else:
-                return None
-                
-        except Exception as e:
-            if attempt < retry_count - 1:
-                time.sleep(2)
-                continue
-            return None
-    
-    return None
 
+def style_index(style):
+    """generation_count that produces a stored style name"""
+    focuses = [variation['focus'] for variation in VARIATION_PROMPTS]
+    return focuses.index(style) if style in focuses else 0
 
-def generate_fallback(property_data):
-    """Fallback template-based generation"""
-    bhk = property_data['bhk']
-    prop_type = property_data['property_type'].title()
-    locality = property_data['locality']
-    city = property_data['city']
-    area = property_data['area_sqft']
-    rent = property_data['rent_amount']
-    furnishing = property_data['furnishing_status'].title()
-    rough_desc = property_data.get('rough_description', '').strip()
-    
-    extra_info = f" {rough_desc}" if rough_desc else ""
-    
-    return {
-        "title": f"Spacious {bhk} BHK {prop_type} for Rent in {locality}",
-        "teaser_text": f"Well-maintained {bhk} BHK {prop_type} in prime {locality} location",
-        "full_description": f"Looking for a comfortable home? This beautiful {bhk} BHK {prop_type} in {locality}, {city} is perfect for you. Spread across {area} sqft, this {furnishing} furnished property offers great value at ₹{rent:,}/month.{extra_info}",
-        "bullet_points": [
-            f"{bhk} BHK with {area} sqft area",
-            f"{furnishing} furnished with modern fittings",
-            f"Monthly rent: ₹{rent:,}",
-            f"Preferred for: {property_data['preferred_tenants']}",
-            f"Available from: {property_data['available_from']}"
-        ],
-        "seo_keywords": [f"{bhk} bhk {city}", f"{locality} rental", f"{prop_type} rent", f"flat {locality}", f"rent {city}"],
-        "meta_title": f"{bhk} BHK {prop_type} for Rent in {locality}",
-        "meta_description": f"Rent this {bhk} BHK in {locality}, {city}. {area} sqft, {furnishing}. ₹{rent:,}/month."
-    }
 
+def open_history_record(row_id):
+    """Show a searched record as the current result"""
+    record = history_db.get(row_id)
+    if record is None:
+        return
+    st.session_state.property_data = record['property_data']
+    st.session_state.generated_result = record['result']
+    st.session_state.generation_count = style_index(record['style'])
+    st.session_state.enhanced_description = None
+    st.session_state.use_enhanced = False
+    own = record['user_id'] == st.session_state.user_id
+    st.session_state.stored_listing = record['listing_hash'] if own else None
+    st.session_state.stored_version = record['version'] if own else None
 
-def generate_description(property_data, api_provider, api_key=None, variation_seed=0):
-    """Main generation function"""
-    if api_provider == "Groq Premium (Free)" and api_key:
-        result = generate_with_groq(property_data, api_key, variation_seed=variation_seed)
-        if result:
-            return result
-    
-    return generate_fallback(property_data)
 
+@profiled('search')
+def show_search():
+    """Sidebar full-text search over the generation history"""
+    query = st.text_input("Search", placeholder="sea view, metro, Powai...", key="history_query")
+    cities = [city for city, _ in history_db.facets('city')]
+    city = st.selectbox("City", ["Any"] + cities, key="history_city")
+    mine = st.checkbox("Only mine", value=True, key="history_mine")
+    if not query and city == "Any":
+        return
 
-def generate_enhanced_description(original_desc, property_data, style, length, api_key):
-    """Generate enhanced version"""
-    
-    length_map = {
-        "Medium (200-250 words)": "200-250 words",
-        "Long (300-350 words)": "300-350 words", 
-        "Extra Long (400-500 words)": "400-500 words"
-    }
-    target_length = length_map.get(length, "250-300 words")
-    
-    style_instructions = {
-        "More Detailed & Elaborate": "Add more specific details about each feature and room descriptions.",
-        "More Emotional & Persuasive": "Use emotional triggers and create vivid lifestyle imagery.",
-        "More Professional & Formal": "Use sophisticated vocabulary and focus on specifications.",
-        "Add Local Flavor & Culture": "Include references to local culture and neighborhood character.",
-        "Focus on Investment Value": "Emphasize rental yield potential and location growth.",
-        "Luxury & Premium Feel": "Use upscale vocabulary and emphasize exclusivity."
-    }
-    style_guide = style_instructions.get(style, "Make it more detailed.")
-    
-    location = f"{property_data['locality']}, {property_data['city']}"
-    
-    prompt = f"""Enhance this property description:
+    rows = history_db.search(query, city=None if city == "Any" else city,
+                             user_id=st.session_state.user_id if mine else None, limit=10)
+    if not rows:
+        st.caption("No matches")
+    for row in rows:
+        if st.button(f"{row['bhk']} • {row['locality']} • ₹{row['rent']:,}", key=f"search_{row['id']}",
+                     use_container_width=True):
+            open_history_record(row['id'])
+            st.rerun()
+        st.caption(row.get('snippet') or row['title'])
 
-**ORIGINAL:**
-{original_desc}
 
-**PROPERTY:**
-- {property_data['bhk']} BHK {property_data['property_type'].title()}
-- Location: {location}
-- Area: {property_data['area_sqft']} sq ft
-- Rent: ₹{property_data['rent_amount']:,}/month
+@profiled('similar')
+def show_similar(property_data, api_key, api_provider):
+    """Earlier listings like the one in the form - same-place ones can be patched to the new facts"""
+    rows = history_db.find_similar(property_data, limit=5)
+    if not rows:
+        return
+    with st.expander(f"♻️ Similar past listings ({len(rows)})"):
+        for row in rows:
+            st.markdown(f"**{row['title']}**  \n{row['bhk']} • {row['locality']}, {row['city']} • "
+                        f"₹{row['rent']:,} ({rent_band_label(rent_band(row['rent']))}) • {row['created_at'][:10]}")
+            if row['same_place'] and st.button("Start from this", key=f"reuse_{row['id']}"):
+                record = history_db.get(row['id'])
+                provider = get_provider(api_provider)
+                with st.spinner("♻️ Adapting to your details..."), section('api'):
+                    result = update_result(record['result'], record['property_data'], property_data, api_key,
+                                           provider.name if provider is not None else DEFAULT_PROVIDER)
+                if result is None:
+                    st.warning("Too different to reuse - generate a fresh description instead")
+                else:
+                    st.session_state.property_data = property_data
+                    st.session_state.generated_result = result
+                    st.session_state.generation_count = style_index(record['style'])
+                    st.session_state.enhanced_description = None
+                    st.session_state.use_enhanced = False
+                    save_current_result(provider.name if provider is not None else 'template')
+                    st.rerun()
 
-**STYLE:** {style_guide}
-**LENGTH:** {target_length}
 
-Return ONLY the enhanced description text, nothing else."""
+@profiled('history')
+def show_history():
+    """Sidebar history - listings then versions, one page at a time"""
+    user_id = st.session_state.user_id
+    page_size = 5
+    items, total = result_store.list_listings(user_id, st.session_state.history_page, page_size)
+    if not total:
+        st.caption("No saved descriptions yet")
+        return
 
-    try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key.strip()}"
-            },
-            json={
-                "model": "llama-3.3-70b-versatile",
-                "messages": [
-                    {"role": "system", "content": "You are an expert real estate copywriter. Return only the enhanced description."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.8,
-                "max_tokens": 1500
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            enhanced = result['choices'][0]['message']['content'].strip()
-            
-            for prefix in ["Here is", "Here's", "Enhanced description:", "Enhanced version:"]:
-                if enhanced.lower().startswith(prefix.lower()):
-                    enhanced = enhanced[len(prefix):].strip()
-            
-            return enhanced
-        return None
-            
-    except Exception as e:
-        return None
+    for item in items:
+        label = f"{item['bhk']} • {item['locality']}, {item['city']} ({item['versions']})"
+        if st.button(label, key=f"history_{item['listing_hash']}", use_container_width=True):
+            st.session_state.history_listing = item['listing_hash']
+            st.session_state.version_page = 0
+
+    pages = (total + page_size - 1) // page_size
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀", key="history_prev", disabled=st.session_state.history_page == 0):
+            st.session_state.history_page -= 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {st.session_state.history_page + 1} of {pages}")
+    with col3:
+        if st.button("▶", key="history_next", disabled=st.session_state.history_page >= pages - 1):
+            st.session_state.history_page += 1
+            st.rerun()
+
+    listing_hash = st.session_state.history_listing
+    if not listing_hash:
+        return
+    summary = result_store.get_listing(user_id, listing_hash)
+    versions, version_total = result_store.list_versions(user_id, listing_hash, st.session_state.version_page, page_size)
+    if summary is None or not versions:
+        return
+
+    st.markdown(f"**{summary['title'][:50]}**")
+    for record in versions:
+        label = f"v{record['version']} • {record['style']} • {record['created_at'][:16]}"
+        if st.button(label, key=f"version_{listing_hash}_{record['version']}", use_container_width=True):
+            restore_version(summary, load_version(listing_hash, record['version']))
+            st.rerun()
+    if version_total > 1 and st.button("⭐ Best version", key=f"best_{listing_hash}", use_container_width=True,
+                                       help="Scores every version on rules, facts, readability and distinctness"):
+        records, _ = result_store.list_versions(user_id, listing_hash, 0, version_total)
+        best, _ = pick_best(summary['property_data'], [record['result'] for record in records])
+        restore_version(summary, load_version(listing_hash, records[best]['version']))
+        st.rerun()
+    if version_total > page_size:
+        version_pages = (version_total + page_size - 1) // page_size
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Newer", key="version_prev", disabled=st.session_state.version_page == 0):
+                st.session_state.version_page -= 1
+                st.rerun()
+        with col2:
+            if st.button("Older", key="version_next", disabled=st.session_state.version_page >= version_pages - 1):
+                st.session_state.version_page += 1
+                st.rerun()
 
 
 # ==================== MAIN APP ====================
+def show_profiles():
+    """Per-rerun breakdown from profiling mode, newest first"""
+    st.toggle("Profile reruns", value=PROFILE_RERUNS, key='profiling',
+              help="cProfile + tracemalloc on every rerun of this session - slows the app down while on")
+    reports = st.session_state.profiles
+    if not reports:
+        st.caption("Turn it on and use the app - each rerun's profile shows up here.")
+        return
+    
+    by_label = {report['label']: report for report in reversed(reports)}
+    report = by_label[st.selectbox("Rerun", list(by_label))]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total", f"{report['total_ms']:,.0f} ms")
+        st.metric("API", f"{report['api_ms']:,.0f} ms")
+    with col2:
+        st.metric("Render", f"{report['render_ms']:,.0f} ms")
+        st.metric("CPU", f"{report['cpu_ms']:,.0f} ms")
+    st.caption(" • ".join(f"{name} {ms:,.0f} ms" for name, ms in report['sections_ms'].items())
+               + f" • peak {report['peak_kib']:,.0f} KiB allocated")
+    
+    st.markdown("**Top functions** (self time)")
+    st.dataframe(pd.DataFrame(report['top_functions']), hide_index=True, use_container_width=True)
+    if report['allocations']:
+        st.markdown("**Allocations still live at rerun end**")
+        st.dataframe(pd.DataFrame(report['allocations']), hide_index=True, use_container_width=True)
+    
+    dumps = st.session_state.memory.get(('profile', report['label']))
+    if dumps is None:
+        st.caption("Raw dumps of this rerun were dropped to keep the session within its memory budget.")
+        return
+    col1, col2 = st.columns(2)
+    stamp = report['label'].split()[0].lstrip('#')
+    with col1:
+        st.download_button("📥 pstats", dumps['pstats'], f"rerun_{stamp}.prof", "application/octet-stream",
+                           use_container_width=True, help="snakeviz / flameprof / python -m pstats")
+    with col2:
+        st.download_button("🔥 Folded", dumps['folded'], f"rerun_{stamp}.folded", "text/plain",
+                           use_container_width=True, help="flamegraph.pl / speedscope folded stacks")
+
+
 def main():
     # Header
     st.markdown("""
@@ -778,6 +729,23 @@ def main():
         st.session_state.use_enhanced = False
     if 'api_connected' not in st.session_state:
         st.session_state.api_connected = False
+    if 'stored_listing' not in st.session_state:
+        st.session_state.stored_listing = None
+        st.session_state.stored_version = None
+    if 'history_page' not in st.session_state:
+        st.session_state.history_page = 0
+        st.session_state.history_listing = None
+        st.session_state.version_page = 0
+    if 'translations' not in st.session_state:
+        st.session_state.translations = {'source': None, 'languages': {}}
+    if 'speculation' not in st.session_state:
+        st.session_state.speculation = {}
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = current_user_id()
+        # New session (reload, another replica) - pick up where this user left off
+        latest = result_store.latest(st.session_state.user_id)
+        if latest and latest[1]:
+            restore_version(*latest)
     
     # Sidebar
     with st.sidebar:
@@ -792,12 +760,13 @@ def main():
         # API Provider
         api_provider = st.selectbox(
             "🤖 AI Provider",
-            ["Groq Premium (Free)", "Template (No API)"],
-            help="Groq Premium uses enhanced prompting for free!"
+            provider_labels(),
+            help="Groq Premium uses enhanced prompting for free! Local OpenAI-compatible servers appear when LOCAL_LLM_URL is set."
         )
+        provider = get_provider(api_provider)
         
         api_key = None
-        if api_provider != "Template (No API)":
+        if provider is not None and provider.requires_key:
             st.markdown("""
             <div class="gradient-card gradient-card-green" style="padding: 1rem; margin: 1rem 0;">
                 <p style="margin: 0; font-weight: 600;">🌟 PREMIUM Quality + FREE</p>
@@ -805,16 +774,18 @@ def main():
             </div>
             """, unsafe_allow_html=True)
             
-            api_key = st.text_input("🔑 Groq API Key", type="password", placeholder="gsk_...")
-            
-            st.markdown("[🔗 Get Free API Key](https://console.groq.com/keys)")
+            if provider.name == 'groq':
+                api_key = st.text_input("🔑 Groq API Key", type="password", placeholder="gsk_...")
+                st.markdown("[🔗 Get Free API Key](https://console.groq.com/keys)")
+            else:
+                api_key = st.text_input(f"🔑 {provider.label} API Key", type="password")
             
             if api_key:
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("🧪 Test", use_container_width=True):
-                        with st.spinner("Testing..."):
-                            success, message = test_groq_api(api_key)
+                        with st.spinner("Testing..."), section('api'):
+                            success, message = test_groq_api(api_key, provider.name)
                             if success:
                                 st.session_state.api_connected = True
                                 st.success("Connected!")
@@ -827,6 +798,23 @@ def main():
                     st.markdown('<span class="status-badge status-connected">🟢 Connected</span>', unsafe_allow_html=True)
                 else:
                     st.markdown('<span class="status-badge status-disconnected">🔴 Not Connected</span>', unsafe_allow_html=True)
+        elif provider is not None:
+            st.caption(f"🖥️ {provider.base_url} • {provider.model('listing')}")
+            if st.button("🩺 Health Check", use_container_width=True):
+                with st.spinner("Checking..."), section('api'):
+                    success, message, latency, models = provider.health_check()
+                    st.session_state.api_connected = success
+                    if success:
+                        st.success(message)
+                    else:
+                        st.error(message)
+            if st.session_state.api_connected:
+                st.markdown('<span class="status-badge status-connected">🟢 Connected</span>', unsafe_allow_html=True)
+        
+        if provider is not None:
+            st.toggle("⚡ Speculative Generation", value=SPECULATIVE_GENERATION, key='speculative',
+                      help=f"Start generating once the form has been idle for {SPECULATIVE_DEBOUNCE_SECONDS:g}s, "
+                           "so Generate usually finds the result ready. Uses extra tokens when you keep editing.")
         
         st.markdown("---")
         
@@ -849,11 +837,59 @@ def main():
             4. ✨ **Comfort & Luxury**
             5. 👨‍👩‍👧 **Community & Safety**
             """)
+        
+        with st.expander("📈 Engine Metrics"):
+            prefix = provider.name if provider is not None else 'groq'
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Concurrency Limit", metrics.get(f"{prefix}_concurrency_limit"))
+                st.metric("Requests", metrics.get(f"{prefix}_requests_total"))
+            with col2:
+                st.metric("In Flight", metrics.get(f"{prefix}_in_flight"))
+                st.metric("Throttled (429)", metrics.get(f"{prefix}_throttled_total"))
+            st.caption(f"Queued: {metrics.get(f'{prefix}_queue_interactive')} interactive • "
+                       f"{metrics.get(f'{prefix}_queue_batch')} batch • {metrics.get(f'{prefix}_queue_background')} background")
+            st.caption(f"Prefetch: {metrics.get('prefetch_hits_total')} hits of {metrics.get('prefetch_started_total')} • "
+                       f"~{metrics.get('prefetch_wasted_tokens_total'):,} tokens wasted")
+            if st.session_state.get('speculative'):
+                stats = speculative_stats()
+                st.caption(f"Speculative: {stats['hits']} hits of {stats['started']} ({stats['hit_rate']:.0%}) • "
+                           f"{stats['superseded']} superseded • ~{stats['wasted_tokens']:,} tokens wasted")
+            memory = st.session_state.memory.stats()
+            st.caption(f"Session memory: {memory['bytes'] / 1024:,.0f} of {memory['budget'] / 1024:,.0f} KiB • "
+                       f"{memory['entries']} entries ({memory['ratio']:.1f}x compressed) • "
+                       f"{memory['evictions']} evicted • {metrics.get('session_memory_sessions')} sessions, "
+                       f"{metrics.get('session_memory_bytes') / 2 ** 20:,.1f} MiB in this process")
+            quota = get_engine(provider).quota if provider is not None else None
+            if quota is not None and quota.enabled and api_key:
+                usage = quota.usage(api_key)
+                if quota.daily_tokens:
+                    st.progress(min(1.0, usage['tokens_used'] / quota.daily_tokens),
+                                text=f"Daily tokens: {usage['tokens_used']:,} / {quota.daily_tokens:,}")
+                if quota.daily_requests:
+                    st.progress(min(1.0, usage['requests_used'] / quota.daily_requests),
+                                text=f"Daily requests: {usage['requests_used']:,} / {quota.daily_requests:,}")
+        
+        with st.expander("📚 History"):
+            show_history()
+        
+        with st.expander("🔎 Search History"):
+            show_search()
+        
+        with st.expander("⏱️ Profiler"):
+            show_profiles()
     
     # Main Content
     show_property_form(api_provider, api_key)
 
 
+@st.fragment(run_every=SPECULATIVE_DEBOUNCE_SECONDS / 2)
+def watch_form(property_data, api_key, provider_name):
+    """Ticks while the form sits idle so speculation starts without another interaction"""
+    speculate(st.session_state.speculation, property_data, api_key, provider_name)
+
+
+@profiled('form')
 def show_property_form(api_provider, api_key):
     """Property Input Form with Enhanced UI"""
     
@@ -993,27 +1029,38 @@ def show_property_form(api_provider, api_key):
             height=120
         )
     
-    # Property Data
-    property_data = {
-        'property_type': property_type.lower(),
-        'bhk': bhk,
-        'area_sqft': area_sqft,
-        'state': state,
-        'city': city,
-        'locality': locality,
-        'landmark': landmark,
-        'floor_no': floor_no,
-        'total_floors': total_floors,
-        'furnishing_status': furnishing.lower(),
-        'rent_amount': rent,
-        'deposit_amount': deposit,
-        'maintenance': maintenance,
-        'available_from': str(available),
-        'preferred_tenants': ', '.join(preferred_tenants),
-        'amenities': amenities,
-        'nearby_points': nearby_points,
-        'rough_description': rough_description
-    }
+    # Property Data - normalized through the Listing model
+    property_data = Listing(
+        property_type=property_type,
+        bhk=bhk,
+        area_sqft=area_sqft,
+        state=state,
+        city=city,
+        locality=locality,
+        landmark=landmark,
+        floor_no=floor_no,
+        total_floors=total_floors,
+        furnishing_status=furnishing,
+        rent_amount=rent,
+        deposit_amount=deposit,
+        maintenance=maintenance,
+        available_from=str(available),
+        preferred_tenants=preferred_tenants,
+        amenities=amenities,
+        nearby_points=nearby_points,
+        rough_description=rough_description
+    ).to_property_data()
+    
+    if city and locality:
+        show_similar(property_data, api_key, api_provider)
+    
+    # Speculative mode: generate in the background once the form goes idle
+    provider = get_provider(api_provider)
+    if (st.session_state.get('speculative') and provider is not None and city and locality
+            and needs_regeneration(st.session_state.generated_result, st.session_state.property_data, property_data)):
+        watch_form(property_data, api_key, provider.name)
+    elif st.session_state.speculation:
+        cancel_speculation(st.session_state.speculation)
     
     st.markdown("---")
     
@@ -1048,28 +1095,85 @@ def show_property_form(api_provider, api_key):
             st.error("❌ Please fill City and Locality")
             return
         
+        previous_data = st.session_state.property_data
+        previous_result = st.session_state.generated_result
+        
         st.session_state.property_data = property_data
         st.session_state.enhanced_description = None
         st.session_state.use_enhanced = False
         
-        if regenerate_clicked:
-            st.session_state.generation_count += 1
-        else:
-            st.session_state.generation_count = 0
+        # Small factual edits (rent, deposit, floor...) patch the current version instead of regenerating
+        result = None
+        if generate_clicked and provider is not None:
+            with st.spinner("✨ Updating description..."), section('api'):
+                result = update_result(previous_result, previous_data, property_data, api_key, provider.name)
+            if result:
+                st.session_state.generated_result = result
+                save_current_result(provider.name)
+                st.success("✅ Description updated with your changes!")
         
-        with st.spinner("✨ Generating premium description..."):
-            result = generate_description(property_data, api_provider, api_key, st.session_state.generation_count)
+        if result is None:
+            if regenerate_clicked:
+                st.session_state.generation_count += 1
+            else:
+                st.session_state.generation_count = 0
+            
+            with st.spinner("✨ Generating premium description..."), section('api'):
+                result = generate_description(property_data, api_provider, api_key, st.session_state.generation_count)
+            
+            if result:
+                st.session_state.generated_result = result
+                save_current_result(provider.name if provider is not None else 'template')
+                st.success("✅ Description generated!")
         
-        if result:
-            st.session_state.generated_result = result
-            st.success("✅ Description generated!")
+        if result and provider is not None:
+            # Have the next Regenerate styles ready before they're asked for
+            prefetcher.prefetch_next(property_data, api_key, st.session_state.generation_count, provider.name)
     
     # Display Results
     if st.session_state.generated_result:
-        display_results(api_key)
+        display_results(api_key, api_provider)
+
 
+@profiled('translations')
+def show_translations(result, property_data, api_key, api_provider):
+    """Translate the current result into other languages in one call - returns {code: listing}"""
+    state = st.session_state.translations
+    if state['source'] != result:
+        state = st.session_state.translations = {'source': result, 'languages': {}}
+    provider = get_provider(api_provider)
+    
+    st.markdown("### 🌐 Translations")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        languages = st.multiselect("Languages", list(LANGUAGES), format_func=LANGUAGES.get,
+                                   default=list(state['languages']), label_visibility="collapsed")
+    with col2:
+        missing = [code for code in languages if code not in state['languages']]
+        if st.button("🌐 Translate", use_container_width=True,
+                     disabled=not missing or provider is None or not provider.ready(api_key)):
+            with st.spinner(f"Translating into {len(missing)} language(s)..."), section('api'):
+                state['languages'].update(translate_result(result, property_data, missing, api_key, provider.name))
+            failed = [LANGUAGES[code] for code in missing if code not in state['languages']]
+            if failed:
+                st.warning(f"⚠️ Translation failed: {', '.join(failed)}")
+    
+    shown = [code for code in languages if code in state['languages']]
+    if shown:
+        for tab, code in zip(st.tabs([LANGUAGES[code] for code in shown]), shown):
+            with tab:
+                translated = state['languages'][code]
+                st.markdown(f"**{translated['title']}**")
+                st.markdown(f"*{translated['teaser_text']}*")
+                st.write(translated['full_description'])
+                st.markdown('\n'.join(f"- {point}" for point in translated['bullet_points']))
+                st.caption(f"{translated['meta_title']} • {translated['meta_description']}")
+    st.markdown("---")
+    return {code: state['languages'][code] for code in shown}
 
-def display_results(api_key):
+
+@profiled('results')
+def display_results(api_key, api_provider=None):
     """Display generated results with enhanced UI"""
     result = st.session_state.generated_result
     property_data = st.session_state.property_data
@@ -1132,13 +1236,18 @@ def display_results(api_key):
             ])
         
         if st.button("✨ Generate Enhanced Version", type="primary"):
-            if api_key:
-                with st.spinner("🚀 Enhancing..."):
+            provider = get_provider(api_provider)
+            if provider is not None and provider.ready(api_key):
+                with st.spinner("🚀 Enhancing..."), section('api'):
                     enhanced = generate_enhanced_description(
-                        result['full_description'], property_data, enhance_style, enhance_length, api_key
+                        result['full_description'], property_data, enhance_style, enhance_length, api_key, provider.name
                     )
                     if enhanced:
                         st.session_state.enhanced_description = enhanced
+                        result_store.save_enhanced(st.session_state.user_id, st.session_state.stored_listing,
+                                                   st.session_state.stored_version, enhanced)
+                        st.session_state.memory.pop(('version', st.session_state.stored_listing,
+                                                     st.session_state.stored_version))
                         st.success("✅ Enhanced version ready!")
             else:
                 st.error("Please enter API key")
@@ -1187,11 +1296,19 @@ def display_results(api_key):
     with col2:
         st.markdown("### 🔍 SEO")
         edited_keywords = st.text_input("Keywords", value=", ".join(result['seo_keywords']))
+        suggested = [keyword for keyword in keyword_index.suggest_keywords(st.session_state.property_data, 8)
+                     if keyword not in result['seo_keywords']]
+        if suggested:
+            st.caption("💡 Often used here: " + ", ".join(suggested[:5]))
         edited_meta_title = st.text_input("Meta Title", value=result['meta_title'])
+        st.caption(f"📏 Characters: {len(edited_meta_title)}/{META_TITLE_LIMIT - 1}")
         edited_meta_desc = st.text_area("Meta Description", value=result['meta_description'], height=80)
+        st.caption(f"📏 Characters: {len(edited_meta_desc)}/{META_DESCRIPTION_LIMIT - 1}")
     
     st.markdown("---")
     
+    translations = show_translations(result, property_data, api_key, api_provider)
+    
     # Downloads
     st.markdown("### 💾 Download Options")
     
@@ -1212,8 +1329,9 @@ def display_results(api_key):
             'property_details': property_data,
             'generated_content': edited_result,
             'version': st.session_state.generation_count + 1,
-            'style': current_style
-        }, indent=2)
+            'style': current_style,
+            **({'translations': translations} if translations else {})
+        }, indent=2, ensure_ascii=False)
         st.download_button("📄 Download JSON", json_data, f"property_v{st.session_state.generation_count + 1}.json", "application/json", use_container_width=True)
     
     with col2:
@@ -1246,4 +1364,12 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"""
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        report = end_rerun(rerun_profile, st.session_state.profiles)
+        if report is not None:
+            # The raw dumps are the bulky part - compressed in session memory and the first to go
+            st.session_state.memory.put(('profile', report['label']),
+                                        {'pstats': report.pop('pstats'), 'folded': report.pop('folded')})
+        track_session(st.session_state, st.session_state.memory)
@@ -0,0 +1,495 @@
+"""
+Feed Pipeline
+Streams very large partner feeds (multi-gigabyte CSVs) through generation without
+loading them whole. Rows move through six stages - read, normalize, lookup, generate,
+validate, write - joined by bounded queues, so a slow stage blocks the ones before it
+and memory stays flat however big the feed is. With the API as the slowest stage the
+feed runs as fast as the engine's concurrency limit allows.
+
+    python feed_pipeline.py sample feed.csv --rows 100000
+    python feed_pipeline.py run feed.csv out.jsonl --api-key gsk_... --chunk-rows 5000
+    python feed_pipeline.py run feed.csv.gz out.csv --mock --progress 2
+
+Lookup answers listings already generated in the same style - in the history DB or
+earlier in the same feed - without an API call, so re-running a feed only pays for the
+rows that failed. Output rows carry their feed row number and are written in
+completion order; rows that can't be listed are written with an `error` instead.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import queue
+import re
+import resource
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from async_engine import BATCH_RETRY_COUNT, get_engine
+from generation import validate_and_repair
+from history_db import history_db
+from keyword_index import keyword_index
+from listing import NUMERIC_COLUMNS, SET_COLUMNS, Listing
+from metrics import metrics
+from prompts import get_variation
+from providers import DEFAULT_PROVIDER
+from scheduler import BATCH, DEFAULT_TENANT
+
+# Rows read (and written, and recorded to history) per chunk
+FEED_CHUNK_ROWS = int(os.environ.get("FEED_CHUNK_ROWS", "5000"))
+# Rows each queue between stages holds before the stage feeding it blocks
+FEED_QUEUE_ROWS = int(os.environ.get("FEED_QUEUE_ROWS", "1000"))
+# Generations in flight at once - the engine's adaptive limiter still applies underneath
+FEED_MAX_IN_FLIGHT = int(os.environ.get("FEED_MAX_IN_FLIGHT", "64"))
+# Validation can call the model for repairs, so it gets a few workers
+FEED_VALIDATORS = int(os.environ.get("FEED_VALIDATORS", "4"))
+# Repeats within one feed answered from memory
+RECENT_RESULTS = 2000
+STAGES = ('read', 'normalize', 'lookup', 'generate', 'validate', 'write')
+REQUIRED_FIELDS = ('property_type', 'bhk', 'city', 'locality')
+CSV_COLUMNS = ('row', 'listing_hash', 'source', 'title', 'full_description', 'bullet_points', 'seo_keywords',
+               'meta_title', 'error')
+# How often blocked stages look up to see whether the run was aborted
+POLL_SECONDS = 0.2
+
+_DONE = object()
+_SET_SEPARATORS = re.compile(r'[|;]')
+_NOT_NUMBER = re.compile(r'[^\d.]')
+
+
+class PipelineAborted(Exception):
+    pass
+
+
+def _number(name, value):
+    """Feed numbers come as '12,000', '₹ 12000' or '1200.0'"""
+    text = _NOT_NUMBER.sub('', str(value or ''))
+    if not text:
+        return 0
+    try:
+        return int(float(text))
+    except ValueError:
+        raise ValueError(f"{name} is not a number: {value!r}")
+
+
+def _missing(value):
+    """None, NaN (JSON-lines rows without the field) and blank strings"""
+    if isinstance(value, (list, tuple, dict)):
+        return False
+    return value is None or pd.isna(value) or not str(value).strip()
+
+
+def _set_value(value):
+    """A set column as comma-separated text - JSON lines give lists, CSV feeds '|' or ';' separated strings"""
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value if not _missing(item))
+    return '' if _missing(value) else _SET_SEPARATORS.sub(',', str(value))
+
+
+def normalize_row(raw):
+    """A feed row (strings) as a property_data dict - ValueError for rows that can't be listed"""
+    missing = [name for name in REQUIRED_FIELDS if _missing(raw.get(name))]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    record = {name: '' if _missing(value) else value for name, value in raw.items()}
+    for name in NUMERIC_COLUMNS:
+        record[name] = _number(name, record.get(name))
+    for name in SET_COLUMNS:
+        record[name] = _set_value(raw.get(name))
+    return Listing.from_property_data(record).to_property_data()
+
+
+def read_feed(path, chunk_rows=FEED_CHUNK_ROWS):
+    """Chunks of a CSV or JSON-lines feed (compression from the extension), every value as a string"""
+    if '.jsonl' in path or '.ndjson' in path:
+        return pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False)
+    return pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+
+
+class FeedWriter:
+    """Output rows to JSON lines or CSV (gzipped for .gz paths)"""
+
+    def __init__(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        self._file = opener(path, 'wt', encoding='utf-8', newline='')
+        self._csv = None
+        if '.csv' in path:
+            self._csv = csv.DictWriter(self._file, CSV_COLUMNS, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def write(self, item):
+        row = {'row': item['row'], 'listing_hash': item.get('listing_hash'), 'source': item.get('source')}
+        if item['error']:
+            row['error'] = item['error']
+        else:
+            row.update(item['result'])
+        if self._csv is None:
+            self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            return
+        row['bullet_points'] = '\n'.join(row.get('bullet_points') or [])
+        row['seo_keywords'] = ', '.join(row.get('seo_keywords') or [])
+        self._csv.writerow(row)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class FeedPipeline:
+    """
+    One feed run. Each stage runs on its own thread(s) and takes rows from a bounded
+    queue; run() blocks until the last row is written and returns the summary.
+    """
+
+    def __init__(self, source, output, api_key, provider=DEFAULT_PROVIDER, variation_seed=0,
+                 chunk_rows=FEED_CHUNK_ROWS, queue_rows=FEED_QUEUE_ROWS, max_in_flight=FEED_MAX_IN_FLIGHT,
+                 validators=FEED_VALIDATORS, use_history=True, record_history=True, tenant=DEFAULT_TENANT,
+                 timeout=None):
+        self.source = source
+        self.output = output
+        self.api_key = api_key
+        self.engine = get_engine(provider)
+        self.variation_seed = variation_seed
+        self.chunk_rows = chunk_rows
+        self.max_in_flight = max_in_flight
+        self.validators = validators
+        self.use_history = use_history
+        self.record_history = record_history
+        self.tenant = tenant
+        self.timeout = timeout
+        self.style = get_variation(variation_seed)['focus']
+
+        self.queues = {name: queue.Queue(queue_rows) for name in STAGES[1:]}
+        self.counts = Counter()
+        self.sources = Counter()
+        self.in_flight = 0
+        self.error = None
+        self._recent = OrderedDict()
+        self._live = {}
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._started = None
+
+    # ==================== PLUMBING ====================
+    def _put(self, name, item):
+        """Blocking put into a stage's queue - this is the backpressure"""
+        while not self._abort.is_set():
+            try:
+                self.queues[name].put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+        raise PipelineAborted()
+
+    def _get(self, name, timeout=None):
+        """Next item for a stage - raises queue.Empty after `timeout` seconds (None waits for good)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._abort.is_set():
+            wait_for = POLL_SECONDS if deadline is None else min(POLL_SECONDS, max(0.0, deadline - time.monotonic()))
+            try:
+                return self.queues[name].get(timeout=wait_for)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+        raise PipelineAborted()
+
+    def _count(self, name, rows=1):
+        with self._lock:
+            self.counts[name] += rows
+        metrics.inc(f"feed_{name}_rows_total", rows)
+
+    def _thread(self, name, target, *args):
+        def _run():
+            try:
+                target(*args)
+            except PipelineAborted:
+                pass
+            except Exception as e:
+                # Reading or writing failed - nothing downstream can finish, so stop every stage
+                self.error = self.error or f"{name}: {type(e).__name__}: {e}"
+                self._abort.set()
+        thread = threading.Thread(target=_run, name=f"feed-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _work(self, name, handle, downstream):
+        """Worker loop of a plain stage - rows that already failed pass through untouched"""
+        while True:
+            item = self._get(name)
+            if item is _DONE:
+                break
+            if not item['error']:
+                try:
+                    handle(item)
+                except Exception as e:
+                    item['error'] = f"{name} failed: {e}"
+            self._count(name)
+            self._put(downstream, item)
+        with self._lock:
+            self._live[name] -= 1
+            last = self._live[name] == 0
+        if last:
+            self._put(downstream, _DONE)
+        else:
+            # Let the stage's other workers see it too
+            self._put(name, _DONE)
+
+    # ==================== STAGES ====================
+    def _read(self):
+        row = 0
+        for chunk in read_feed(self.source, self.chunk_rows):
+            for raw in chunk.to_dict('records'):
+                row += 1
+                self._put('normalize', {'row': row, 'raw': raw, 'result': None, 'source': None, 'error': None})
+            self._count('read', len(chunk))
+        self._put('normalize', _DONE)
+
+    def _normalize(self, item):
+        raw = item.pop('raw')
+        try:
+            item['property_data'] = normalize_row(raw)
+        except (ValueError, TypeError) as e:
+            item['error'] = f"rejected: {e}"
+            return
+        item['listing_hash'] = Listing.from_property_data(item['property_data']).content_hash
+
+    def _lookup(self, item):
+        with self._lock:
+            result = self._recent.get(item['listing_hash'])
+        if result is not None:
+            item.update(result=result, source='feed')
+            return
+        if self.use_history:
+            try:
+                result = history_db.latest_result(item['listing_hash'], self.style)
+            except sqlite3.Error:
+                metrics.inc("history_db_errors_total")
+            if result is not None:
+                item.update(result=result, source='history')
+
+    def _generate(self):
+        """Keeps up to max_in_flight generations running on the engine loop, oldest input first"""
+        in_flight = {}
+        done = False
+        while not done or in_flight:
+            while not done and len(in_flight) < self.max_in_flight:
+                try:
+                    # Block for input only when there's nothing to collect
+                    item = self._get('generate', None if not in_flight else 0)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                elif item['error'] or item['result']:
+                    self._count('generate')
+                    self._put('validate', item)
+                else:
+                    future = self.engine.submit(self.engine.generate(
+                        item['property_data'], self.api_key, self.variation_seed, retry_count=BATCH_RETRY_COUNT,
+                        priority=BATCH, tenant=self.tenant), self.timeout)
+                    in_flight[future] = item
+            self.in_flight = len(in_flight)
+            if not in_flight:
+                continue
+            finished, _ = wait(in_flight, POLL_SECONDS, FIRST_COMPLETED)
+            if self._abort.is_set():
+                for future in in_flight:
+                    future.cancel()
+                raise PipelineAborted()
+            for future in finished:
+                item = in_flight.pop(future)
+                try:
+                    item['result'] = future.result()
+                except Exception:
+                    item['result'] = None
+                if item['result']:
+                    item['source'] = 'generated'
+                else:
+                    item['error'] = "generation failed"
+                self._count('generate')
+                self._put('validate', item)
+        self.in_flight = 0
+        self._put('validate', _DONE)
+
+    def _validate(self, item):
+        item['result'] = validate_and_repair(item['result'], item['property_data'], self.api_key,
+                                             self.engine.provider.name)
+        with self._lock:
+            self._recent[item['listing_hash']] = item['result']
+            self._recent.move_to_end(item['listing_hash'])
+            while len(self._recent) > RECENT_RESULTS:
+                self._recent.popitem(last=False)
+
+    def _write(self):
+        writer = FeedWriter(self.output)
+        pending_history = []
+        written = 0
+        try:
+            while True:
+                item = self._get('write')
+                if item is _DONE:
+                    break
+                writer.write(item)
+                self.sources[item['source'] or ('rejected' if item['error'].startswith('rejected') else 'failed')] += 1
+                if item['source'] == 'generated' and self.record_history:
+                    pending_history.append((item['property_data'], item['result']))
+                written += 1
+                self._count('write')
+                if written % self.chunk_rows == 0:
+                    writer.flush()
+                    self._record(pending_history)
+            self._record(pending_history)
+        finally:
+            writer.close()
+
+    def _record(self, pending):
+        if not pending:
+            return
+        try:
+            history_db.record_many(pending, self.variation_seed, self.engine.provider.name, self.tenant)
+        except sqlite3.Error:
+            metrics.inc("history_db_errors_total")
+        pending.clear()
+
+    # ==================== RUN ====================
+    def progress(self):
+        """Per stage: rows done, rows per second so far and rows waiting in its queue"""
+        elapsed = max(1e-9, time.monotonic() - self._started) if self._started else 1e-9
+        with self._lock:
+            counts = dict(self.counts)
+        stages = {}
+        for name in STAGES:
+            rows = counts.get(name, 0)
+            waiting = self.queues[name].qsize() if name in self.queues else 0
+            metrics.set_gauge(f"feed_{name}_queue_depth", waiting)
+            stages[name] = {'rows': rows, 'rate': rows / elapsed, 'queued': waiting}
+        stages['generate']['in_flight'] = self.in_flight
+        metrics.set_gauge("feed_generate_in_flight", self.in_flight)
+        return {'elapsed': elapsed, 'stages': stages, 'peak_rss': peak_rss()}
+
+    def run(self, on_progress=None, interval=5.0):
+        """Run the feed to the end - on_progress(progress()) is called every `interval` seconds"""
+        self._started = time.monotonic()
+        self._live = {'normalize': 1, 'lookup': 1, 'validate': self.validators}
+        threads = [
+            self._thread('read', self._read),
+            self._thread('normalize', self._work, 'normalize', self._normalize, 'lookup'),
+            self._thread('lookup', self._work, 'lookup', self._lookup, 'generate'),
+            self._thread('generate', self._generate),
+            *(self._thread('validate', self._work, 'validate', self._validate, 'write')
+              for _ in range(self.validators)),
+            self._thread('write', self._write),
+        ]
+        writer = threads[-1]
+        try:
+            while writer.is_alive():
+                writer.join(interval)
+                if on_progress is not None:
+                    on_progress(self.progress())
+        except KeyboardInterrupt:
+            self.error = "interrupted"
+            self._abort.set()
+        # A failed writer leaves the other stages blocked - the abort releases them
+        self._abort.set()
+        for thread in threads:
+            thread.join(5)
+        if self.record_history and self.sources['generated']:
+            keyword_index.update()
+        return self.summary()
+
+    def summary(self):
+        progress = self.progress()
+        return {'rows': self.counts['write'], 'sources': dict(self.sources), 'elapsed': progress['elapsed'],
+                'rows_per_second': self.counts['write'] / progress['elapsed'], 'peak_rss': progress['peak_rss'],
+                'error': self.error}
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes"""
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ==================== CLI ====================
+def write_sample_feed(path, rows, chunk_rows=FEED_CHUNK_ROWS):
+    """Synthetic feed of benchmark listings, written a chunk at a time"""
+    from benchmark import sample_listings
+    written = 0
+    while written < rows:
+        chunk = pd.DataFrame(sample_listings(min(chunk_rows, rows - written), seed=written))
+        for name in ('amenities', 'nearby_points'):
+            chunk[name] = chunk[name].map('|'.join)
+        chunk.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(chunk)
+    return written
+
+
+def print_progress(progress):
+    line = '  '.join(f"{name} {stage['rows']}" + (f" (+{stage['queued']})" if stage['queued'] else '')
+                     for name, stage in progress['stages'].items())
+    print(f"[{progress['elapsed']:7.1f}s] {line}  in flight {progress['stages']['generate']['in_flight']}  "
+          f"peak RSS {progress['peak_rss'] / 2 ** 20:.0f} MiB", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate descriptions for a large listing feed, streaming")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sample = commands.add_parser("sample", help="write a synthetic feed CSV")
+    sample.add_argument("path")
+    sample.add_argument("--rows", type=int, default=10000)
+
+    run = commands.add_parser("run", help="run a feed through generation")
+    run.add_argument("source", help="CSV or JSON-lines feed (.gz/.zip/.bz2 read as compressed)")
+    run.add_argument("output", help=".jsonl or .csv, optionally .gz")
+    run.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY"))
+    run.add_argument("--provider", default=DEFAULT_PROVIDER)
+    run.add_argument("--variation", type=int, default=0, help="variation seed (style) to generate")
+    run.add_argument("--chunk-rows", type=int, default=FEED_CHUNK_ROWS)
+    run.add_argument("--queue-rows", type=int, default=FEED_QUEUE_ROWS)
+    run.add_argument("--max-in-flight", type=int, default=FEED_MAX_IN_FLIGHT)
+    run.add_argument("--validators", type=int, default=FEED_VALIDATORS)
+    run.add_argument("--no-history", action="store_true", help="don't reuse or record history")
+    run.add_argument("--record-mock", action="store_true", help="record mock output to history (off by default)")
+    run.add_argument("--progress", type=float, default=5.0, help="seconds between progress lines")
+    run.add_argument("--mock", action="store_true", help="generate against a local mock Groq server")
+    run.add_argument("--time-scale", type=float, default=0.1, help="scale the mock's simulated latency")
+    args = parser.parse_args()
+
+    if args.command == "sample":
+        print(f"wrote {write_sample_feed(args.path, args.rows)} rows to {args.path}")
+        sys.exit(0)
+
+    server = None
+    if args.mock:
+        from mock_groq import start_mock_server
+        server = start_mock_server(time_scale=args.time_scale)
+        get_engine(args.provider).api_url = server.url
+        args.api_key = args.api_key or "mock-key"
+
+    pipeline = FeedPipeline(args.source, args.output, args.api_key, args.provider, args.variation,
+                            chunk_rows=args.chunk_rows, queue_rows=args.queue_rows,
+                            max_in_flight=args.max_in_flight, validators=args.validators,
+                            use_history=not args.no_history,
+                            # Mock output is never real copy - keep it out of history unless asked
+                            record_history=not args.no_history and (not args.mock or args.record_mock))
+    summary = pipeline.run(print_progress, args.progress)
+    if server is not None:
+        server.shutdown()
+
+    sources = ', '.join(f"{count} {name}" for name, count in sorted(summary['sources'].items()))
+    print(f"{summary['rows']} rows in {summary['elapsed']:.1f}s ({summary['rows_per_second']:.1f}/s): {sources}")
+    print(f"peak RSS {summary['peak_rss'] / 2 ** 20:.0f} MiB")
+    if summary['error']:
+        print(f"FAILED: {summary['error']}")
+        sys.exit(1)
@@ -0,0 +1,285 @@
+"""
+AI Generation Functions
+LLM listing generation (Groq or any configured OpenAI-compatible provider),
+template fallback and AI enhancement.
+Kept free of Streamlit so batch jobs and benchmarks can import it.
+"""
+
+import json
+import sqlite3
+
+from async_engine import BATCH_RETRY_COUNT, get_engine, groq_post, parse_json_content
+from history_db import history_db
+from keyword_index import keyword_index
+from listing import listing_key
+from metrics import metrics
+from prefetch import PREFETCH_JOIN_SECONDS, cache_key, response_cache
+from prompts import VARIATION_PROMPTS
+from providers import DEFAULT_PROVIDER, EDIT_MODEL, LISTING_MODEL, get_provider
+from scheduler import BATCH, DEFAULT_TENANT, ENHANCEMENT
+from similarity import description_index
+from translation import translate_async
+from validation import pad_from_fallback, repair_locally
+
+# Extra generations allowed when a result reads like an existing listing
+DEDUPE_REROLLS = 1
+
+
+# ==================== AI GENERATION FUNCTIONS ====================
+def test_groq_api(api_key, provider=DEFAULT_PROVIDER):
+    """Test API connection with a tiny completion"""
+    try:
+        response = groq_post({
+            "model": EDIT_MODEL,
+            "messages": [{"role": "user", "content": "Say 'API is working!'"}],
+            "temperature": 0.5,
+            "max_tokens": 50
+        }, api_key, timeout=15, provider=provider)
+
+        if response.status_code == 200:
+            return True, "✅ API Connection Successful!"
+        else:
+            return False, f"Error {response.status_code}: {response.text[:200]}"
+    except Exception as e:
+        return False, f"Connection Error: {str(e)}"
+
+
+def generate_with_groq(property_data, api_key, retry_count=3, variation_seed=0, prompt_version=None, timeout=None,
+                       provider=DEFAULT_PROVIDER):
+    """Generate PREMIUM description using Groq API with variation support"""
+    engine = get_engine(provider)
+    # A prefetched variation is used as is - it ran the same prompt
+    key = cache_key(property_data, variation_seed, engine.provider.resolve_key(api_key), engine.provider.name,
+                    prompt_version)
+    prefetched = response_cache.take(key, min(timeout or PREFETCH_JOIN_SECONDS, PREFETCH_JOIN_SECONDS))
+    if prefetched is not None:
+        return prefetched
+    try:
+        return engine.run(
+            engine.generate(property_data, api_key, variation_seed, prompt_version, retry_count),
+            timeout
+        )
+    except TimeoutError:
+        return None
+
+
+def plan_batch(listings, api_key, variation_seed=0, provider=DEFAULT_PROVIDER):
+    """Quota fit check and time-to-completion projection for a batch (see QuotaPlanner.plan_job)"""
+    engine = get_engine(provider)
+    tokens = sum(engine.estimate_tokens(property_data, variation_seed) for property_data in listings)
+    quota_key = engine.provider.resolve_key(api_key) or engine.provider.name
+    return engine.quota.plan_job(quota_key, tokens, len(listings), engine.throughput())
+
+
+def generate_batch_with_groq(listings, api_key, variation_seed=0, timeout=None, priority=BATCH, tenant=DEFAULT_TENANT,
+                             provider=DEFAULT_PROVIDER, record_history=True, languages=None):
+    """
+    Generate many listings concurrently on a provider's engine - one result (or None) per listing.
+    With languages, each result is translated as soon as it lands and carries a
+    `translations` dict of language code -> translated listing.
+    """
+    engine = get_engine(provider)
+    if engine.quota.enabled and plan_batch(listings, api_key, variation_seed, provider)['decision'] == 'refuse':
+        # Would eat the interactive share of today's quota - don't start it at all
+        metrics.inc(f"{engine.provider.name}_quota_refused_jobs_total")
+        return [None] * len(listings)
+
+    then = None
+    if languages:
+        async def then(result, property_data):
+            translations = await translate_async(engine, result, property_data, languages, api_key,
+                                                 retry_count=BATCH_RETRY_COUNT, priority=priority, tenant=tenant)
+            return dict(result, translations=translations)
+
+    results = engine.run(engine.generate_many(listings, api_key, variation_seed, timeout, priority=priority, tenant=tenant,
+                                              then=then))
+    if record_history:
+        try:
+            history_db.record_many(zip(listings, results), variation_seed, engine.provider.name, tenant)
+            keyword_index.update()
+        except sqlite3.Error:
+            metrics.inc("history_db_errors_total")
+    return results
+
+
+def generate_fallback(property_data):
+    """Fallback template-based generation"""
+    bhk = property_data['bhk']
+    prop_type = property_data['property_type'].title()
+    locality = property_data['locality']
+    city = property_data['city']
+    area = property_data['area_sqft']
+    rent = property_data['rent_amount']
+    furnishing = property_data['furnishing_status'].title()
+    rough_desc = property_data.get('rough_description', '').strip()
+
+    extra_info = f" {rough_desc}" if rough_desc else ""
+
+    return {
+        "title": f"Spacious {bhk} BHK {prop_type} for Rent in {locality}",
+        "teaser_text": f"Well-maintained {bhk} BHK {prop_type} in prime {locality} location",
+        "full_description": f"Looking for a comfortable home? This beautiful {bhk} BHK {prop_type} in {locality}, {city} is perfect for you. Spread across {area} sqft, this {furnishing} furnished property offers great value at ₹{rent:,}/month.{extra_info}",
+        "bullet_points": [
+            f"{bhk} BHK with {area} sqft area",
+            f"{furnishing} furnished with modern fittings",
+            f"Monthly rent: ₹{rent:,}",
+            f"Preferred for: {property_data['preferred_tenants']}",
+            f"Available from: {property_data['available_from']}"
+        ],
+        # Ranked from past generations for this place - the old fixed strings until there are some
+        "seo_keywords": keyword_index.suggest_keywords(property_data),
+        "meta_title": keyword_index.suggest_meta_titles(property_data, 1)[0],
+        "meta_description": f"Rent this {bhk} BHK in {locality}, {city}. {area} sqft, {furnishing}. ₹{rent:,}/month."
+    }
+
+
+def repair_with_groq(result, violations, property_data, api_key, provider=DEFAULT_PROVIDER):
+    """Send only the fields that broke a rule back to the model"""
+    fields = sorted({violation['field'] for violation in violations})
+    problems = '\n'.join(f"- {violation['message']}" for violation in violations)
+    current = {field: result.get(field) for field in fields}
+
+    prompt = f"""These fields of a rental listing for a {property_data['bhk']} {property_data['property_type'].title()} in {property_data['locality']}, {property_data['city']} break the rules:
+{problems}
+
+Current values:
+{json.dumps(current, ensure_ascii=False)}
+
+Rules: title 8-12 words, not starting with "Discover" or "Welcome"; exactly 5 bullet_points; exactly 5 seo_keywords; meta_title under 60 chars; meta_description under 160 chars with CTA.
+Return ONLY a JSON object with corrected values for these fields: {', '.join(fields)}."""
+
+    try:
+        response = groq_post({
+            "model": EDIT_MODEL,
+            "messages": [
+                {"role": "system", "content": "You fix real estate listing fields. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.5,
+            "max_tokens": 400
+        }, api_key, provider=provider)
+
+        if response.status_code == 200:
+            fixes = parse_json_content(response.json()['choices'][0]['message']['content'])
+            repaired = dict(result)
+            for field in fields:
+                if field in fixes:
+                    repaired[field] = fixes[field]
+            return repaired
+        return None
+
+    except Exception as e:
+        return None
+
+
+def validate_and_repair(result, property_data, api_key=None, provider=DEFAULT_PROVIDER):
+    """Fix rule violations locally, then ask the model for the fields it has to rewrite"""
+    repaired, violations = repair_locally(result)
+    if violations and get_provider(provider).ready(api_key):
+        fixed = repair_with_groq(repaired, violations, property_data, api_key, provider)
+        if fixed:
+            repaired, violations = repair_locally(fixed)
+    if violations:
+        # Never hand the UI a listing with missing fields or short lists
+        repaired = pad_from_fallback(repaired, generate_fallback(property_data))
+    return repaired
+
+
+def avoid_near_duplicates(result, property_data, api_key, variation_seed, provider=DEFAULT_PROVIDER):
+    """Reroll a result that reads like another listing or variation, then index it"""
+    key = f"{listing_key(property_data)}:{variation_seed}"
+    matches = description_index.query(result['full_description'], exclude=key)
+
+    reroll_seed = variation_seed
+    for _ in range(DEDUPE_REROLLS):
+        if not matches:
+            break
+        # Same creative direction, different temperature
+        reroll_seed += len(VARIATION_PROMPTS)
+        candidate = generate_with_groq(property_data, api_key, variation_seed=reroll_seed, provider=provider)
+        if not candidate:
+            break
+        candidate = validate_and_repair(candidate, property_data, api_key, provider)
+        candidate_matches = description_index.query(candidate['full_description'], exclude=key)
+        if not candidate_matches or candidate_matches[0][1] < matches[0][1]:
+            result, matches = candidate, candidate_matches
+
+    description_index.add(key, result['full_description'])
+    return result
+
+
+def generate_description(property_data, api_provider, api_key=None, variation_seed=0):
+    """Main generation function - api_provider is a provider name or UI label"""
+    provider = get_provider(api_provider)
+    if provider is not None and provider.ready(api_key):
+        result = generate_with_groq(property_data, api_key, variation_seed=variation_seed, provider=provider.name)
+        if result:
+            result = validate_and_repair(result, property_data, api_key, provider.name)
+            return avoid_near_duplicates(result, property_data, api_key, variation_seed, provider.name)
+        metrics.inc(f"{provider.name}_fallbacks_total")
+
+    return generate_fallback(property_data)
+
+
+def generate_enhanced_description(original_desc, property_data, style, length, api_key, provider=DEFAULT_PROVIDER):
+    """Generate enhanced version"""
+
+    length_map = {
+        "Medium (200-250 words)": "200-250 words",
+        "Long (300-350 words)": "300-350 words",
+        "Extra Long (400-500 words)": "400-500 words"
+    }
+    target_length = length_map.get(length, "250-300 words")
+
+    style_instructions = {
+        "More Detailed & Elaborate": "Add more specific details about each feature and room descriptions.",
+        "More Emotional & Persuasive": "Use emotional triggers and create vivid lifestyle imagery.",
+        "More Professional & Formal": "Use sophisticated vocabulary and focus on specifications.",
+        "Add Local Flavor & Culture": "Include references to local culture and neighborhood character.",
+        "Focus on Investment Value": "Emphasize rental yield potential and location growth.",
+        "Luxury & Premium Feel": "Use upscale vocabulary and emphasize exclusivity."
+    }
+    style_guide = style_instructions.get(style, "Make it more detailed.")
+
+    location = f"{property_data['locality']}, {property_data['city']}"
+
+    prompt = f"""Enhance this property description:
+
+**ORIGINAL:**
+{original_desc}
+
+**PROPERTY:**
+- {property_data['bhk']} BHK {property_data['property_type'].title()}
+- Location: {location}
+- Area: {property_data['area_sqft']} sq ft
+- Rent: ₹{property_data['rent_amount']:,}/month
+
+**STYLE:** {style_guide}
+**LENGTH:** {target_length}
+
+Return ONLY the enhanced description text, nothing else."""
+
+    try:
+        response = groq_post({
+            "model": LISTING_MODEL,
+            "messages": [
+                {"role": "system", "content": "You are an expert real estate copywriter. Return only the enhanced description."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.8,
+            "max_tokens": 1500
+        }, api_key, priority=ENHANCEMENT, provider=provider)
+
+        if response.status_code == 200:
+            result = response.json()
+            enhanced = result['choices'][0]['message']['content'].strip()
+
+            for prefix in ["Here is", "Here's", "Enhanced description:", "Enhanced version:"]:
+                if enhanced.lower().startswith(prefix.lower()):
+                    enhanced = enhanced[len(prefix):].strip()
+
+            return enhanced
+        return None
+
+    except Exception as e:
+        return None
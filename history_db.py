@@ -0,0 +1,369 @@
+"""
+Generation History
+SQLite database of every generated listing - title, description, bullets, keywords -
+indexed by city, locality, BHK, rent band, style and date, with an FTS5 full-text
+index for search and a "find a previous listing like this one" lookup for reuse.
+
+    python history_db.py --bench 300000
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from listing import listing_key
+from prompts import get_variation
+
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", os.path.join(os.path.expanduser("~"), ".airent", "history.db"))
+
+# Relevance is ranked over the newest this-many matches so common words stay interactive
+RANK_WINDOW = 1000
+
+# Monthly rent band edges in rupees - band n covers [RENT_BANDS[n-1], RENT_BANDS[n])
+RENT_BANDS = (10000, 15000, 20000, 30000, 40000, 60000, 80000, 100000, 150000, 200000, 300000)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT,
+    listing_hash TEXT NOT NULL,
+    version INTEGER,
+    property_type TEXT COLLATE NOCASE,
+    bhk TEXT COLLATE NOCASE,
+    city TEXT COLLATE NOCASE,
+    locality TEXT COLLATE NOCASE,
+    state TEXT COLLATE NOCASE,
+    rent INTEGER,
+    rent_band INTEGER,
+    style TEXT,
+    provider TEXT,
+    created_at TEXT NOT NULL,
+    title TEXT,
+    full_description TEXT,
+    bullet_points TEXT,
+    seo_keywords TEXT,
+    facets TEXT,
+    property_data TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_generations_place ON generations (city, locality, bhk, rent_band, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_band ON generations (city, bhk, rent_band, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_style ON generations (style, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_created ON generations (created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_listing ON generations (listing_hash);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(
+    title, full_description, bullet_points, seo_keywords, facets,
+    content='generations', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+);
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, title, full_description, bullet_points, seo_keywords, facets)
+    VALUES (new.id, new.title, new.full_description, new.bullet_points, new.seo_keywords, new.facets);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, title, full_description, bullet_points, seo_keywords, facets)
+    VALUES ('delete', old.id, old.title, old.full_description, old.bullet_points, old.seo_keywords, old.facets);
+END;
+"""
+
+SUMMARY_COLUMNS = "g.id, g.listing_hash, g.version, g.property_type, g.bhk, g.city, g.locality, g.rent, g.style, g.provider, g.created_at, g.title"
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_NON_ALNUM = re.compile(r'[\W_]+', re.UNICODE)
+
+# Filters that are also indexed as single tokens in the FTS `facets` column
+FACET_FILTERS = ('city', 'locality', 'bhk', 'band', 'style')
+
+
+def rent_band(rent):
+    """Band index for a monthly rent"""
+    return bisect.bisect_right(RENT_BANDS, int(rent or 0))
+
+
+def rent_band_label(band):
+    """Readable range for a band index"""
+    low = RENT_BANDS[band - 1] if band > 0 else 0
+    if band >= len(RENT_BANDS):
+        return f"₹{low:,}+"
+    return f"₹{low:,}-{RENT_BANDS[band]:,}"
+
+
+def facet_token(name, value):
+    """One FTS token for a filter value, e.g. ('locality', 'Andheri West') -> localityandheriwest"""
+    return name + _NON_ALNUM.sub('', str(value).casefold())
+
+
+def fts_query(text):
+    """User text -> FTS5 query: every word must match, the last one as a prefix"""
+    words = _WORD.findall(text or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return ' '.join(terms)
+
+
+def snippet(text, words, width=12):
+    """About `width` words of text around the first query-word hit, hits in **bold**"""
+    tokens = text.split()
+    if not tokens:
+        return ''
+
+    def _hit(token):
+        token = _NON_ALNUM.sub('', token.casefold())
+        # The last query word is matched as a prefix, like the FTS query
+        return any(token == word for word in words[:-1]) or (words and token.startswith(words[-1]))
+
+    first = next((index for index, token in enumerate(tokens) if _hit(token)), 0)
+    start = max(0, first - width // 3)
+    window = tokens[start:start + width]
+    text = ' '.join(f"**{token}**" if _hit(token) else token for token in window)
+    return ('…' if start else '') + text + ('…' if start + width < len(tokens) else '')
+
+
+class HistoryDB:
+    """Generation history on SQLite (WAL) - one connection per thread"""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ==================== WRITES ====================
+    def _row(self, property_data, result, generation_count, provider, user_id, version, created_at):
+        rent = property_data.get('rent_amount') or 0
+        return (
+            user_id, listing_key(property_data), version,
+            property_data.get('property_type'), property_data.get('bhk'), property_data.get('city'),
+            property_data.get('locality'), property_data.get('state'), rent, rent_band(rent),
+            get_variation(generation_count)['focus'], provider,
+            created_at or datetime.now().isoformat(timespec='seconds'),
+            result.get('title', ''), result.get('full_description', ''),
+            '\n'.join(result.get('bullet_points', [])), ', '.join(result.get('seo_keywords', [])),
+            ' '.join(facet_token(name, value) for name, value in (
+                ('city', property_data.get('city')), ('locality', property_data.get('locality')),
+                ('bhk', property_data.get('bhk')), ('band', rent_band(rent)),
+                ('style', get_variation(generation_count)['focus']))),
+            json.dumps(property_data, ensure_ascii=False), json.dumps(result, ensure_ascii=False),
+        )
+
+    def record(self, property_data, result, generation_count=0, provider=None, user_id=None, version=None,
+               created_at=None):
+        """Store one generated result - returns its row id"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO generations (user_id, listing_hash, version, property_type, bhk, city, locality, state, "
+                "rent, rent_band, style, provider, created_at, title, full_description, bullet_points, seo_keywords, "
+                "facets, property_data, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row(property_data, result, generation_count, provider, user_id, version, created_at)
+            )
+        return cursor.lastrowid
+
+    def record_many(self, items, generation_count=0, provider=None, user_id=None):
+        """Store (property_data, result) pairs in one transaction - results that are None are skipped"""
+        rows = [self._row(property_data, result, generation_count, provider, user_id, None, None)
+                for property_data, result in items if result]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO generations (user_id, listing_hash, version, property_type, bhk, city, locality, state, "
+                "rent, rent_band, style, provider, created_at, title, full_description, bullet_points, seo_keywords, "
+                "facets, property_data, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    # ==================== READS ====================
+    def search(self, query=None, city=None, locality=None, bhk=None, band=None, style=None,
+               since=None, until=None, user_id=None, limit=20, offset=0):
+        """
+        Full-text search plus filters, best match first (newest first without a query).
+        Relevance is ranked within the newest RANK_WINDOW matches. Returns summary dicts;
+        with a query each carries a highlighted `snippet`.
+        """
+        where, params = [], []
+        if since:
+            where.append("g.created_at >= ?")
+            params.append(since)
+        if until:
+            where.append("g.created_at < ?")
+            params.append(until)
+        if user_id:
+            where.append("g.user_id = ?")
+            params.append(user_id)
+
+        filters = {'city': city, 'locality': locality, 'bhk': bhk, 'band': band, 'style': style}
+        match = fts_query(query)
+        if match:
+            # Filters join the MATCH as facet tokens so FTS intersects them before ranking
+            facets = [f'facets : "{facet_token(name, value)}"' for name, value in filters.items() if value not in (None, '')]
+            match = ' AND '.join([f"({match})"] + facets)
+            # User and date filters go inside the window too, so older matches of theirs aren't cut off
+            inner = "SELECT generations_fts.rowid AS rowid, rank FROM generations_fts"
+            if where:
+                inner += " JOIN generations g ON g.id = generations_fts.rowid"
+            inner += " WHERE generations_fts MATCH ?"
+            if where:
+                inner += " AND " + " AND ".join(where)
+            inner += " ORDER BY generations_fts.rowid DESC LIMIT ?"
+            sql = (f"SELECT {SUMMARY_COLUMNS}, g.full_description FROM ({inner}) AS hits "
+                   "JOIN generations g ON g.id = hits.rowid ORDER BY hits.rank")
+            params = [match] + params + [RANK_WINDOW]
+        else:
+            for name, value in filters.items():
+                if value not in (None, ''):
+                    where.append(f"g.{'rent_band' if name == 'band' else name} = ?")
+                    params.append(value)
+            sql = f"SELECT {SUMMARY_COLUMNS} FROM generations g"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY g.created_at DESC"
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        rows = [dict(row) for row in self._connect().execute(sql, params)]
+        if match:
+            words = [word.casefold() for word in _WORD.findall(query)]
+            for row in rows:
+                row['snippet'] = snippet(row.pop('full_description'), words)
+        return rows
+
+    def find_similar(self, property_data, limit=5):
+        """
+        Previous listings like this one: same type, BHK, city and locality first (those can be
+        patched into the new facts by incremental.update_result), then the same city and BHK
+        in a neighbouring rent band - closest rent first, newest first on ties.
+        """
+        rent = property_data.get('rent_amount') or 0
+        band = rent_band(rent)
+        sql = (f"SELECT {SUMMARY_COLUMNS}, "
+               "(g.locality = ? AND g.property_type = ? AND g.state = ?) AS same_place "
+               "FROM generations g WHERE g.city = ? AND g.bhk = ? AND g.rent_band BETWEEN ? AND ? "
+               "ORDER BY same_place DESC, abs(g.rent - ?), g.created_at DESC LIMIT ?")
+        params = (property_data.get('locality'), property_data.get('property_type'), property_data.get('state'),
+                  property_data.get('city'), property_data.get('bhk'), band - 1, band + 1, rent, limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def get(self, row_id):
+        """Full record with property_data and result decoded"""
+        row = self._connect().execute("SELECT * FROM generations WHERE id = ?", (row_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['property_data'] = json.loads(record['property_data'])
+        record['result'] = json.loads(record['result'])
+        return record
+
+    def latest_result(self, listing_hash, style=None):
+        """Newest stored result for a listing (in one style, if given) - None if it was never generated"""
+        sql = "SELECT result FROM generations WHERE listing_hash = ?"
+        params = [listing_hash]
+        if style is not None:
+            sql += " AND style = ?"
+            params.append(style)
+        row = self._connect().execute(sql + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def keyword_rows(self, after_id=0, limit=10000):
+        """(id, property_type, bhk, city, locality, seo_keywords list, meta_title) of rows after `after_id`, oldest first"""
+        sql = ("SELECT id, property_type, bhk, city, locality, json_extract(result, '$.seo_keywords'), "
+               "json_extract(result, '$.meta_title') FROM generations WHERE id > ? ORDER BY id LIMIT ?")
+        rows = []
+        for row in self._connect().execute(sql, (after_id, limit)):
+            try:
+                keywords = json.loads(row[5]) if row[5] else []
+            except ValueError:
+                keywords = []
+            rows.append((row[0], row[1], row[2], row[3], row[4], keywords, row[6]))
+        return rows
+
+    def result_rows(self, after_id=0, limit=10000):
+        """(id, listing_hash, style, property_data, result) of rows after `after_id`, oldest first, decoded"""
+        sql = ("SELECT id, listing_hash, style, property_data, result FROM generations WHERE id > ? "
+               "ORDER BY id LIMIT ?")
+        return [(row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]))
+                for row in self._connect().execute(sql, (after_id, limit))]
+
+    def last_id(self):
+        return self._connect().execute("SELECT coalesce(max(id), 0) FROM generations").fetchone()[0]
+
+    def count(self):
+        return self._connect().execute("SELECT count(*) FROM generations").fetchone()[0]
+
+    def facets(self, column, limit=50):
+        """Most common values of an indexed column - for filter dropdowns"""
+        if column not in ('city', 'locality', 'bhk', 'style'):
+            raise ValueError(f"Not a facet column: {column}")
+        sql = f"SELECT {column}, count(*) AS n FROM generations GROUP BY {column} ORDER BY n DESC LIMIT ?"
+        return [(row[0], row[1]) for row in self._connect().execute(sql, (limit,))]
+
+
+# Shared by the app and batch jobs in this process
+history_db = HistoryDB()
+
+
+def _bench(count, path):
+    """Fill a scratch database with mock listings and time typical searches"""
+    import random
+
+    from benchmark import sample_listings
+    from mock_groq import fake_listing
+
+    if os.path.exists(path):
+        os.remove(path)
+    db = HistoryDB(path)
+    rng = random.Random(7)
+    started = time.perf_counter()
+    chunk = 10000
+    for start in range(0, count, chunk):
+        listings = sample_listings(min(chunk, count - start), seed=start)
+        db.record_many(((listing, fake_listing(rng)) for listing in listings), generation_count=start // chunk)
+    print(f"inserted {db.count():,} rows in {time.perf_counter() - started:.1f}s")
+
+    probe = sample_listings(1, seed=123)[0]
+    cases = [
+        ("text: 'sea view balcony'", dict(query="sea view balcony")),
+        ("text + city/bhk", dict(query="metro connectivity", city="Pune", bhk="2 BHK")),
+        ("prefix 'sunl'", dict(query="sunl")),
+        ("filters only", dict(city="Mumbai", locality="Powai", bhk="3 BHK")),
+        ("rent band + style", dict(band=rent_band(40000), style=get_variation(2)['focus'])),
+    ]
+    for label, kwargs in cases:
+        started = time.perf_counter()
+        rows = db.search(limit=20, **kwargs)
+        print(f"{label:<28} {len(rows):>3} rows {1000 * (time.perf_counter() - started):>8.2f} ms")
+    started = time.perf_counter()
+    rows = db.find_similar(probe)
+    print(f"{'find_similar':<28} {len(rows):>3} rows {1000 * (time.perf_counter() - started):>8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generation history database")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="time searches over a scratch database of ROWS listings")
+    parser.add_argument("--db", default="/tmp/history_bench.db")
+    parser.add_argument("--search", help="full-text search the real history database")
+    args = parser.parse_args()
+
+    if args.bench:
+        _bench(args.bench, args.db)
+    elif args.search:
+        for row in history_db.search(args.search):
+            print(f"{row['created_at']}  {row['city']}/{row['locality']}  {row['bhk']}  {row['title']}")
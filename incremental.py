@@ -0,0 +1,297 @@
+"""
+Incremental Regeneration
+Patch an existing generated listing when only a few form fields change
+instead of paying for a full regeneration.
+"""
+
+import json
+import re
+
+from async_engine import groq_post, parse_json_content
+from providers import DEFAULT_PROVIDER, EDIT_MODEL, get_provider
+from validation import repair_locally
+
+# Fields that change what the listing *is* - these always need a full regeneration
+STRUCTURAL_FIELDS = ('property_type', 'bhk', 'city', 'locality', 'state')
+
+# Numeric facts that can be rewritten in place in the generated text
+NUMERIC_FIELDS = ('rent_amount', 'deposit_amount', 'maintenance', 'area_sqft')
+
+# Floor facts only make sense to replace next to the word "floor"
+FLOOR_FIELDS = ('floor_no', 'total_floors')
+
+# Free-text facts that are replaced verbatim (case-insensitive)
+TEXT_FIELDS = ('landmark', 'available_from', 'furnishing_status')
+
+# Facts that need a small edit prompt because they change the wording
+PROMPT_FIELDS = ('amenities', 'nearby_points', 'preferred_tenants', 'rough_description')
+
+TEXT_RESULT_FIELDS = ('title', 'teaser_text', 'full_description', 'meta_title', 'meta_description')
+LIST_RESULT_FIELDS = ('bullet_points', 'seo_keywords')
+
+
+# ==================== DIFFING ====================
+def diff_property_data(old_data, new_data):
+    """Return the set of property_data keys whose values differ"""
+    if not old_data:
+        return set(new_data)
+
+    changed = set()
+    for key in set(old_data) | set(new_data):
+        old_value = old_data.get(key)
+        new_value = new_data.get(key)
+        if isinstance(old_value, list) and isinstance(new_value, list):
+            if sorted(old_value) != sorted(new_value):
+                changed.add(key)
+        elif old_value != new_value:
+            changed.add(key)
+    return changed
+
+
+def is_structural_change(changed_fields):
+    """True when the change needs a full regeneration"""
+    return any(field in STRUCTURAL_FIELDS for field in changed_fields)
+
+
+def needs_regeneration(result, old_data, new_data):
+    """True when Generate would have to write new_data from scratch rather than patch or keep result"""
+    if not result or not old_data:
+        return True
+    return is_structural_change(diff_property_data(old_data, new_data))
+
+
+# ==================== NUMBER FORMATS ====================
+def _indian_format(value):
+    """Format a number with Indian digit grouping (1,50,000)"""
+    digits = str(int(value))
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return ','.join(groups) + ',' + tail
+
+
+def _lakh_format(value):
+    """Format an amount in lakhs (1.5) or None below one lakh"""
+    if value < 100000:
+        return None
+    return f"{value / 100000:.2f}".rstrip('0').rstrip('.')
+
+
+def _number_forms(value):
+    """Every way the model is likely to have written this amount, keyed by style"""
+    value = int(value)
+    forms = {
+        'comma': f"{value:,}",
+        'indian': _indian_format(value),
+        'plain': str(value),
+    }
+    if value >= 1000 and value % 1000 == 0:
+        forms['k'] = f"{value // 1000}k"
+        forms['K'] = f"{value // 1000}K"
+    lakhs = _lakh_format(value)
+    if lakhs:
+        forms['lakh'] = f"{lakhs} lakh"
+        forms['Lakh'] = f"{lakhs} Lakh"
+    return forms
+
+
+def _replace_number(text, old_value, new_value):
+    """Replace every written form of old_value with the same form of new_value"""
+    old_forms = _number_forms(old_value)
+    new_forms = _number_forms(new_value)
+
+    replacements = {}
+    for style, old_form in old_forms.items():
+        # Styles the new amount can't be written in (85k -> 85,500) fall back to commas
+        replacements.setdefault(old_form, new_forms.get(style, new_forms['comma']))
+
+    alternatives = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile(
+        r'(?<![\d,.])(' + '|'.join(re.escape(form) for form in alternatives) + r')(?![\d,]*\d)'
+    )
+    return pattern.subn(lambda match: replacements[match.group(1)], text)
+
+
+def _replace_floor(text, old_value, new_value):
+    """Replace a floor number only where it is written next to 'floor'/'storey'"""
+    pattern = re.compile(
+        r'(?<!\d)' + str(int(old_value)) + r'(st|nd|rd|th)?(?=[- ](floor|floors|stor(e)?y|storeys|stories)\b)',
+        re.IGNORECASE
+    )
+
+    def _ordinal(number):
+        if 10 <= number % 100 <= 20:
+            return 'th'
+        return {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+
+    def _sub(match):
+        suffix = _ordinal(int(new_value)) if match.group(1) else ''
+        return f"{int(new_value)}{suffix}"
+
+    return pattern.subn(_sub, text)
+
+
+def _replace_text(text, old_value, new_value):
+    """Case-insensitive verbatim replacement, keeping title case where the model used it"""
+    if not old_value:
+        return text, 0
+    pattern = re.compile(re.escape(old_value), re.IGNORECASE)
+
+    def _sub(match):
+        found = match.group(0)
+        if found.istitle():
+            return new_value.title()
+        if found.isupper():
+            return new_value.upper()
+        return new_value
+
+    return pattern.subn(_sub, text)
+
+
+def _apply_to_result(result, replace):
+    """Run a text replacement over every text field of a result"""
+    patched = dict(result)
+    total = 0
+    for field in TEXT_RESULT_FIELDS:
+        if isinstance(patched.get(field), str):
+            patched[field], count = replace(patched[field])
+            total += count
+    for field in LIST_RESULT_FIELDS:
+        if isinstance(patched.get(field), list):
+            new_items = []
+            for item in patched[field]:
+                item, count = replace(item)
+                new_items.append(item)
+                total += count
+            patched[field] = new_items
+    return patched, total
+
+
+# ==================== LOCAL PATCHING ====================
+def patch_result_locally(result, old_data, new_data, changed_fields):
+    """
+    Rewrite numeric and factual edits directly in the generated text.
+    Returns (patched_result, unresolved_fields) - unresolved fields need the model, including
+    facts the text doesn't spell the way they are stored.
+    """
+    patched = dict(result)
+    unresolved = set()
+
+    # Two amounts that were written identically can't be told apart in the text
+    old_amounts = [old_data.get(field) for field in NUMERIC_FIELDS if old_data.get(field)]
+
+    for field in sorted(changed_fields):
+        old_value = old_data.get(field)
+        new_value = new_data.get(field)
+
+        if field in NUMERIC_FIELDS:
+            if not old_value or old_amounts.count(old_value) > 1 or not new_value:
+                unresolved.add(field)
+                continue
+            patched, count = _apply_to_result(
+                patched, lambda text: _replace_number(text, old_value, new_value)
+            )
+        elif field in FLOOR_FIELDS:
+            patched, count = _apply_to_result(
+                patched, lambda text: _replace_floor(text, old_value, new_value)
+            )
+        elif field in TEXT_FIELDS:
+            if not old_value or not new_value:
+                # Adding or removing a landmark changes the wording
+                unresolved.add(field)
+                continue
+            patched, count = _apply_to_result(
+                patched, lambda text: _replace_text(text, str(old_value), str(new_value))
+            )
+        else:
+            # PROMPT_FIELDS and anything new go to the model
+            unresolved.add(field)
+            continue
+
+        if not count:
+            # Not written the way it's stored ("25 thousand", "November 1") - the model finds it
+            unresolved.add(field)
+
+    return patched, unresolved
+
+
+# ==================== EDIT PROMPT ====================
+def _describe_change(field, old_value, new_value):
+    """One line describing a fact change for the edit prompt"""
+    label = field.replace('_', ' ')
+    if isinstance(old_value, list) or isinstance(new_value, list):
+        old_items = set(old_value or [])
+        new_items = set(new_value or [])
+        added = ', '.join(sorted(new_items - old_items)) or 'none'
+        removed = ', '.join(sorted(old_items - new_items)) or 'none'
+        return f"- {label}: added [{added}], removed [{removed}]"
+    return f"- {label}: was \"{old_value}\", now \"{new_value}\""
+
+
+def patch_with_groq(result, old_data, new_data, fields, api_key, provider=DEFAULT_PROVIDER):
+    """Ask the model to update only the fields affected by a fact change"""
+    changes = '\n'.join(_describe_change(field, old_data.get(field), new_data.get(field)) for field in sorted(fields))
+    current = {field: result.get(field) for field in TEXT_RESULT_FIELDS + LIST_RESULT_FIELDS}
+
+    prompt = f"""This rental listing JSON is out of date. Facts changed:
+{changes}
+
+Current listing:
+{json.dumps(current, ensure_ascii=False)}
+
+Return ONLY a JSON object containing the fields that must change to reflect the new facts, with their full new values. Keep everything else word-for-word. Keep exactly 5 bullet_points if you return them."""
+
+    try:
+        response = groq_post({
+            "model": EDIT_MODEL,
+            "messages": [
+                {"role": "system", "content": "You edit real estate listings. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 800
+        }, api_key, provider=provider)
+
+        if response.status_code == 200:
+            updates = parse_json_content(response.json()['choices'][0]['message']['content'])
+            patched = dict(result)
+            for field, value in updates.items():
+                if field in TEXT_RESULT_FIELDS and isinstance(value, str):
+                    patched[field] = value
+                elif field in LIST_RESULT_FIELDS and isinstance(value, list):
+                    patched[field] = [str(item) for item in value]
+            return patched
+        return None
+
+    except Exception:
+        return None
+
+
+def update_result(result, old_data, new_data, api_key=None, provider=DEFAULT_PROVIDER):
+    """
+    Diff-aware update of an existing result.
+    Returns the patched result, or None when a full regeneration is needed.
+    """
+    if not result or not old_data:
+        return None
+
+    changed = diff_property_data(old_data, new_data)
+    if not changed or is_structural_change(changed):
+        return None
+
+    patched, unresolved = patch_result_locally(result, old_data, new_data, changed)
+    if unresolved:
+        if not get_provider(provider).ready(api_key):
+            return None
+        patched = patch_with_groq(patched, old_data, new_data, unresolved, api_key, provider)
+        if not patched:
+            return None
+
+    # Longer amounts can push meta fields over their limits
+    return repair_locally(patched)[0]
@@ -0,0 +1,328 @@
+"""
+SEO Keyword Index
+Inverted index of the SEO keywords and meta titles in the generation history, keyed by
+city, locality, BHK and property type. Place names are folded into templates
+("2 bhk flat powai" -> "{bhk} {type} {locality}") so what worked in one locality is
+suggested for the next one. Suggestions are ranked in memory with no API call, and can
+seed the listing prompt so the model skips writing those fields.
+
+    python keyword_index.py --bench 100000
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+
+from history_db import history_db
+from validation import KEYWORD_COUNT, META_TITLE_LIMIT, truncate_at_word
+
+# Newest history rows read when the index is first built
+BUILD_ROWS = int(os.environ.get("KEYWORD_INDEX_ROWS", "100000"))
+# KEYWORD_SEED=1 hands the index's picks to the listing prompt instead of asking the model
+KEYWORD_SEED = os.environ.get("KEYWORD_SEED", "0") == "1"
+# Observations of this listing's locality needed before its picks are trusted as a seed
+SEED_MIN_SAMPLES = 3
+# Ranked templates kept per scope
+SCOPE_TOP = 20
+# Listings whose ranked suggestions are memoized between index updates
+CACHE_SIZE = 10000
+
+# Scope weights - the closer the match to the listing, the more a template counts
+SCOPE_WEIGHTS = {'place': 8.0, 'locality': 4.0, 'config': 2.0, 'city': 1.0, 'all': 0.5}
+# Scopes where templates naming a specific landmark or street still make sense
+LOCAL_SCOPES = ('place', 'locality')
+
+# The template fallback's fixed strings - what a listing gets before any history exists
+PRIOR_KEYWORDS = ("{bhk} bhk {city}", "{locality} rental", "{type} rent", "flat {locality}", "rent {city}")
+PRIOR_META_TITLES = ("{bhk} BHK {type} for Rent in {locality}",)
+PRIOR_WEIGHT = 0.25
+
+_SPACES = re.compile(r'\s+')
+_PLACEHOLDER = re.compile(r'\{(bhk|type|city|locality)\}')
+
+
+def _fold(value):
+    return _SPACES.sub(' ', str(value or '')).strip().casefold()
+
+
+def place_values(property_data):
+    """Placeholder -> value for a listing"""
+    return {
+        'bhk': str(property_data.get('bhk') or '').strip(),
+        'type': str(property_data.get('property_type') or '').strip(),
+        'city': str(property_data.get('city') or '').strip(),
+        'locality': str(property_data.get('locality') or '').strip(),
+    }
+
+
+def scope_keys(values):
+    """(scope name, index key) pairs for a listing, closest first"""
+    city, locality, bhk, prop_type = (_fold(values[name]) for name in ('city', 'locality', 'bhk', 'type'))
+    return (
+        ('place', ('place', city, locality, bhk, prop_type)),
+        ('locality', ('locality', city, locality)),
+        ('config', ('config', city, bhk, prop_type)),
+        ('city', ('city', city)),
+        ('all', ('all',)),
+    )
+
+
+def to_template(text, values):
+    """Replace the listing's own place names in text with placeholders"""
+    text = _SPACES.sub(' ', str(text or '')).strip()
+    if '{' in text or '}' in text:
+        return None
+    folded = text.casefold()
+    # Longest first so "Navi Mumbai" wins over "Mumbai"
+    for name, value in sorted(values.items(), key=lambda item: -len(item[1])):
+        if value and value.casefold() in folded:
+            text = re.sub(rf'(?<!\w){re.escape(value)}(?!\w)', '{' + name + '}', text, flags=re.IGNORECASE)
+    return text or None
+
+
+def fill_template(template, values, title_case=False):
+    """Put a listing's place names into a template"""
+    def _value(match):
+        value = values[match.group(1)]
+        if title_case and match.group(1) == 'type':
+            return value.title()
+        return value
+    return _PLACEHOLDER.sub(_value, template)
+
+
+class _Scope:
+    """Template counts for one index key, with a ranked list rebuilt lazily after updates"""
+
+    __slots__ = ('counts', 'samples', '_ranked')
+
+    def __init__(self):
+        self.counts = {}
+        self.samples = 0
+        self._ranked = None
+
+    def add(self, template):
+        self.counts[template] = self.counts.get(template, 0) + 1
+        self._ranked = None
+
+    def ranked(self):
+        if self._ranked is None:
+            self._ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:SCOPE_TOP]
+        return self._ranked
+
+
+class KeywordIndex:
+    """In-memory keyword and meta title index over the generation history"""
+
+    def __init__(self, db=None, build_rows=BUILD_ROWS):
+        self.db = db
+        self.build_rows = build_rows
+        self._keywords = {}
+        self._titles = {}
+        self._last_id = None
+        self._builder = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(scope.samples for key, scope in self._keywords.items() if key[0] == 'all')
+
+    # ==================== UPDATES ====================
+    def _scope(self, table, key):
+        scope = table.get(key)
+        if scope is None:
+            scope = table[key] = _Scope()
+        return scope
+
+    def _add(self, property_type, bhk, city, locality, keywords, meta_title):
+        values = {'bhk': str(bhk or ''), 'type': str(property_type or ''), 'city': str(city or ''),
+                  'locality': str(locality or '')}
+        folded = {name: _fold(value) for name, value in values.items()}
+        keyword_templates = {to_template(keyword.casefold(), folded) for keyword in keywords or () if isinstance(keyword, str)}
+        keyword_templates.discard(None)
+        title_template = to_template(meta_title, values) if isinstance(meta_title, str) else None
+
+        for scope_name, key in scope_keys(values):
+            local = scope_name in LOCAL_SCOPES
+            keyword_scope = self._scope(self._keywords, key)
+            keyword_scope.samples += 1
+            for template in keyword_templates:
+                # Templates with no placeholder name somewhere specific - keep them local
+                if local or '{' in template:
+                    keyword_scope.add(template)
+            if title_template and (local or '{' in title_template):
+                title_scope = self._scope(self._titles, key)
+                title_scope.samples += 1
+                title_scope.add(title_template)
+
+    def refresh(self, chunk=2000):
+        """Index history rows written since the last refresh (the newest BUILD_ROWS on first use)"""
+        db = self.db or history_db
+        started = time.perf_counter()
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = max(0, db.last_id() - self.build_rows)
+        added = 0
+        while True:
+            # One chunk per lock hold so suggestions keep flowing during a first build
+            with self._lock:
+                rows = db.keyword_rows(self._last_id, chunk)
+                for row_id, property_type, bhk, city, locality, keywords, meta_title in rows:
+                    self._add(property_type, bhk, city, locality, keywords, meta_title)
+                    self._last_id = row_id
+                if rows:
+                    self._cache.clear()
+            if len(rows) < chunk:
+                break
+            added += len(rows)
+        self.build_seconds = time.perf_counter() - started
+        return added + len(rows)
+
+    def start(self):
+        """Build the index on a background thread - suggestions fall back to the priors until it lands"""
+        with self._lock:
+            if self._builder is not None:
+                return self._builder
+            self._builder = threading.Thread(target=self.refresh, name="keyword-index", daemon=True)
+        self._builder.start()
+        return self._builder
+
+    def update(self):
+        """Pick up newly written history rows - starts the first build instead if it hasn't run"""
+        if self._builder is None:
+            self.start()
+        else:
+            self.refresh()
+
+    def _ensure(self):
+        if self._builder is None:
+            self.start()
+
+    # ==================== SUGGESTIONS ====================
+    def _rank(self, table, values, priors):
+        scores = {}
+        for scope_name, key in scope_keys(values):
+            scope = table.get(key)
+            if scope is None:
+                continue
+            weight = SCOPE_WEIGHTS[scope_name]
+            for template, count in scope.ranked():
+                scores[template] = scores.get(template, 0.0) + weight * count
+        for template in priors:
+            scores[template] = scores.get(template, 0.0) + PRIOR_WEIGHT
+        # Ties keep scope order, then prior order
+        return sorted(scores, key=lambda template: -scores[template])
+
+    def _suggest(self, kind, property_data):
+        values = place_values(property_data)
+        cache_key = (kind, tuple(_fold(value) for value in values.values()))
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            suggestions = self._rank_fill(kind, values)
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[cache_key] = suggestions
+        return suggestions
+
+    def _rank_fill(self, kind, values):
+        if kind == 'keywords':
+            folded = {name: _fold(value) for name, value in values.items()}
+            suggestions = []
+            for template in self._rank(self._keywords, values, PRIOR_KEYWORDS):
+                keyword = fill_template(template, folded)
+                if keyword not in suggestions:
+                    suggestions.append(keyword)
+                    if len(suggestions) == SCOPE_TOP:
+                        break
+        elif kind == 'shortened_title':
+            # Nothing fits the limit - the top title cut at a word boundary
+            template = self._rank(self._titles, values, PRIOR_META_TITLES)[0]
+            suggestions = [truncate_at_word(fill_template(template, values, title_case=True), META_TITLE_LIMIT)]
+        else:
+            suggestions = []
+            for template in self._rank(self._titles, values, PRIOR_META_TITLES):
+                title = fill_template(template, values, title_case=True)
+                if len(title) < META_TITLE_LIMIT and title not in suggestions:
+                    suggestions.append(title)
+                    if len(suggestions) == SCOPE_TOP:
+                        break
+        return suggestions
+
+    def suggest_keywords(self, property_data, limit=KEYWORD_COUNT):
+        """Ranked SEO keywords for a listing - history for the same place first, then wider scopes"""
+        self._ensure()
+        return self._suggest('keywords', property_data)[:limit]
+
+    def suggest_meta_titles(self, property_data, limit=3):
+        """
+        Ranked meta titles (under META_TITLE_LIMIT characters) for a listing - always at least
+        one, the top title shortened when none fits as it is
+        """
+        self._ensure()
+        return (self._suggest('titles', property_data) or self._suggest('shortened_title', property_data))[:limit]
+
+    def samples(self, property_data):
+        """Indexed generations for the listing's locality"""
+        self._ensure()
+        scope = self._keywords.get(scope_keys(place_values(property_data))[1][1])
+        return scope.samples if scope else 0
+
+    def seed_for(self, property_data, min_samples=SEED_MIN_SAMPLES):
+        """
+        SEO fields to hand the prompt (see prompts.build_prompt) - None until the locality has
+        history, or when no meta title fits as it is (the model writes one instead)
+        """
+        if self.samples(property_data) < min_samples:
+            return None
+        titles = self._suggest('titles', property_data)
+        if not titles:
+            return None
+        return {
+            'seo_keywords': self.suggest_keywords(property_data),
+            'meta_title': titles[0],
+        }
+
+
+# Shared by the app, the engine and batch jobs in this process
+keyword_index = KeywordIndex()
+
+
+def _bench(count, path):
+    """Index a scratch history database of mock listings and time suggestions"""
+    from benchmark import sample_listings
+    from history_db import HistoryDB, _bench as fill_history
+
+    if not os.path.exists(path):
+        fill_history(count, path)
+    index = KeywordIndex(HistoryDB(path), build_rows=count)
+    index.start().join()
+    print(f"indexed {len(index):,} rows in {index.build_seconds:.2f}s")
+
+    probes = sample_listings(1000, seed=99)
+    for label, call in (("suggest_keywords", index.suggest_keywords), ("suggest_meta_titles", index.suggest_meta_titles)):
+        call(probes[0])
+        index._cache.clear()
+        started = time.perf_counter()
+        for probe in probes:
+            call(probe)
+        cold = (time.perf_counter() - started) / len(probes)
+        started = time.perf_counter()
+        for probe in probes:
+            call(probe)
+        warm = (time.perf_counter() - started) / len(probes)
+        print(f"{label:<22} {cold * 1e6:>8.1f} us uncached {warm * 1e6:>8.2f} us cached")
+    print("example:", index.suggest_keywords(probes[0]), index.suggest_meta_titles(probes[0], 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SEO keyword index")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="time suggestions over a scratch history of ROWS listings")
+    parser.add_argument("--db", default="/tmp/history_bench.db")
+    args = parser.parse_args()
+
+    if args.bench:
+        _bench(args.bench, args.db)
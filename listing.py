@@ -0,0 +1,273 @@
+"""
+Listing Model
+Typed, normalized listing record with a stable content hash, plus a columnar
+container for bulk jobs that would otherwise carry one dict per row.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+ANY_TENANT = 'Any'
+
+
+def _clean(text):
+    """Strip and collapse internal whitespace"""
+    return ' '.join(str(text or '').split())
+
+
+def _canonical_set(values):
+    """Deduplicated, sorted tuple of cleaned items"""
+    if isinstance(values, str):
+        values = values.split(',')
+    seen = {}
+    for value in values or ():
+        value = _clean(value)
+        if value:
+            seen.setdefault(value.casefold(), value)
+    return tuple(seen[key] for key in sorted(seen))
+
+
+def canonical_tenants(values):
+    """Tenant set - 'Any' already covers everybody else"""
+    tenants = _canonical_set(values)
+    if any(tenant.casefold() == ANY_TENANT.casefold() for tenant in tenants):
+        return (ANY_TENANT,)
+    return tenants
+
+
+@dataclass(frozen=True, slots=True)
+class Listing:
+    """One rental listing, normalized so equal listings compare and hash equal"""
+
+    property_type: str
+    bhk: str
+    area_sqft: int
+    city: str
+    locality: str
+    state: str = ''
+    landmark: str = ''
+    floor_no: int = 0
+    total_floors: int = 0
+    furnishing_status: str = 'unfurnished'
+    rent_amount: int = 0
+    deposit_amount: int = 0
+    maintenance: int = 0
+    available_from: str = ''
+    preferred_tenants: tuple = ()
+    amenities: tuple = ()
+    nearby_points: tuple = ()
+    rough_description: str = ''
+
+    def __post_init__(self):
+        # frozen dataclass - normalize through object.__setattr__
+        set_field = object.__setattr__
+        set_field(self, 'property_type', _clean(self.property_type).lower())
+        set_field(self, 'furnishing_status', _clean(self.furnishing_status).lower())
+        for name in ('bhk', 'city', 'locality', 'state', 'landmark', 'available_from', 'rough_description'):
+            set_field(self, name, _clean(getattr(self, name)))
+        for name in ('area_sqft', 'floor_no', 'total_floors', 'rent_amount', 'deposit_amount', 'maintenance'):
+            set_field(self, name, int(getattr(self, name) or 0))
+        set_field(self, 'preferred_tenants', canonical_tenants(self.preferred_tenants))
+        set_field(self, 'amenities', _canonical_set(self.amenities))
+        set_field(self, 'nearby_points', _canonical_set(self.nearby_points))
+
+    @classmethod
+    def from_property_data(cls, property_data):
+        """Build from the property_data dict used across the app, ignoring unknown keys"""
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in property_data.items() if key in names})
+
+    def to_property_data(self):
+        """The property_data dict shape the generators expect"""
+        return {
+            'property_type': self.property_type,
+            'bhk': self.bhk,
+            'area_sqft': self.area_sqft,
+            'state': self.state,
+            'city': self.city,
+            'locality': self.locality,
+            'landmark': self.landmark,
+            'floor_no': self.floor_no,
+            'total_floors': self.total_floors,
+            'furnishing_status': self.furnishing_status,
+            'rent_amount': self.rent_amount,
+            'deposit_amount': self.deposit_amount,
+            'maintenance': self.maintenance,
+            'available_from': self.available_from,
+            'preferred_tenants': ', '.join(self.preferred_tenants),
+            'amenities': list(self.amenities),
+            'nearby_points': list(self.nearby_points),
+            'rough_description': self.rough_description,
+        }
+
+    def canonical_json(self):
+        """Case-insensitive canonical form the content hash is taken over"""
+        values = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if isinstance(value, str):
+                value = value.casefold()
+            elif isinstance(value, tuple):
+                value = [item.casefold() for item in value]
+            values[field.name] = value
+        return json.dumps(values, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+    @property
+    def content_hash(self):
+        """Stable 16-hex-char key for caches and dedupe"""
+        return hashlib.blake2b(self.canonical_json().encode('utf-8'), digest_size=8).hexdigest()
+
+
+def listing_key(property_data):
+    """Content hash for a property_data dict"""
+    return Listing.from_property_data(property_data).content_hash
+
+
+# ==================== COLUMNAR BATCH ====================
+NUMERIC_COLUMNS = ('area_sqft', 'floor_no', 'total_floors', 'rent_amount', 'deposit_amount', 'maintenance')
+CATEGORY_COLUMNS = ('property_type', 'bhk', 'city', 'locality', 'state', 'landmark', 'furnishing_status', 'available_from')
+SET_COLUMNS = ('preferred_tenants', 'amenities', 'nearby_points')
+TEXT_COLUMNS = ('rough_description',)
+
+# Set columns are stored as bitmasks over their vocabulary, one uint64 word per 64 items
+MASK_BITS = 64
+_WORD_MASK = (1 << MASK_BITS) - 1
+
+
+def _mask_words(masks, vocabulary_size):
+    """Python int bitmasks -> (rows, words) uint64 array"""
+    words = max(1, -(-vocabulary_size // MASK_BITS))
+    return np.array([[mask >> (MASK_BITS * word) & _WORD_MASK for word in range(words)] for mask in masks],
+                    dtype=np.uint64).reshape(len(masks), words)
+
+
+class ListingBatch:
+    """
+    Array-backed batch of listings.
+    Numbers are int64 arrays, repeated strings are dictionary-encoded int32 codes,
+    amenity-style sets are uint64 bitmasks (as many words per row as the vocabulary needs)
+    and free text lives in one UTF-8 buffer.
+    """
+
+    def __init__(self, numeric, codes, vocabularies, masks, set_vocabularies, text_offsets, text_buffers, hashes):
+        self._numeric = numeric
+        self._codes = codes
+        self._vocabularies = vocabularies
+        self._masks = masks
+        self._set_vocabularies = set_vocabularies
+        self._text_offsets = text_offsets
+        self._text_buffers = text_buffers
+        self.hashes = hashes
+
+    @classmethod
+    def from_listings(cls, listings):
+        """Encode an iterable of Listing objects"""
+        numeric = {name: [] for name in NUMERIC_COLUMNS}
+        codes = {name: [] for name in CATEGORY_COLUMNS}
+        lookups = {name: {} for name in CATEGORY_COLUMNS}
+        masks = {name: [] for name in SET_COLUMNS}
+        set_lookups = {name: {} for name in SET_COLUMNS}
+        texts = {name: bytearray() for name in TEXT_COLUMNS}
+        offsets = {name: [0] for name in TEXT_COLUMNS}
+        hashes = []
+
+        for listing in listings:
+            for name in NUMERIC_COLUMNS:
+                numeric[name].append(getattr(listing, name))
+            for name in CATEGORY_COLUMNS:
+                lookup = lookups[name]
+                value = getattr(listing, name)
+                codes[name].append(lookup.setdefault(value, len(lookup)))
+            for name in SET_COLUMNS:
+                lookup = set_lookups[name]
+                mask = 0
+                for item in getattr(listing, name):
+                    mask |= 1 << lookup.setdefault(item, len(lookup))
+                masks[name].append(mask)
+            for name in TEXT_COLUMNS:
+                texts[name] += getattr(listing, name).encode('utf-8')
+                offsets[name].append(len(texts[name]))
+            hashes.append(listing.content_hash)
+
+        return cls(
+            numeric={name: np.array(values, dtype=np.int64) for name, values in numeric.items()},
+            codes={name: np.array(values, dtype=np.int32) for name, values in codes.items()},
+            vocabularies={name: list(lookup) for name, lookup in lookups.items()},
+            masks={name: _mask_words(values, len(set_lookups[name])) for name, values in masks.items()},
+            set_vocabularies={name: list(lookup) for name, lookup in set_lookups.items()},
+            text_offsets={name: np.array(values, dtype=np.int64) for name, values in offsets.items()},
+            text_buffers={name: bytes(buffer) for name, buffer in texts.items()},
+            hashes=np.array(hashes, dtype='S16'),
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """Encode property_data dicts"""
+        return cls.from_listings(Listing.from_property_data(record) for record in records)
+
+    @classmethod
+    def from_dataframe(cls, frame):
+        """Encode a DataFrame whose columns use property_data names"""
+        return cls.from_records(frame.to_dict('records'))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def column(self, name):
+        """Decoded column: ndarray for numbers, list for everything else"""
+        if name in self._numeric:
+            return self._numeric[name]
+        if name in self._codes:
+            vocabulary = np.array(self._vocabularies[name], dtype=object)
+            return list(vocabulary[self._codes[name]]) if len(vocabulary) else []
+        if name in self._masks:
+            return [self._decode_set(name, mask) for mask in self._masks[name]]
+        if name in self._text_offsets:
+            return [self._decode_text(name, row) for row in range(len(self))]
+        raise KeyError(name)
+
+    def has_item(self, column, item):
+        """Boolean mask of rows whose set column contains item, e.g. has_item('amenities', 'Gym')"""
+        vocabulary = self._set_vocabularies[column]
+        if item not in vocabulary:
+            return np.zeros(len(self), dtype=bool)
+        word, bit = divmod(vocabulary.index(item), MASK_BITS)
+        return (self._masks[column][:, word] & (np.uint64(1) << np.uint64(bit))) != 0
+
+    def _decode_set(self, name, words):
+        mask = sum(int(value) << (MASK_BITS * index) for index, value in enumerate(words))
+        return tuple(item for bit, item in enumerate(self._set_vocabularies[name]) if mask >> bit & 1)
+
+    def _decode_text(self, name, row):
+        offsets = self._text_offsets[name]
+        return self._text_buffers[name][offsets[row]:offsets[row + 1]].decode('utf-8')
+
+    def __getitem__(self, row):
+        """Rebuild one row as a Listing"""
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        values = {name: int(self._numeric[name][row]) for name in NUMERIC_COLUMNS}
+        values.update({name: self._vocabularies[name][self._codes[name][row]] for name in CATEGORY_COLUMNS})
+        values.update({name: self._decode_set(name, self._masks[name][row]) for name in SET_COLUMNS})
+        values.update({name: self._decode_text(name, row) for name in TEXT_COLUMNS})
+        return Listing(**values)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_dataframe(self):
+        """Decode into a pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame({name: self.column(name) for name in NUMERIC_COLUMNS + CATEGORY_COLUMNS + SET_COLUMNS + TEXT_COLUMNS})
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays and buffers (vocabularies excluded)"""
+        arrays = list(self._numeric.values()) + list(self._codes.values()) + list(self._masks.values()) + list(self._text_offsets.values())
+        return sum(array.nbytes for array in arrays) + sum(len(buffer) for buffer in self._text_buffers.values()) + self.hashes.nbytes
@@ -0,0 +1,133 @@
+"""
+API Load Test
+Drives api_service over HTTP against the local mock Groq server and reports latency
+percentiles, 429 backpressure, request coalescing and upstream calls.
+
+    python load_test.py --requests 500 --concurrency 100 --duplicates 0.3
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+import api_service
+from async_engine import engine
+from benchmark import sample_listings
+from metrics import metrics
+from mock_groq import start_mock_server
+
+
+def start_api(host="127.0.0.1"):
+    """Run the API on a free port in a background thread - returns (server, base url)"""
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(api_service.app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://{host}:{port}"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_load(base_url, listings, requests, concurrency, duplicates, retries, seed=7):
+    """Fire `requests` generate calls, `duplicates` of them repeating a recent listing"""
+    rng = random.Random(seed)
+    bodies = []
+    for index in range(requests):
+        if bodies and rng.random() < duplicates:
+            bodies.append(bodies[rng.randrange(max(0, len(bodies) - concurrency), len(bodies))])
+        else:
+            bodies.append({'property': listings[index % len(listings)], 'variation_seed': index // len(listings)})
+
+    statuses = {}
+    latencies = []
+    throttled = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(client, body):
+        nonlocal throttled
+        async with semaphore:
+            started = time.perf_counter()
+            for attempt in range(retries + 1):
+                response = await client.post(f"{base_url}/v1/generate", json=body,
+                                             headers={'X-Provider-Key': 'mock-key'})
+                if response.status_code != 429 or attempt == retries:
+                    break
+                throttled += 1
+                await asyncio.sleep(float(response.headers.get('retry-after', 1)))
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_one(client, body) for body in bodies))
+        elapsed = time.perf_counter() - started
+    return statuses, latencies, throttled, elapsed
+
+
+async def run_batch(base_url, listings):
+    """Submit one batch job and poll it to completion"""
+    async with httpx.AsyncClient(timeout=30) as client:
+        started = time.perf_counter()
+        response = await client.post(f"{base_url}/v1/batch", json={'listings': listings},
+                                     headers={'X-Provider-Key': 'mock-key', 'X-Tenant': 'load-test'})
+        job = response.json()
+        while True:
+            status = (await client.get(f"{base_url}{job['status_url']}")).json()
+            if status['status'] in ('done', 'failed'):
+                return status, time.perf_counter() - started
+            await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the generation API against the mock Groq server")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of requests repeating an in-flight one")
+    parser.add_argument("--retries", type=int, default=5, help="client retries on 429, honouring Retry-After")
+    parser.add_argument("--batch", type=int, default=50, help="listings in the batch job run afterwards (0 to skip)")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="scale simulated model latency")
+    parser.add_argument("--throttle-rps", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = start_mock_server(time_scale=args.time_scale, throttle_rps=args.throttle_rps)
+    engine.api_url = mock.url
+    # Mock listings stay out of the real generation history
+    api_service.RECORD_HISTORY = False
+    api, base_url = start_api()
+    listings = sample_listings(max(args.requests, args.batch))
+
+    statuses, latencies, throttled, elapsed = asyncio.run(
+        run_load(base_url, listings, args.requests, args.concurrency, args.duplicates, args.retries))
+    upstream = sum(1 for entry in mock.requests_log if entry['status'] == 200)
+    print(f"{args.requests} requests at concurrency {args.concurrency} in {elapsed:.1f}s "
+          f"({args.requests / elapsed:.1f} req/s)")
+    print(f"status codes: {dict(sorted(statuses.items()))}, 429s retried: {throttled}")
+    print(f"latency p50 {percentile(latencies, 0.5):.3f}s  p95 {percentile(latencies, 0.95):.3f}s  "
+          f"p99 {percentile(latencies, 0.99):.3f}s  max {max(latencies):.3f}s")
+    print(f"coalesced: {metrics.get('api_coalesced_total')}, rejected: {metrics.get('api_interactive_rejected_total')}, "
+          f"upstream calls: {upstream}")
+
+    if args.batch:
+        mock.reset_log()
+        status, batch_elapsed = asyncio.run(run_batch(base_url, listings[:args.batch]))
+        print(f"batch job: {status['status']}, {status.get('generated', 0)}/{status['listings']} generated "
+              f"in {batch_elapsed:.1f}s")
+
+    api.should_exit = True
+    mock.shutdown()
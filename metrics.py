@@ -0,0 +1,74 @@
+"""
+Process Metrics
+In-process counters, gauges and timing summaries shared by the generation engine and the UI.
+"""
+
+import threading
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and timing summaries"""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        """Add to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Record one timing/size sample (count, sum, max are kept)"""
+        with self._lock:
+            summary = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            summary['count'] += 1
+            summary['sum'] += value
+            summary['max'] = max(summary['max'], value)
+
+    def get(self, name, default=0):
+        """Current value of a counter or gauge"""
+        with self._lock:
+            if name in self._gauges:
+                return self._gauges[name]
+            return self._counters.get(name, default)
+
+    def snapshot(self):
+        """Copy of everything, timings reported with their mean"""
+        with self._lock:
+            timings = {
+                name: dict(summary, mean=summary['sum'] / summary['count'] if summary['count'] else 0.0)
+                for name, summary in self._timings.items()
+            }
+            return {'counters': dict(self._counters), 'gauges': dict(self._gauges), 'timings': timings}
+
+    def render_text(self):
+        """Prometheus-style text exposition"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{name} {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{name} {value}")
+        for name, summary in sorted(snapshot['timings'].items()):
+            lines.append(f"{name}_count {summary['count']}")
+            lines.append(f"{name}_sum {summary['sum']:.6f}")
+            lines.append(f"{name}_max {summary['max']:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+# Shared by the whole process
+metrics = Metrics()
@@ -0,0 +1,310 @@
+"""
+Mock Groq Server
+Local OpenAI-compatible chat completions endpoint for benchmarks and offline runs.
+
+    python mock_groq.py --port 8765
+    GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions streamlit run deepseek_python_20251126_9f83cf.py
+    python mock_groq.py --prefix-cache 4 --prompt-token-latency 0.0005      (behave like a local llama.cpp)
+
+"stream": true answers with server-sent events - the first one after the prompt has been
+prefilled, so time-to-first-token can be measured. With prefix_cache=N the server keeps
+its last N prompts like a local server's KV cache slots: only the part of a prompt past
+the longest cached prefix costs prefill time, and usage reports the rest as cached_tokens.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "spacious bright airy modern elegant serene vibrant cozy premium peaceful well-ventilated "
+    "thoughtfully designed home living room balcony views sunlight family comfort convenience "
+    "neighbourhood schools markets metro connectivity security lifestyle everyday retreat "
+    "community greenery parking amenities kitchen bedrooms relax unwind commute city heart"
+).split()
+
+MOCK_MODEL = "llama-3.3-70b-versatile"
+
+
+def estimate_tokens(text):
+    """Rough token count - about 4 characters per token"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _sentence(rng, words=12):
+    """One pseudo-random sentence"""
+    chosen = [rng.choice(WORDS) for _ in range(words)]
+    return ' '.join(chosen).capitalize() + '.'
+
+
+def fake_translation(prompt_text):
+    """Answer to a translation.translation_messages prompt - every string tagged with its language code"""
+    header, _, source = prompt_text.partition("Source:\n")
+    targets = header[header.index('Translate into:'):].split('\n', 1)[0]
+    codes = re.findall(r'\b([a-z]{2}) \(', targets)
+    source = json.loads(source)
+    return {
+        code: {
+            "fields": {field: f"[{code}] {text}" for field, text in source.get('fields', {}).items()},
+            "phrases": [f"[{code}] {phrase}" for phrase in source.get('phrases', [])],
+        }
+        for code in codes
+    }
+
+
+def fake_listing(rng):
+    """Listing JSON shaped like the real model output"""
+    description = ' '.join(_sentence(rng, rng.randint(10, 16)) for _ in range(rng.randint(11, 14)))
+    return {
+        "title": ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 12))).title(),
+        "teaser_text": _sentence(rng, 16),
+        "full_description": description,
+        "bullet_points": [_sentence(rng, 7) for _ in range(5)],
+        "seo_keywords": [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(5)],
+        "meta_title": ' '.join(rng.choice(WORDS) for _ in range(6)).title()[:58],
+        "meta_description": _sentence(rng, 18)[:150] + " Book now!",
+    }
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    """Chat completions server with configurable latency and injected throttling"""
+
+    daemon_threads = True
+
+    def __init__(self, address, base_latency=0.05, prompt_token_latency=0.00002,
+                 completion_token_latency=0.0005, throttle_rps=None, error_rate=0.0,
+                 time_scale=1.0, prefix_cache=0):
+        super().__init__(address, MockGroqHandler)
+        self.base_latency = base_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.completion_token_latency = completion_token_latency
+        self.throttle_rps = throttle_rps
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+        self.prefix_cache = prefix_cache
+        self._cached_prompts = []
+        self.requests_log = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_count = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+
+    def admit(self):
+        """Token-window throttle - False means answer with 429"""
+        if not self.throttle_rps:
+            return True
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count <= self.throttle_rps
+
+    def cached_tokens(self, prompt_text):
+        """Tokens of prompt_text already in a cache slot - the slot then holds this prompt"""
+        if not self.prefix_cache:
+            return 0
+        with self._lock:
+            best, slot = 0, None
+            for index, cached in enumerate(self._cached_prompts):
+                size = len(os.path.commonprefix([cached, prompt_text]))
+                if size > best:
+                    best, slot = size, index
+            if slot is not None:
+                self._cached_prompts.pop(slot)
+            elif len(self._cached_prompts) >= self.prefix_cache:
+                self._cached_prompts.pop(0)
+            self._cached_prompts.append(prompt_text)
+        return best // 4
+
+    def record(self, entry):
+        with self._lock:
+            self.requests_log.append(entry)
+
+    def reset_log(self):
+        with self._lock:
+            self.requests_log = []
+            self.max_in_flight = 0
+            self._cached_prompts = []
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    """Handles POST chat completions"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the request - nothing left to answer
+            pass
+
+    def do_GET(self):
+        """Model list - what provider health checks call"""
+        if not self.path.rstrip('/').endswith('/models'):
+            self._send(404, {"error": {"message": "Not found"}})
+            return
+        self._send(200, {"object": "list", "data": [{"id": MOCK_MODEL, "object": "model"}]})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not server.admit():
+            server.record({'status': 429, 'time': time.time()})
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, {"Retry-After": "1"})
+            return
+
+        rng = random.Random()
+        if server.error_rate and rng.random() < server.error_rate:
+            server.record({'status': 500, 'time': time.time()})
+            self._send(500, {"error": {"message": "Injected failure"}})
+            return
+
+        messages = request.get('messages', [])
+        prompt_text = '\n'.join(message.get('content', '') for message in messages)
+        seed = hashlib.md5((prompt_text + str(request.get('temperature'))).encode('utf-8')).hexdigest()
+        rng = random.Random(seed)
+
+        if 'Translate into:' in prompt_text:
+            content = json.dumps(fake_translation(prompt_text), ensure_ascii=False)
+        elif 'json' in prompt_text.lower():
+            content = json.dumps(fake_listing(rng))
+        else:
+            content = ' '.join(_sentence(rng, 14) for _ in range(16))
+
+        prompt_tokens = estimate_tokens(prompt_text)
+        completion_tokens = estimate_tokens(content)
+        max_tokens = request.get('max_tokens') or 4096
+        finish_reason = 'stop'
+        if completion_tokens > max_tokens:
+            content = content[:max_tokens * 4]
+            completion_tokens = max_tokens
+            finish_reason = 'length'
+
+        cached_tokens = min(server.cached_tokens(prompt_text), prompt_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        if server.prefix_cache:
+            usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+        prefill = server.base_latency + (prompt_tokens - cached_tokens) * server.prompt_token_latency
+        latency = prefill + completion_tokens * server.completion_token_latency
+
+        with server._lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if request.get('stream'):
+                self._stream(request, seed, content, finish_reason, usage, prefill, completion_tokens)
+            else:
+                time.sleep(latency * server.time_scale)
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+        server.record({
+            'status': 200,
+            'time': time.time(),
+            'prompt_tokens': prompt_tokens,
+            'cached_tokens': cached_tokens,
+            'completion_tokens': completion_tokens,
+            'max_tokens': max_tokens,
+            'latency': latency * server.time_scale,
+        })
+        if request.get('stream'):
+            return
+        self._send(200, {
+            "id": f"mock-{seed[:12]}",
+            "object": "chat.completion",
+            "model": request.get('model'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    def _stream(self, request, seed, content, finish_reason, usage, prefill, completion_tokens, words_per_chunk=8):
+        """Server-sent event chunks - nothing until the prompt is prefilled, then the content as it decodes"""
+        server = self.server
+        time.sleep(prefill * server.time_scale)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def _event(delta, finish=None):
+            chunk = {"id": f"mock-{seed[:12]}", "object": "chat.completion.chunk", "model": request.get('model'),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        words = content.split(' ')
+        chunk_latency = completion_tokens * server.completion_token_latency * words_per_chunk / max(1, len(words))
+        try:
+            _event({"role": "assistant", "content": ""})
+            for start in range(0, len(words), words_per_chunk):
+                text = ' '.join(words[start:start + words_per_chunk])
+                _event({"content": text if start == 0 else ' ' + text})
+                time.sleep(chunk_latency * server.time_scale)
+            _event({}, finish_reason)
+            if (request.get('stream_options') or {}).get('include_usage'):
+                chunk = {"id": f"mock-{seed[:12]}", "object": "chat.completion.chunk", "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_mock_server(port=0, **options):
+    """Start a mock server on a background thread and return it"""
+    server = MockGroqServer(("127.0.0.1", port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Groq chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--throttle-rps", type=int, default=None, help="answer 429 above this many requests/second")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply simulated latency")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.00002, help="prefill seconds per prompt token")
+    parser.add_argument("--prefix-cache", type=int, default=0, help="prompts kept in the simulated KV cache")
+    args = parser.parse_args()
+
+    server = MockGroqServer(("127.0.0.1", args.port), throttle_rps=args.throttle_rps,
+                            error_rate=args.error_rate, time_scale=args.time_scale,
+                            prompt_token_latency=args.prompt_token_latency, prefix_cache=args.prefix_cache)
+    print(f"Mock Groq listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,232 @@
+"""
+Response Prefetch
+Generates the variations a user is likely to ask for next (the next Regenerate styles)
+on the engine's BACKGROUND priority and parks them in a small response cache, so the
+click finds a finished result instead of starting a cold call. Speculative work is held
+to a rolling token budget (PREFETCH_TOKENS_PER_HOUR) and backs off as the daily quota
+runs low.
+
+Speculative mode (opt-in) goes one step earlier: once the form has sat unchanged for
+SPECULATIVE_DEBOUNCE_SECONDS it starts the Generate call itself, and drops that call again
+as soon as the inputs change.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
+
+from async_engine import get_engine
+from listing import listing_key
+from metrics import metrics
+from prompts import select_prompt_version
+from providers import DEFAULT_PROVIDER
+from quota import key_id
+from scheduler import BACKGROUND
+
+# Variations generated ahead of the current one
+PREFETCH_VARIATIONS = int(os.environ.get("PREFETCH_VARIATIONS", "2"))
+# Estimated tokens speculative work may spend per rolling hour (0 turns prefetching off)
+PREFETCH_TOKENS_PER_HOUR = int(os.environ.get("PREFETCH_TOKENS_PER_HOUR", "200000"))
+# How long a click waits on a prefetch that is still running before going cold
+PREFETCH_JOIN_SECONDS = float(os.environ.get("PREFETCH_JOIN_SECONDS", "15"))
+# (share of the daily token quota left, most variations prefetched below it) - lowest share first
+QUOTA_BACKOFF = ((0.25, 0), (0.5, 1))
+# Start generating once the form has been idle - off unless switched on
+SPECULATIVE_GENERATION = os.environ.get("SPECULATIVE_GENERATION", "0") == "1"
+SPECULATIVE_DEBOUNCE_SECONDS = float(os.environ.get("SPECULATIVE_DEBOUNCE_SECONDS", "2.5"))
+CACHE_SIZE = 256
+CACHE_TTL = 900.0
+HOUR = 3600.0
+
+
+def cache_key(property_data, variation_seed, api_key, provider=DEFAULT_PROVIDER, prompt_version=None):
+    """What makes two generations interchangeable - `api_key` (resolved) keeps one key's results to itself"""
+    return (provider, key_id(api_key) if api_key else None, listing_key(property_data),
+            prompt_version or select_prompt_version(property_data), variation_seed)
+
+
+class ResponseCache:
+    """
+    Pending or finished speculative generations, single use. Entries that expire, get
+    evicted or are superseded after their call finished count as wasted tokens.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, future, source, tokens):
+        with self._lock:
+            self._expire()
+            self._entries[key] = {'future': future, 'source': source, 'tokens': tokens, 'created': time.monotonic()}
+            while len(self._entries) > self.size:
+                self._drop(self._entries.popitem(last=False)[1], 'evicted')
+
+    def take(self, key, wait=PREFETCH_JOIN_SECONDS):
+        """The entry's result (waiting up to `wait` seconds for a running one) - None on a miss"""
+        with self._lock:
+            self._expire()
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            metrics.inc("response_cache_misses_total")
+            return None
+        source = entry['source']
+        try:
+            result = entry['future'].result(wait)
+        except FutureTimeout:
+            entry['future'].cancel()
+            metrics.inc(f"{source}_late_total")
+            return None
+        except (CancelledError, Exception):
+            result = None
+        if result is None:
+            metrics.inc(f"{source}_failed_total")
+            return None
+        metrics.inc(f"{source}_hits_total")
+        metrics.inc(f"{source}_tokens_used_total", entry['tokens'])
+        return result
+
+    def discard(self, key, reason='superseded'):
+        """Drop an entry nobody will take - cancels it if it's still running"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._drop(entry, reason)
+
+    def _drop(self, entry, reason):
+        future = entry['future']
+        source = entry['source']
+        if future.done():
+            if not future.cancelled() and future.exception() is None and future.result() is not None:
+                metrics.inc(f"{source}_wasted_tokens_total", entry['tokens'])
+        else:
+            future.cancel()
+        metrics.inc(f"{source}_{reason}_total")
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry['created'] > cutoff:
+                break
+            del self._entries[key]
+            self._drop(entry, 'expired')
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._drop(entry, 'evicted')
+
+
+class Prefetcher:
+    """Starts speculative generations within the rolling token budget"""
+
+    def __init__(self, cache, tokens_per_hour=PREFETCH_TOKENS_PER_HOUR, variations=PREFETCH_VARIATIONS):
+        self.cache = cache
+        self.tokens_per_hour = tokens_per_hour
+        self.variations = variations
+        self._spent = deque()
+        self._spent_total = 0
+        self._lock = threading.Lock()
+
+    def budget_left(self):
+        """Estimated tokens speculative work may still spend this hour"""
+        with self._lock:
+            cutoff = time.monotonic() - HOUR
+            while self._spent and self._spent[0][0] <= cutoff:
+                self._spent_total -= self._spent.popleft()[1]
+            return self.tokens_per_hour - self._spent_total
+
+    def _charge(self, tokens):
+        with self._lock:
+            self._spent.append((time.monotonic(), tokens))
+            self._spent_total += tokens
+
+    def depth(self, engine, api_key):
+        """Variations to prefetch - fewer as the key's daily quota runs out"""
+        quota = engine.quota
+        if not quota.daily_tokens:
+            return self.variations
+        quota_key = engine.provider.resolve_key(api_key) or engine.provider.name
+        left = quota.usage(quota_key)['tokens_remaining'] / quota.daily_tokens
+        for share, depth in QUOTA_BACKOFF:
+            if left < share:
+                return min(depth, self.variations)
+        return self.variations
+
+    def start(self, property_data, api_key, variation_seed, provider=DEFAULT_PROVIDER, source='prefetch'):
+        """Begin one background generation unless it's cached, over budget or the provider can't run it"""
+        engine = get_engine(provider)
+        if not engine.provider.ready(api_key):
+            return None
+        key = cache_key(property_data, variation_seed, engine.provider.resolve_key(api_key), engine.provider.name)
+        if key in self.cache:
+            return key
+        tokens = engine.estimate_tokens(property_data, variation_seed)
+        if tokens > self.budget_left():
+            metrics.inc(f"{source}_over_budget_total")
+            return None
+        self._charge(tokens)
+        future = engine.submit(engine.generate(property_data, api_key, variation_seed, priority=BACKGROUND,
+                                               tenant=source))
+        self.cache.put(key, future, source, tokens)
+        metrics.inc(f"{source}_started_total")
+        return key
+
+    def prefetch_next(self, property_data, api_key, generation_count, provider=DEFAULT_PROVIDER):
+        """Start the variations after `generation_count` - what Regenerate will ask for"""
+        engine = get_engine(provider)
+        return [self.start(property_data, api_key, generation_count + offset, provider)
+                for offset in range(1, self.depth(engine, api_key) + 1)]
+
+
+# ==================== SPECULATIVE GENERATION ====================
+def speculate(state, property_data, api_key, provider=DEFAULT_PROVIDER, debounce=SPECULATIVE_DEBOUNCE_SECONDS):
+    """
+    Debounced Generate-ahead for one form. `state` is the caller's dict for that form; call
+    this on every rerun and tick. Returns the cache key of a started generation or None.
+    """
+    now = time.monotonic()
+    listing = listing_key(property_data)
+    if listing != state.get('listing'):
+        # Inputs changed - whatever ran for the old ones will never be clicked
+        if state.get('key'):
+            response_cache.discard(state['key'], 'superseded')
+        state.update(listing=listing, changed_at=now, key=None, tried=False)
+        return None
+    if state['tried'] or now - state['changed_at'] < debounce:
+        return None
+    state['tried'] = True
+    state['key'] = prefetcher.start(property_data, api_key, 0, provider, source='speculative')
+    return state['key']
+
+
+def cancel_speculation(state):
+    """Drop the form's pending speculative generation (speculative mode switched off)"""
+    if state.get('key'):
+        response_cache.discard(state['key'], 'superseded')
+    state.clear()
+
+
+def speculative_stats():
+    """Hit rate and wasted tokens of speculative generation so far"""
+    started = metrics.get("speculative_started_total")
+    hits = metrics.get("speculative_hits_total")
+    return {'started': started, 'hits': hits, 'hit_rate': hits / started if started else 0.0,
+            'superseded': metrics.get("speculative_superseded_total"),
+            'wasted_tokens': metrics.get("speculative_wasted_tokens_total")}
+
+
+# Shared by every session in this process
+response_cache = ResponseCache()
+prefetcher = Prefetcher(response_cache)
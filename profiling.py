@@ -0,0 +1,201 @@
+"""
+Rerun Profiling
+Opt-in per-rerun profiler for the Streamlit script. Each profiled rerun runs under
+cProfile (script thread), tracemalloc and a stack sampler, and is split into named
+sections - 'api' for blocking generation calls, 'css', 'form', 'results'... - so the
+sidebar can show where an interaction's time went. Reports keep the raw pstats dump
+(snakeviz, flameprof) and folded stacks (flamegraph.pl, speedscope) for export.
+
+Generation requests run on the engine's event-loop thread; from the script thread they
+show up as time blocked inside 'api' sections, with the wall/CPU split telling waiting
+on the network apart from Python work.
+"""
+
+import cProfile
+import functools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from metrics import metrics
+
+PROFILE_RERUNS = os.environ.get("PROFILE_RERUNS", "0") == "1"
+# Seconds between stack samples for the folded-stack export
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Reports kept per session
+PROFILE_HISTORY = 10
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 10
+# Deepest stack kept per sample
+STACK_DEPTH = 64
+
+_current = threading.local()
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    """tracemalloc is process-wide - started by the first profiled rerun, stopped by the last"""
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+    return snapshot, peak
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="rerun-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join(1)
+
+
+class RerunProfile:
+    """One rerun's profile - begin(), sections while it runs, then end() for the report"""
+
+    def __init__(self, label):
+        self.label = label
+        self.sections = Counter()
+        self._stack = []
+        self._profile = cProfile.Profile()
+        self._sampler = _StackSampler(threading.get_ident())
+
+    def begin(self):
+        _start_tracing()
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    @contextmanager
+    def section(self, name):
+        """Time a block - nested sections are subtracted from their parent"""
+        started = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._stack.pop()
+            self.sections[name] += elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def end(self):
+        """Stop profiling and build the report dict"""
+        self._profile.disable()
+        total = time.perf_counter() - self._started
+        cpu = time.thread_time() - self._cpu_started
+        self._sampler.stop()
+        snapshot, peak = _stop_tracing()
+
+        stats = pstats.Stats(self._profile)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+        top_functions = [{'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': calls,
+                          'self_ms': round(self_time * 1000, 2), 'total_ms': round(cumulative * 1000, 2)}
+                         for (filename, line, name), (_, calls, self_time, cumulative, _) in rows]
+
+        allocations = []
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                               tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")))
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                allocations.append({'where': f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                                    'kib': round(stat.size / 1024, 1), 'blocks': stat.count})
+
+        api = self.sections.get('api', 0.0)
+        # Time outside every named section
+        self.sections['other'] = max(0.0, total - sum(self.sections.values()))
+        metrics.observe("rerun_seconds", total)
+        metrics.observe("rerun_render_seconds", total - api)
+        return {
+            'label': self.label,
+            'total_ms': round(total * 1000, 1),
+            'cpu_ms': round(cpu * 1000, 1),
+            'api_ms': round(api * 1000, 1),
+            'render_ms': round((total - api) * 1000, 1),
+            'sections_ms': {name: round(seconds * 1000, 1) for name, seconds in self.sections.most_common()},
+            'peak_kib': round(peak / 1024, 1),
+            'top_functions': top_functions,
+            'allocations': allocations,
+            'pstats': marshal.dumps(stats.stats),
+            'folded': '\n'.join(f"{stack} {count}" for stack, count in self._sampler.stacks.most_common()),
+        }
+
+
+# ==================== SCRIPT HOOKS ====================
+def begin_rerun(label):
+    """Start profiling this thread's rerun - returns the profile, or None if one is already running"""
+    if getattr(_current, 'profile', None) is not None:
+        return None
+    _current.profile = RerunProfile(label).begin()
+    return _current.profile
+
+
+def end_rerun(profile, history):
+    """Finish a profile from begin_rerun and append its report to `history` (a list, newest last)"""
+    if profile is None:
+        return None
+    _current.profile = None
+    report = profile.end()
+    history.append(report)
+    del history[:-PROFILE_HISTORY]
+    return report
+
+
+def section(name):
+    """Context manager timing a block of the current rerun - no-op when it isn't profiled"""
+    profile = getattr(_current, 'profile', None)
+    return profile.section(name) if profile is not None else nullcontext()
+
+
+def profiled(name):
+    """Decorator: run the function as a named section of the profiled rerun"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,162 @@
+"""
+Prompt Cache Benchmark
+Time-to-first-token per prompt version against a local OpenAI-compatible server with
+prefix caching (llama.cpp, vLLM --enable-prefix-caching, Ollama), or the mock server
+simulating one. Each listing's variations go back to back, one stream at a time - the
+way a single local GPU sees a user generating and regenerating.
+
+    python prompt_bench.py --mock --listings 30
+    python prompt_bench.py --url http://127.0.0.1:8080/v1 --model qwen2.5-7b-instruct --listings 20
+    python prompt_bench.py --versions v2-compact v3-cached --max-p95-ttft 0.5       (exit 1 when slower)
+
+Cached prompt tokens come from usage.prompt_tokens_details.cached_tokens, or llama.cpp's
+timings.cache_n, where the server reports them.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import httpx
+
+from benchmark import sample_listings
+from load_test import percentile
+from mock_groq import MOCK_MODEL, start_mock_server
+from prompt_builder import shared_prefix
+from prompts import PROMPT_VERSIONS, build_prompt
+
+
+def stream_ttft(client, url, headers, payload):
+    """One streamed chat completion - (seconds to first content, total seconds, prompt tokens, cached tokens)"""
+    started = time.perf_counter()
+    first = None
+    prompt_tokens = cached = 0
+    with client.stream("POST", url, headers=headers, json=payload) as response:
+        if response.status_code != 200:
+            response.read()
+            raise RuntimeError(f"Error {response.status_code}: {response.text[:200]}")
+        for line in response.iter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            chunk = json.loads(line[6:])
+            for choice in chunk.get('choices') or []:
+                if first is None and (choice.get('delta') or {}).get('content'):
+                    first = time.perf_counter() - started
+            usage = chunk.get('usage') or {}
+            if usage:
+                prompt_tokens = usage.get('prompt_tokens', prompt_tokens)
+                cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', cached)
+            timings = chunk.get('timings') or {}
+            if 'cache_n' in timings:
+                cached = timings['cache_n']
+                prompt_tokens = prompt_tokens or timings['cache_n'] + timings.get('prompt_n', 0)
+    total = time.perf_counter() - started
+    return (first if first is not None else total), total, prompt_tokens, cached
+
+
+def run_version(client, url, headers, model, listings, version, variations, max_tokens, cache_prompt):
+    """Stream every listing x variation with one prompt version"""
+    messages_list = [build_prompt(listing, seed, version) for listing in listings for seed in range(variations)]
+    ttfts, totals = [], []
+    prompt_tokens = cached = failures = 0
+    for system, user in messages_list:
+        payload = {
+            "model": model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+            "temperature": 0.7,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if cache_prompt:
+            payload["cache_prompt"] = True
+        try:
+            ttft, total, prompt, hit = stream_ttft(client, url, headers, payload)
+        except Exception as e:
+            failures += 1
+            print(f"  {version}: {type(e).__name__}: {e}")
+            continue
+        ttfts.append(ttft)
+        totals.append(total)
+        prompt_tokens += prompt
+        cached += hit
+
+    chars = sum(len(system) + len(user) + 1 for system, user in messages_list) / len(messages_list)
+    return {
+        'version': version,
+        'requests': len(ttfts),
+        'failures': failures,
+        'prompt_tokens': prompt_tokens / max(1, len(ttfts)),
+        'cached_share': cached / prompt_tokens if prompt_tokens else 0.0,
+        'static_share': shared_prefix(messages_list) / chars,
+        'ttft_p50': percentile(ttfts, 0.5),
+        'ttft_p95': percentile(ttfts, 0.95),
+        'total_p50': percentile(totals, 0.5),
+    }
+
+
+def print_report(rows):
+    """Per-version TTFT and how much of each prompt the cache could reuse"""
+    print(f"{'version':<12} {'requests':>8} {'prompt tok':>11} {'static':>7} {'cached':>7} "
+          f"{'TTFT p50':>9} {'TTFT p95':>9} {'total p50':>10}")
+    for row in rows:
+        print(f"{row['version']:<12} {row['requests']:>8} {row['prompt_tokens']:>11.0f} {row['static_share']:>7.0%} "
+              f"{row['cached_share']:>7.0%} {row['ttft_p50']:>9.3f} {row['ttft_p95']:>9.3f} {row['total_p50']:>10.3f}")
+
+    baseline = rows[0]
+    for row in rows[1:]:
+        if baseline['ttft_p50'] and baseline['ttft_p95']:
+            print(f"\n{row['version']} vs {baseline['version']}: "
+                  f"TTFT p50 {row['ttft_p50'] / baseline['ttft_p50'] - 1:+.0%}, "
+                  f"p95 {row['ttft_p95'] / baseline['ttft_p95'] - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-token per prompt version on a prefix-caching server")
+    parser.add_argument("--url", default=os.environ.get("LOCAL_LLM_URL"), help="OpenAI-compatible base URL (.../v1)")
+    parser.add_argument("--model", default=os.environ.get("LOCAL_LLM_MODEL", "llama3.1:8b"))
+    parser.add_argument("--api-key", default=os.environ.get("LOCAL_LLM_API_KEY"))
+    parser.add_argument("--mock", action="store_true", help="run against the mock server with a simulated prefix cache")
+    parser.add_argument("--listings", type=int, default=20)
+    parser.add_argument("--variations", type=int, default=3)
+    parser.add_argument("--versions", nargs="+", default=list(PROMPT_VERSIONS), choices=list(PROMPT_VERSIONS))
+    parser.add_argument("--max-tokens", type=int, default=32, help="completion cap - TTFT only needs the first tokens")
+    parser.add_argument("--no-cache-prompt", action="store_true", help="don't send llama.cpp's cache_prompt field")
+    parser.add_argument("--slots", type=int, default=4, help="KV cache slots of the mock server")
+    parser.add_argument("--prefill-latency", type=float, default=0.0004, help="mock prefill seconds per prompt token")
+    parser.add_argument("--max-p95-ttft", type=float, default=None, help="exit 1 when any version's TTFT p95 exceeds this")
+    args = parser.parse_args()
+
+    server = None
+    if args.mock:
+        server = start_mock_server(prefix_cache=args.slots, prompt_token_latency=args.prefill_latency,
+                                   completion_token_latency=0.002)
+        url, model = server.url, MOCK_MODEL
+    elif args.url:
+        url, model = f"{args.url.rstrip('/')}/chat/completions", args.model
+    else:
+        parser.error("--url (or LOCAL_LLM_URL) or --mock is required")
+
+    headers = {"Content-Type": "application/json"}
+    if args.api_key:
+        headers["Authorization"] = f"Bearer {args.api_key}"
+    listings = sample_listings(args.listings)
+    rows = []
+    with httpx.Client(timeout=120.0) as client:
+        for version in args.versions:
+            if server is not None:
+                # Every version starts from a cold cache
+                server.reset_log()
+            rows.append(run_version(client, url, headers, model, listings, version, args.variations,
+                                    args.max_tokens, not args.no_cache_prompt))
+    if server is not None:
+        server.shutdown()
+    print_report(rows)
+
+    slow = [row['version'] for row in rows if args.max_p95_ttft is not None and row['ttft_p95'] > args.max_p95_ttft]
+    if slow:
+        print(f"REGRESSION: TTFT p95 above {args.max_p95_ttft}s for {', '.join(slow)}")
+    if slow or any(row['failures'] for row in rows):
+        sys.exit(1)
@@ -0,0 +1,104 @@
+"""
+Prompt Builder
+Precompiled, versioned listing prompt templates laid out for prefix caching. Groq and
+local servers (llama.cpp, vLLM with --enable-prefix-caching, Ollama) reuse the KV cache
+of a prompt prefix they have already processed, so each template sends:
+
+    system: static rules + JSON schema        - identical for every listing and variation
+    user:   listing facts, then the creative direction
+
+Everything up to the end of the system message is shared by all calls, and regenerating
+a listing with another variation shares the facts as well - only the direction and the
+completion are new work for the server.
+
+Templates are compiled once at import: the system prefixes and the direction blocks are
+final strings, the fact lines pre-bound format methods.
+"""
+
+import os
+
+# ==================== TEMPLATE PARTS ====================
+LISTING_RULES = (
+    'You are an expert real estate copywriter. '
+    'The user message gives rental listing facts, then a creative direction (focus, tone, instruction). '
+    'Write the listing in that direction, using owner notes prominently when given. '
+    'Return only this JSON object: '
+)
+LISTING_SCHEMA = (
+    '{"title": "8-12 words, emotional, not starting with Discover or Welcome", '
+    '"teaser_text": "15-20 word urgent hook", '
+    '"full_description": "150-200 words of lifestyle benefits", '
+    '"bullet_points": ["5 benefits"], '
+    '"seo_keywords": ["5 keywords"], '
+    '"meta_title": "under 60 chars", '
+    '"meta_description": "under 160 chars, with a call to action"}'
+)
+# LISTING_SCHEMA for a prompt seeded with keywords and a meta title - the model skips both fields
+SEEDED_SCHEMA = (
+    '{"title": "8-12 words, emotional, not starting with Discover or Welcome", '
+    '"teaser_text": "15-20 word urgent hook", '
+    '"full_description": "150-200 words of lifestyle benefits, working in the given seo keywords naturally", '
+    '"bullet_points": ["5 benefits"], '
+    '"meta_description": "under 160 chars, with a call to action"}'
+)
+
+# (facts keys that must be set, line format) - in prompt order
+FACT_LINES = (
+    ((), "type: {bhk} {prop_type}"),
+    ((), "location: {location_details}"),
+    ((), "area: {area} sqft"),
+    (('floor_no', 'total_floors'), "floor: {floor_no}/{total_floors}"),
+    ((), "rent: ₹{rent:,}/month"),
+    ((), "deposit: ₹{deposit:,}"),
+    (('maintenance',), "maintenance: ₹{maintenance}/month"),
+    ((), "furnishing: {furnishing}"),
+    ((), "amenities: {amenities}"),
+    ((), "tenants: {tenants}"),
+    ((), "available: {available}"),
+    (('nearby',), "nearby: {nearby}"),
+    (('rough_desc',), "owner notes: {rough_desc}"),
+)
+DIRECTION_FORMAT = "\ndirection: {focus}; tone: {tone}. {instruction}"
+
+
+# ==================== COMPILED TEMPLATE ====================
+class PromptTemplate:
+    """A listing prompt compiled to its static system prefixes and pre-bound fact lines"""
+
+    def __init__(self, version, rules, schema, seeded_schema, fact_lines=FACT_LINES,
+                 direction_format=DIRECTION_FORMAT):
+        self.version = version
+        self.system = rules + schema
+        self.seeded_system = rules + seeded_schema
+        self._lines = tuple((required, text.format) for required, text in fact_lines)
+        self._direction_format = direction_format
+        self._directions = {}
+
+    def direction(self, variation):
+        """Direction block for a creative direction - formatted once per variation"""
+        key = variation['focus']
+        block = self._directions.get(key)
+        if block is None:
+            block = self._directions[key] = self._direction_format.format(**variation)
+        return block
+
+    def render(self, facts, variation, seo_seed=None):
+        """(system, user) messages from listing_facts() output and a creative direction"""
+        lines = []
+        for required, render in self._lines:
+            if all(facts.get(key) for key in required):
+                lines.append(render(**facts))
+        if seo_seed:
+            lines.append(f"seo keywords: {', '.join(seo_seed['seo_keywords'])}")
+        user = '\n'.join(lines) + self.direction(variation)
+        return (self.seeded_system if seo_seed else self.system), user
+
+
+def shared_prefix(messages_list):
+    """Characters of rendered prompt (system + user) that every (system, user) pair starts with"""
+    return len(os.path.commonprefix([system + '\n' + user for system, user in messages_list]))
+
+
+TEMPLATES = {
+    'v3-cached': PromptTemplate('v3-cached', LISTING_RULES, LISTING_SCHEMA, SEEDED_SCHEMA),
+}
@@ -0,0 +1,261 @@
+"""
+Listing Prompt Templates
+Versioned prompt builders for the Groq listing generator so prompt formats can be A/B tested.
+"""
+
+import hashlib
+import os
+
+from prompt_builder import TEMPLATES
+
+# 5 creative directions - index is variation_seed % 5
+VARIATION_PROMPTS = [
+    {
+        'focus': 'lifestyle and experience',
+        'tone': 'aspirational and emotional',
+        'instruction': 'Focus on the lifestyle transformation and daily experiences this property offers.'
+    },
+    {
+        'focus': 'investment value and practicality',
+        'tone': 'professional and value-driven',
+        'instruction': 'Emphasize the practical benefits, value for money, and smart investment aspects.'
+    },
+    {
+        'focus': 'location benefits and connectivity',
+        'tone': 'convenience-focused and modern',
+        'instruction': 'Highlight the strategic location, connectivity advantages, and nearby conveniences.'
+    },
+    {
+        'focus': 'comfort and luxury features',
+        'tone': 'premium and sophisticated',
+        'instruction': 'Emphasize the premium features, comfort elements, and luxurious living experience.'
+    },
+    {
+        'focus': 'community and safety',
+        'tone': 'warm and family-oriented',
+        'instruction': 'Focus on the safe neighborhood, community aspects, and family-friendly environment.'
+    }
+]
+
+
+def get_variation(variation_seed):
+    """Creative direction for a variation seed"""
+    return VARIATION_PROMPTS[variation_seed % len(VARIATION_PROMPTS)]
+
+
+# ==================== LISTING FACTS ====================
+def listing_facts(property_data):
+    """Pre-formatted listing facts shared by every prompt version"""
+    district = property_data.get('district', '')
+    state = property_data.get('state', '')
+    pincode = property_data.get('pincode', '')
+    landmark = property_data.get('landmark', '')
+    floor_no = property_data.get('floor_no', '')
+    total_floors = property_data.get('total_floors', '')
+    maintenance = property_data.get('maintenance', 0)
+
+    full_location = f"{property_data['locality']}, {property_data['city']}"
+    if district:
+        full_location += f", {district}"
+    if state:
+        full_location += f", {state}"
+    if pincode:
+        full_location += f" - {pincode}"
+
+    location_details = full_location
+    if landmark:
+        location_details += f" (Near {landmark})"
+
+    return {
+        'bhk': property_data['bhk'],
+        'prop_type': property_data['property_type'].title(),
+        'location_details': location_details,
+        'area': property_data['area_sqft'],
+        'rent': property_data['rent_amount'],
+        'deposit': property_data['deposit_amount'],
+        'maintenance': maintenance if maintenance and maintenance > 0 else 0,
+        'floor_no': floor_no,
+        'total_floors': total_floors,
+        'furnishing': property_data['furnishing_status'],
+        'amenities': ', '.join(property_data['amenities']) if property_data['amenities'] else 'Standard amenities',
+        'tenants': property_data['preferred_tenants'],
+        'available': property_data['available_from'],
+        'nearby': ', '.join(property_data.get('nearby_points', [])),
+        'rough_desc': property_data.get('rough_description', '').strip(),
+    }
+
+
+# ==================== V1 - ORIGINAL MARKDOWN PROMPT ====================
+def build_prompt_v1(property_data, variation_seed, seo_seed=None):
+    """Original verbose markdown prompt - returns (system, user) messages"""
+    facts = listing_facts(property_data)
+    variation = get_variation(variation_seed)
+
+    seo_requirements = """
+5. **SEO Keywords**: 5 search-optimized keywords
+6. **Meta Title**: Under 60 chars
+7. **Meta Description**: Under 160 chars with CTA"""
+    seo_fields = """
+    "seo_keywords": ["keyword1", "keyword2", "keyword3", "keyword4", "keyword5"],
+    "meta_title": "SEO meta title","""
+    if seo_seed:
+        # Keywords and meta title are already chosen - the model only works them into the copy
+        seo_requirements = f"""
+5. **Meta Description**: Under 160 chars with CTA
+
+**SEO Keywords (weave naturally into the copy):** {', '.join(seo_seed['seo_keywords'])}"""
+        seo_fields = ""
+
+    rough_desc_section = ""
+    if facts['rough_desc']:
+        rough_desc_section = f"""
+
+**Owner's Additional Notes/Description:**
+"{facts['rough_desc']}"
+(IMPORTANT: Please incorporate these owner-provided details naturally and prominently into the description!)
+"""
+
+    floor_info = ""
+    if facts['floor_no'] and facts['total_floors']:
+        floor_info = f"\n- Floor: {facts['floor_no']} of {facts['total_floors']} floors"
+
+    maintenance_info = ""
+    if facts['maintenance']:
+        maintenance_info = f"\n- Maintenance: ₹{facts['maintenance']}/month"
+
+    prompt = f"""You are an expert real estate copywriter specializing in premium property listings.
+
+Create a compelling rental property listing for:
+
+**Property Details:**
+- Type: {facts['bhk']} BHK {facts['prop_type']}
+- Location: {facts['location_details']}
+- Area: {facts['area']} square feet{floor_info}
+- Monthly Rent: ₹{facts['rent']:,}
+- Security Deposit: ₹{facts['deposit']:,}{maintenance_info}
+- Furnishing: {facts['furnishing']} furnished
+- Amenities: {facts['amenities']}
+- Preferred Tenants: {facts['tenants']}
+- Available From: {facts['available']}
+- Nearby: {facts['nearby'] if facts['nearby'] else 'Various conveniences'}
+{rough_desc_section}
+**CREATIVE DIRECTION (Version #{variation_seed + 1}):**
+- Primary Focus: {variation['focus']}
+- Tone: {variation['tone']}
+- Instruction: {variation['instruction']}
+
+**Requirements:**
+1. **Title**: Attention-grabbing, emotional title (8-12 words). DO NOT start with "Discover" or "Welcome".
+2. **Teaser**: Compelling hook (15-20 words) with urgency
+3. **Full Description**: Engaging 150-200 word description with lifestyle benefits
+4. **Bullet Points**: 5 benefit-focused features{seo_requirements}
+
+Return ONLY valid JSON:
+{{
+    "title": "captivating title here",
+    "teaser_text": "compelling teaser here",
+    "full_description": "detailed description here",
+    "bullet_points": ["benefit 1", "benefit 2", "benefit 3", "benefit 4", "benefit 5"],{seo_fields}
+    "meta_description": "SEO meta description with CTA"
+}}"""
+
+    system = f"You are an expert real estate copywriter. Focus: {variation['focus']}. Tone: {variation['tone']}. Return only valid JSON."
+    return system, prompt
+
+
+# ==================== V2 - COMPACT PROMPT ====================
+COMPACT_RULES = (
+    'Write a rental listing as JSON with keys: '
+    'title (8-12 words, emotional, must not start with "Discover" or "Welcome"), '
+    'teaser_text (15-20 words, urgent hook), '
+    'full_description (150-200 words, lifestyle benefits), '
+    'bullet_points (exactly 5 benefits), '
+    'seo_keywords (exactly 5), '
+    'meta_title (<60 chars), '
+    'meta_description (<160 chars, with CTA). '
+    'Return only the JSON object.'
+)
+# COMPACT_RULES for a prompt seeded with keywords and a meta title - the model skips both fields
+SEEDED_RULES = (
+    'Write a rental listing as JSON with keys: '
+    'title (8-12 words, emotional, must not start with "Discover" or "Welcome"), '
+    'teaser_text (15-20 words, urgent hook), '
+    'full_description (150-200 words, lifestyle benefits, using the given seo keywords naturally), '
+    'bullet_points (exactly 5 benefits), '
+    'meta_description (<160 chars, with CTA). '
+    'Return only the JSON object.'
+)
+
+
+def build_prompt_v2(property_data, variation_seed, seo_seed=None):
+    """Compact key:value prompt with the rules stated once - returns (system, user) messages"""
+    facts = listing_facts(property_data)
+    variation = get_variation(variation_seed)
+
+    lines = [
+        f"type: {facts['bhk']} {facts['prop_type']}",
+        f"location: {facts['location_details']}",
+        f"area: {facts['area']} sqft",
+    ]
+    if facts['floor_no'] and facts['total_floors']:
+        lines.append(f"floor: {facts['floor_no']}/{facts['total_floors']}")
+    lines.append(f"rent: ₹{facts['rent']:,}/month")
+    lines.append(f"deposit: ₹{facts['deposit']:,}")
+    if facts['maintenance']:
+        lines.append(f"maintenance: ₹{facts['maintenance']}/month")
+    lines.append(f"furnishing: {facts['furnishing']}")
+    lines.append(f"amenities: {facts['amenities']}")
+    lines.append(f"tenants: {facts['tenants']}")
+    lines.append(f"available: {facts['available']}")
+    if facts['nearby']:
+        lines.append(f"nearby: {facts['nearby']}")
+    if facts['rough_desc']:
+        lines.append(f"owner notes (use prominently): {facts['rough_desc']}")
+    if seo_seed:
+        lines.append(f"seo keywords: {', '.join(seo_seed['seo_keywords'])}")
+
+    rules = SEEDED_RULES if seo_seed else COMPACT_RULES
+    system = f"Expert real estate copywriter. Focus: {variation['focus']}. Tone: {variation['tone']}. {rules}"
+    return system, '\n'.join(lines)
+
+
+# ==================== V3 - CACHE-FRIENDLY PROMPT ====================
+def build_prompt_v3(property_data, variation_seed, seo_seed=None):
+    """Static rules and schema first, listing facts and direction last - returns (system, user) messages"""
+    return TEMPLATES['v3-cached'].render(listing_facts(property_data), get_variation(variation_seed), seo_seed)
+
+
+# ==================== VERSION SELECTION ====================
+PROMPT_VERSIONS = {
+    'v1': build_prompt_v1,
+    'v2-compact': build_prompt_v2,
+    'v3-cached': build_prompt_v3,
+}
+
+DEFAULT_PROMPT_VERSION = 'v3-cached'
+
+
+def select_prompt_version(property_data):
+    """
+    Prompt version for a listing.
+    PROMPT_VERSION pins a version; PROMPT_AB_TEST="v2-compact,v3-cached" splits listings
+    across versions by a stable hash so the same listing always gets the same arm.
+    """
+    ab_arms = [arm.strip() for arm in os.environ.get('PROMPT_AB_TEST', '').split(',') if arm.strip() in PROMPT_VERSIONS]
+    if len(ab_arms) > 1:
+        key = f"{property_data.get('city', '')}|{property_data.get('locality', '')}|{property_data.get('bhk', '')}|{property_data.get('rent_amount', '')}"
+        bucket = int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % len(ab_arms)
+        return ab_arms[bucket]
+
+    version = os.environ.get('PROMPT_VERSION', DEFAULT_PROMPT_VERSION)
+    return version if version in PROMPT_VERSIONS else DEFAULT_PROMPT_VERSION
+
+
+def build_prompt(property_data, variation_seed, version=None, seo_seed=None):
+    """
+    Build (system, user) messages for a listing with the given prompt version.
+    seo_seed ({'seo_keywords': [...], 'meta_title': ...}, see keyword_index.seed_for) drops
+    those fields from the requested JSON - the caller fills them in from the seed.
+    """
+    version = version or select_prompt_version(property_data)
+    return PROMPT_VERSIONS[version](property_data, variation_seed, seo_seed)
@@ -0,0 +1,174 @@
+"""
+LLM Providers
+Registry of OpenAI-compatible chat completion backends - Groq, or a local llama.cpp /
+vLLM / Ollama server - each with its own model map, concurrency, timeout and quota.
+
+    LOCAL_LLM_URL=http://127.0.0.1:11434/v1 LOCAL_LLM_MODEL=llama3.1:8b streamlit run ...
+
+More providers can be declared in a JSON list named by LLM_PROVIDERS_FILE, one object
+per provider with the same keys as Provider.__init__.
+
+Listing prompts put their static part first (see prompt_builder), so a server with prefix
+caching only prefills the listing facts. The local provider asks llama.cpp for it with
+"cache_prompt" on every request (LOCAL_LLM_CACHE_PROMPT=0 to leave it out); vLLM needs
+--enable-prefix-caching, Ollama keeps the last prompt's cache on its own.
+"""
+
+import json
+import os
+import time
+
+import httpx
+
+from quota import DAILY_REQUESTS, DAILY_TOKENS
+
+TEMPLATE_LABEL = "Template (No API)"
+DEFAULT_PROVIDER = 'groq'
+
+# Logical model roles - each provider maps them to its own model names
+LISTING_MODEL = 'listing'
+EDIT_MODEL = 'edit'
+
+
+class Provider:
+    """One OpenAI-compatible endpoint and how to drive it"""
+
+    def __init__(self, name, label, base_url, models, requires_key=True, api_key_env=None,
+                 max_concurrency=16, adaptive=True, timeout=30.0, daily_tokens=None, daily_requests=None,
+                 extra_body=None):
+        self.name = name
+        self.label = label
+        self.base_url = base_url.rstrip('/')
+        self.models = dict(models)
+        self.requires_key = requires_key
+        self.api_key_env = api_key_env
+        self.max_concurrency = int(max_concurrency)
+        self.adaptive = adaptive
+        self.timeout = float(timeout)
+        self.daily_tokens = daily_tokens
+        self.daily_requests = daily_requests
+        # Server-specific request fields sent with every chat completion
+        self.extra_body = dict(extra_body or {})
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    @property
+    def chat_url(self):
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def models_url(self):
+        return f"{self.base_url}/models"
+
+    def model(self, role):
+        """Provider model for a logical role - falls back to the 'default' entry"""
+        return self.models.get(role) or self.models['default']
+
+    def resolve_key(self, api_key=None):
+        """Key typed into the UI, else the provider's environment variable"""
+        if api_key:
+            return api_key.strip()
+        if self.api_key_env:
+            return os.environ.get(self.api_key_env) or None
+        return None
+
+    def ready(self, api_key=None):
+        """Whether calls can be made - keyed providers need a key"""
+        return not self.requires_key or bool(self.resolve_key(api_key))
+
+    def headers(self, api_key=None):
+        headers = {"Content-Type": "application/json"}
+        key = self.resolve_key(api_key)
+        if key:
+            headers["Authorization"] = f"Bearer {key}"
+        return headers
+
+    def health_check(self, api_key=None, timeout=5.0):
+        """GET /models - returns (ok, message, latency seconds, model ids)"""
+        started = time.monotonic()
+        try:
+            response = httpx.get(self.models_url, headers=self.headers(api_key), timeout=timeout)
+            latency = time.monotonic() - started
+            if response.status_code != 200:
+                return False, f"Error {response.status_code}: {response.text[:200]}", latency, []
+            available = [model.get('id') for model in response.json().get('data', [])]
+            missing = sorted({self.model(role) for role in (LISTING_MODEL, EDIT_MODEL)} - set(available))
+            if available and missing:
+                return False, f"Model not served: {', '.join(missing)}", latency, available
+            return True, f"✅ {self.label} healthy ({latency * 1000:.0f} ms)", latency, available
+        except Exception as e:
+            return False, f"Connection Error: {str(e)}", time.monotonic() - started, []
+
+
+def _groq_base_url():
+    # GROQ_API_URL used to hold the full chat completions URL
+    url = os.environ.get("GROQ_API_URL")
+    if url:
+        return url.rstrip('/').removesuffix('/chat/completions')
+    return "https://api.groq.com/openai/v1"
+
+
+def _builtin_providers():
+    providers = [Provider(
+        name='groq',
+        label="Groq Premium (Free)",
+        base_url=_groq_base_url(),
+        models={'default': "llama-3.3-70b-versatile"},
+        requires_key=True,
+        api_key_env="GROQ_API_KEY",
+        max_concurrency=os.environ.get("GROQ_MAX_CONCURRENCY", "16"),
+        adaptive=os.environ.get("GROQ_ADAPTIVE_CONCURRENCY", "1") != "0",
+        timeout=30.0,
+        daily_tokens=DAILY_TOKENS,
+        daily_requests=DAILY_REQUESTS,
+    )]
+    if os.environ.get("LOCAL_LLM_URL"):
+        model = os.environ.get("LOCAL_LLM_MODEL", "llama3.1:8b")
+        providers.append(Provider(
+            name='local',
+            label="Local Server (OpenAI-compatible)",
+            base_url=os.environ["LOCAL_LLM_URL"],
+            models={'default': model, EDIT_MODEL: os.environ.get("LOCAL_LLM_EDIT_MODEL", model)},
+            requires_key=False,
+            api_key_env="LOCAL_LLM_API_KEY",
+            max_concurrency=os.environ.get("LOCAL_LLM_MAX_CONCURRENCY", "4"),
+            # Local servers don't rate limit - queueing inside the server shows up as latency instead
+            adaptive=True,
+            timeout=float(os.environ.get("LOCAL_LLM_TIMEOUT", "120")),
+            extra_body={'cache_prompt': True} if os.environ.get("LOCAL_LLM_CACHE_PROMPT", "1") != "0" else None,
+        ))
+    return providers
+
+
+def load_providers(path=None):
+    """Built-in providers plus any declared in LLM_PROVIDERS_FILE, keyed by name"""
+    providers = {provider.name: provider for provider in _builtin_providers()}
+    path = path or os.environ.get("LLM_PROVIDERS_FILE")
+    if path:
+        with open(path, encoding='utf-8') as handle:
+            for data in json.load(handle):
+                provider = Provider.from_dict(data)
+                providers[provider.name] = provider
+    return providers
+
+
+PROVIDERS = load_providers()
+
+
+def get_provider(name_or_label):
+    """Provider by name or UI label - None for the template generator"""
+    if isinstance(name_or_label, Provider):
+        return name_or_label
+    if name_or_label in PROVIDERS:
+        return PROVIDERS[name_or_label]
+    for provider in PROVIDERS.values():
+        if provider.label == name_or_label:
+            return provider
+    return None
+
+
+def provider_labels():
+    """Choices for the provider selector, template last"""
+    return [provider.label for provider in PROVIDERS.values()] + [TEMPLATE_LABEL]
@@ -0,0 +1,393 @@
+"""
+Quality Scoring
+Rates generated listings so the best of several variations can be picked without anyone
+reading them all, and without another model call. Every candidate gets four scores in
+[0, 1], computed column-wise over the whole batch with pandas/NumPy:
+
+    compliance    share of the prompt's hard rules passed (same rules as validation.py)
+    coverage      property facts the copy mentions - rent, BHK, locality, amenities
+    readability   description and teaser length on target, sentences of a readable length
+    distinctness  share of the description's word trigrams that aren't the batch's boilerplate
+
+and a weighted total. best_variations() keeps the top candidate per listing.
+
+    python quality.py bench --candidates 50000
+    python quality.py history --out best.csv          (best stored version per listing)
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from validation import (BANNED_OPENERS, BULLET_COUNT, KEYWORD_COUNT, LIST_FIELDS, META_DESCRIPTION_LIMIT,
+                        META_TITLE_LIMIT, RULES, TEXT_FIELDS, TITLE_WORDS)
+
+WEIGHTS = {'compliance': 0.35, 'coverage': 0.3, 'readability': 0.2, 'distinctness': 0.15}
+# Word targets from the prompt rules
+DESCRIPTION_WORDS = (150, 200)
+TEASER_WORDS = (15, 20)
+# Average sentence length (words) that still reads easily
+SENTENCE_WORDS = (8, 24)
+SHINGLE_SIZE = 3
+# A trigram used by more than this share of the batch's other listings is boilerplate
+BOILERPLATE_SHARE = 0.01
+# Bytes of text tokenized per NumPy pass
+CHUNK_BYTES = 1 << 22
+
+_HASH_BASE = np.uint64(0x100000001B3)
+# Inverse of _HASH_BASE mod 2^64
+_HASH_BASE_INVERSE = np.uint64(pow(0x100000001B3, -1, 2 ** 64))
+_SENTENCE_FOLLOWERS = np.frombuffer(b' \t\r\n\x00', dtype=np.uint8)
+# Same multipliers as similarity.py - a trigram's hash folds its three word ids
+_SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+# Listing codes live in a trigram key's low bits - up to 16M listings per batch
+_LISTING_BITS = 24
+
+
+def candidate_frame(candidates):
+    """DataFrame of (listing id, variation, property_data, result) candidates - one row each"""
+    rows = []
+    for listing, variation, property_data, result in candidates:
+        row = {field: result.get(field) for field in TEXT_FIELDS + LIST_FIELDS}
+        row.update(listing=listing, variation=variation, property_data=property_data)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['listing', 'variation', 'property_data', *TEXT_FIELDS, *LIST_FIELDS])
+
+
+def _text(frame, field):
+    """A text column with non-strings as ''"""
+    column = frame[field]
+    return column.where(column.map(lambda value: isinstance(value, str)), '').astype(str)
+
+
+def _list_length(frame, field):
+    return frame[field].map(lambda value: len(value) if isinstance(value, list) else 0).to_numpy()
+
+
+def _band_score(values, low, high):
+    """1 inside [low, high], falling linearly to 0 at none or double the upper bound"""
+    values = np.asarray(values, dtype=float)
+    below = np.clip(values / low, 0, 1)
+    above = np.clip(2 - values / high, 0, 1)
+    return np.where(values < low, below, np.where(values > high, above, 1.0))
+
+
+# ==================== SCORES ====================
+def compliance_scores(frame):
+    """Share of rules passed - equals validation.score_result per row"""
+    texts = {field: _text(frame, field) for field in TEXT_FIELDS}
+    failed = np.zeros(len(frame))
+    for field in TEXT_FIELDS:
+        failed += (texts[field].str.strip() == '').to_numpy()
+    lengths = {field: _list_length(frame, field) for field in LIST_FIELDS}
+    for field in LIST_FIELDS:
+        failed += lengths[field] == 0
+
+    failed += (texts['meta_title'].str.len() >= META_TITLE_LIMIT).to_numpy()
+    failed += (texts['meta_description'].str.len() >= META_DESCRIPTION_LIMIT).to_numpy()
+    failed += (lengths['bullet_points'] > 0) & (lengths['bullet_points'] != BULLET_COUNT)
+    failed += (lengths['seo_keywords'] > 0) & (lengths['seo_keywords'] != KEYWORD_COUNT)
+
+    title = texts['title'].str.strip()
+    has_title = (title != '').to_numpy()
+    words = title.str.split().str.len().fillna(0).to_numpy()
+    failed += has_title & ((words < TITLE_WORDS[0]) | (words > TITLE_WORDS[1]))
+    opener = title.str.split(n=1).str[0].fillna('').str.lower().str.strip('!,.:')
+    failed += has_title & opener.isin(BANNED_OPENERS).to_numpy()
+
+    # 'missing' is checked once per field, every other rule once
+    total = len(TEXT_FIELDS) + len(LIST_FIELDS) + len(RULES) - 1
+    return np.clip(1 - failed / total, 0, 1)
+
+
+def _rent_forms(rent):
+    """How a rent can be written - 125000, 125,000 and the Indian 1,25,000"""
+    plain = str(rent)
+    indian = plain[-3:]
+    rest = plain[:-3]
+    while rest:
+        indian = f"{rest[-2:]},{indian}"
+        rest = rest[:-2]
+    return {plain, f"{rent:,}", indian}
+
+
+def _fact_forms(property_data):
+    """
+    Facts to look for as (spellings, fact of each spelling, kind of each fact) - kinds are
+    0 rent, 1 BHK, 2 locality, 3 amenity
+    """
+    facts = []
+    rent = property_data.get('rent_amount') or 0
+    if rent:
+        facts.append((0, _rent_forms(int(rent))))
+    bhk = ' '.join(str(property_data.get('bhk') or '').lower().split())
+    if bhk:
+        facts.append((1, {bhk, bhk.replace(' ', ''), bhk.replace(' ', '-')}))
+    locality = ' '.join(str(property_data.get('locality') or '').lower().split())
+    if locality:
+        facts.append((2, {locality}))
+    for amenity in property_data.get('amenities') or ():
+        amenity = ' '.join(str(amenity).lower().split())
+        if amenity:
+            facts.append((3, {amenity}))
+    forms = [form for _, spellings in facts for form in spellings]
+    form_facts = np.repeat(np.arange(len(facts)), [len(spellings) for _, spellings in facts])
+    kinds = np.array([kind for kind, _ in facts], dtype=np.int64)
+    return forms, form_facts, kinds
+
+
+def coverage_scores(frame):
+    """
+    Share of the listing's facts the copy mentions. Rent, BHK and locality count one each;
+    the amenities together count as one, by the share mentioned.
+    """
+    copy = (_text(frame, 'title') + ' ' + _text(frame, 'teaser_text') + ' ' + _text(frame, 'full_description')
+            + ' ' + frame['bullet_points'].map(lambda value: ' '.join(value) if isinstance(value, list) else ''))
+    haystacks = copy.str.lower().to_numpy()
+
+    # Flat over every spelling of every fact of every row: whether the copy has it, and its fact
+    found, form_facts, codes = [], [], []
+    # Variations of one listing usually share their property_data dict
+    facts = {}
+    fact_count = 0
+    for row, (property_data, haystack) in enumerate(zip(frame['property_data'], haystacks)):
+        entry = facts.get(id(property_data))
+        if entry is None:
+            entry = facts[id(property_data)] = _fact_forms(property_data)
+        forms, fact_of_form, kinds = entry
+        found += [form in haystack for form in forms]
+        form_facts.append(fact_of_form + fact_count)
+        codes.append(kinds + row * 4)
+        fact_count += len(kinds)
+
+    count = len(frame)
+    if not fact_count:
+        return np.ones(count)
+    # A fact is found when any of its spellings is
+    fact_found = np.bincount(np.concatenate(form_facts), weights=np.array(found, dtype=float),
+                             minlength=fact_count) > 0
+    codes = np.concatenate(codes)
+    # Per row and fact kind: facts looked for, facts found
+    expected = np.bincount(codes, minlength=count * 4).reshape(count, 4)
+    hits = np.bincount(codes, weights=fact_found, minlength=count * 4).reshape(count, 4)
+    share = np.divide(hits, expected, out=np.zeros_like(hits), where=expected > 0)
+    present = (expected > 0).sum(axis=1)
+    return np.divide(share.sum(axis=1), present, out=np.ones(count), where=present > 0)
+
+
+def _hash_powers(count):
+    """B^i and B^-i mod 2^64 for i < count"""
+    powers = np.full(count, _HASH_BASE, dtype=np.uint64)
+    inverse = np.full(count, _HASH_BASE_INVERSE, dtype=np.uint64)
+    if count:
+        powers[0] = inverse[0] = 1
+    return np.cumprod(powers), np.cumprod(inverse)
+
+
+def tokenize(texts, chunk_bytes=CHUNK_BYTES):
+    """
+    Word hashes of many texts at once, straight from their UTF-8 bytes. Lowercased [a-z0-9]
+    and non-ASCII runs are words; each word's hash comes from prefix sums of a polynomial
+    hash, so no per-word Python objects are made. Returns (hashes, text index of each word,
+    sentence count per text).
+    """
+    hashes, documents = [], []
+    sentences = np.zeros(len(texts), dtype=np.int64)
+    # Shared by this call's chunks and dropped with it - sized to the chunks, not kept between calls
+    powers = np.zeros(0, dtype=np.uint64)
+    first = 0
+    while first < len(texts):
+        # A chunk of whole texts of about chunk_bytes
+        last, size = first, 0
+        while last < len(texts) and (size < chunk_bytes or last == first):
+            size += len(texts[last]) + 1
+            last += 1
+        buffer = np.frombuffer('\x00'.join(texts[first:last]).encode('utf-8'), dtype=np.uint8)
+        boundaries = np.flatnonzero(buffer == 0)
+
+        lowered = buffer | np.uint8(32)
+        is_word = (((lowered >= 97) & (lowered <= 122)) | ((buffer >= 48) & (buffer <= 57)) | (buffer >= 128))
+        edges = np.diff(np.r_[False, is_word, False].astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+
+        # sum(c_j * B^(end - j)) over a word = B^end * (P[end] - P[start - 1]), P the prefix sums of c_j * B^-j
+        if len(powers) < len(buffer):
+            # Headroom so a slightly longer later chunk doesn't recompute them
+            powers, inverse = _hash_powers(len(buffer) + (len(buffer) >> 3))
+        prefix = np.cumsum(lowered.astype(np.uint64) * inverse[:len(buffer)])
+        before = np.where(starts > 0, prefix[np.maximum(starts - 1, 0)], np.uint64(0))
+        word_hashes = powers[ends] * (prefix[ends] - before)
+        word_hashes ^= word_hashes >> np.uint64(29)
+        word_hashes *= _SHINGLE_MULTIPLIERS[1]
+
+        hashes.append(word_hashes)
+        documents.append(np.searchsorted(boundaries, starts) + first)
+        # Sentence ends: . ! ? followed by whitespace or the end of the text
+        stops = np.flatnonzero((buffer == 46) | (buffer == 33) | (buffer == 63))
+        following = np.r_[buffer, np.uint8(0)][stops + 1]
+        stops = stops[np.isin(following, _SENTENCE_FOLLOWERS)]
+        sentences[first:last] += np.bincount(np.searchsorted(boundaries, stops), minlength=last - first)
+        first = last
+    if not hashes:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64), sentences
+    return np.concatenate(hashes), np.concatenate(documents), sentences
+
+
+def readability_scores(frame, tokens=None):
+    """Description and teaser word counts on target, average sentence length in a readable range"""
+    description = _text(frame, 'full_description')
+    _, documents, sentences = tokens or tokenize(description.tolist())
+    words = np.bincount(documents, minlength=len(frame))
+    teaser_words = np.fromiter((len(text.split()) for text in _text(frame, 'teaser_text')), dtype=np.int64,
+                               count=len(frame))
+    return (_band_score(words, *DESCRIPTION_WORDS) + _band_score(teaser_words, *TEASER_WORDS)
+            + np.where(words > 0, _band_score(words / np.maximum(sentences, 1), *SENTENCE_WORDS), 0)) / 3
+
+
+def distinctness_scores(frame, tokens=None):
+    """
+    Share of each description's word trigrams that aren't boilerplate - used by more than
+    BOILERPLATE_SHARE of the batch's other listings. A listing's own variations don't count.
+    """
+    count = len(frame)
+    word_hashes, documents, _ = tokens or tokenize(_text(frame, 'full_description').tolist())
+    span = len(word_hashes) - SHINGLE_SIZE + 1
+    if span <= 0:
+        return np.ones(count)
+
+    # Trigrams that stay inside one description
+    inside = documents[:span] == documents[SHINGLE_SIZE - 1:]
+    shingles = np.zeros(span, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        shingles ^= word_hashes[offset:offset + span] * _SHINGLE_MULTIPLIERS[offset]
+    shingles, documents = shingles[inside], documents[:span][inside]
+    listing_codes, listing_names = pd.factorize(frame['listing'])
+    listings = listing_codes[documents]
+
+    # Sort by (trigram, listing) in one key and count the distinct listings in each trigram's run
+    high = shingles >> np.uint64(_LISTING_BITS)
+    keys = (high << np.uint64(_LISTING_BITS)) | listings.astype(np.uint64)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    new_shingle = np.r_[True, (sorted_keys[1:] >> np.uint64(_LISTING_BITS)) != (sorted_keys[:-1] >> np.uint64(_LISTING_BITS))]
+    new_pair = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    group = np.cumsum(new_shingle) - 1
+    others = np.bincount(group, weights=new_pair)[group] - 1
+    boilerplate = np.empty(len(order), dtype=bool)
+    boilerplate[order] = others >= max(1.0, BOILERPLATE_SHARE * (len(listing_names) - 1))
+
+    total = np.bincount(documents, minlength=count)
+    common = np.bincount(documents, weights=boilerplate, minlength=count)
+    return np.where(total > 0, 1 - common / np.maximum(total, 1), 0.0)
+
+
+def score_candidates(frame, weights=WEIGHTS):
+    """Add the four component scores and the weighted `score` to a candidate frame (in place, returned)"""
+    frame['compliance'] = compliance_scores(frame)
+    frame['coverage'] = coverage_scores(frame)
+    # Description words are tokenized once for both
+    tokens = tokenize(_text(frame, 'full_description').tolist())
+    frame['readability'] = readability_scores(frame, tokens)
+    frame['distinctness'] = distinctness_scores(frame, tokens)
+    frame['score'] = sum(frame[name] * weight for name, weight in weights.items()) / sum(weights.values())
+    return frame
+
+
+def best_variations(frame):
+    """The highest-scoring candidate of each listing (scores the frame first if needed)"""
+    if 'score' not in frame:
+        score_candidates(frame)
+    return frame.loc[frame.groupby('listing', sort=False)['score'].idxmax()]
+
+
+def pick_best(property_data, results):
+    """Index of the best of one listing's results, and the scored frame"""
+    frame = score_candidates(candidate_frame((0, index, property_data, result)
+                                             for index, result in enumerate(results)))
+    return int(frame['score'].idxmax()), frame
+
+
+# ==================== CLI ====================
+def sample_candidates(count, variations=5, seed=7):
+    """Mock-style candidates for benchmark listings, with facts and rule breaks mixed in"""
+    import random
+
+    from benchmark import sample_listings
+    from mock_groq import fake_listing
+
+    rng = random.Random(seed)
+    listings = sample_listings(max(1, count // variations), seed=seed)
+    candidates = []
+    for index in range(count):
+        listing = index // variations
+        property_data = listings[listing % len(listings)]
+        result = fake_listing(rng)
+        if rng.random() < 0.6:
+            result['full_description'] += (f" This {property_data['bhk']} in {property_data['locality']} rents for "
+                                           f"₹{property_data['rent_amount']:,} with "
+                                           f"{', '.join(property_data['amenities'][:rng.randint(0, 4)])}.")
+        if rng.random() < 0.2:
+            result['meta_title'] = result['meta_title'] + ' ' + result['meta_title']
+        if rng.random() < 0.1:
+            result['bullet_points'] = result['bullet_points'][:3]
+        if rng.random() < 0.05:
+            result['title'] = "Discover " + result['title']
+        candidates.append((listing, index % variations, property_data, result))
+    return candidates
+
+
+def best_from_history(chunk_rows=20000):
+    """Best stored version per listing in the history DB, scored a chunk of rows at a time"""
+    from history_db import history_db
+
+    best = {}
+    after = 0
+    while True:
+        rows = history_db.result_rows(after, chunk_rows)
+        if not rows:
+            break
+        after = rows[-1][0]
+        frame = score_candidates(candidate_frame((row[1], row[0], row[3], row[4]) for row in rows))
+        frame['style'] = [row[2] for row in rows]
+        for record in best_variations(frame).itertuples():
+            if record.listing not in best or record.score > best[record.listing]['score']:
+                best[record.listing] = {'listing_hash': record.listing, 'id': record.variation, 'style': record.style,
+                                        'title': record.title, 'score': round(record.score, 4),
+                                        'compliance': round(record.compliance, 4), 'coverage': round(record.coverage, 4),
+                                        'readability': round(record.readability, 4),
+                                        'distinctness': round(record.distinctness, 4)}
+    return pd.DataFrame(list(best.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score generated listings and pick the best variation per listing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="score synthetic candidates and time it")
+    bench.add_argument("--candidates", type=int, default=50000)
+    bench.add_argument("--variations", type=int, default=5)
+    history = commands.add_parser("history", help="best stored version of every listing in the history DB")
+    history.add_argument("--out", default=None, help="CSV to write (prints a summary otherwise)")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        candidates = sample_candidates(args.candidates, args.variations)
+        started = time.perf_counter()
+        frame = candidate_frame(candidates)
+        built = time.perf_counter()
+        best = best_variations(frame)
+        finished = time.perf_counter()
+        print(f"{len(frame)} candidates for {len(best)} listings: frame {built - started:.2f}s, "
+              f"scoring {finished - built:.2f}s ({len(frame) / (finished - built):,.0f}/s)")
+        print(frame[['compliance', 'coverage', 'readability', 'distinctness', 'score']].describe()
+              .loc[['mean', 'min', 'max']].round(3).to_string())
+        print(f"best per listing: mean score {best['score'].mean():.3f} vs {frame['score'].mean():.3f} overall")
+    else:
+        best = best_from_history()
+        if args.out:
+            best.to_csv(args.out, index=False)
+            print(f"wrote {len(best)} listings to {args.out}")
+        else:
+            print(best.head(20).to_string(index=False) if len(best) else "history is empty")
@@ -0,0 +1,250 @@
+"""
+Daily Quota Planner
+Paces Groq usage against the daily token and request caps of the free tier
+(GROQ_DAILY_TOKENS, GROQ_DAILY_REQUESTS) so a big batch can't burn the quota by
+mid-morning and push every later click onto the template fallback.
+Usage is tracked per API key over a rolling 24 hour window. Batch work is spread
+evenly across the day and never touches the share held back for interactive requests.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+from scheduler import INTERACTIVE, INTERACTIVE_RESERVE
+from token_budget import token_budget
+
+DAY = 86400.0
+DAILY_TOKENS = int(os.environ.get("GROQ_DAILY_TOKENS", "0")) or None
+DAILY_REQUESTS = int(os.environ.get("GROQ_DAILY_REQUESTS", "0")) or None
+# How far batch work may run ahead of an even spread across the day
+PACING_BURST_SECONDS = 900.0
+# Starting guess for prompt size until Groq's usage blocks calibrate it
+CHARS_PER_TOKEN = 4.0
+
+
+class QuotaExceeded(Exception):
+    """A call that cannot fit in what is left of the daily quota"""
+
+
+def key_id(api_key):
+    """Short fingerprint of an API key - raw keys are never kept"""
+    return hashlib.sha256(api_key.strip().encode('utf-8')).hexdigest()[:12]
+
+
+class _Allowance:
+    """One capped resource (tokens or requests) for one key over a rolling window"""
+
+    def __init__(self, limit, reserve, window=DAY, burst=PACING_BURST_SECONDS):
+        self.limit = limit
+        self.batch_limit = limit * (1 - reserve)
+        self.rate = self.batch_limit / window
+        self.window = window
+        self.burst = burst
+        self.used = 0
+        self._events = deque()
+        # Pacing clock (GCRA): when the batch budget spent so far would be "earned"
+        self._clock = 0.0
+
+    def _expire(self, now):
+        while self._events and self._events[0][0] <= now - self.window:
+            self.used -= self._events.popleft()[1]
+
+    def cap(self, priority):
+        return self.limit if priority == INTERACTIVE else self.batch_limit
+
+    def add(self, amount, now):
+        self._expire(now)
+        self._events.append((now, amount))
+        self.used += amount
+
+    def window_wait(self, amount, cap, now):
+        """Seconds until `amount` fits under `cap` as old usage ages out - None if it never will"""
+        self._expire(now)
+        if amount > cap:
+            return None
+        excess = self.used + amount - cap
+        if excess <= 0:
+            return 0.0
+        freed = 0
+        for at, used in self._events:
+            freed += used
+            if freed >= excess:
+                return at + self.window - now
+        return None
+
+    def pace_wait(self, now):
+        """Seconds until the pacing clock lets the next batch call through"""
+        return max(0.0, self._clock - self.burst - now)
+
+    def pace(self, amount, now):
+        """Book `amount` on the pacing clock"""
+        self._clock = max(self._clock, now) + amount / self.rate
+
+    def unpace(self, amount):
+        """Give back pacing time booked for work that didn't happen or came in cheaper"""
+        self._clock -= amount / self.rate
+
+    def pacing_eta(self, amount, now):
+        """Seconds until a job of `amount` would be through the pacing clock"""
+        return max(0.0, max(self._clock, now) + amount / self.rate - self.burst - now)
+
+
+class QuotaPlanner:
+    """
+    Per-key daily quota tracking and batch pacing.
+    Without GROQ_DAILY_TOKENS / GROQ_DAILY_REQUESTS it only counts usage and never delays.
+    """
+
+    def __init__(self, daily_tokens=DAILY_TOKENS, daily_requests=DAILY_REQUESTS,
+                 reserve=INTERACTIVE_RESERVE, window=DAY, clock=time.time, metric_prefix='groq'):
+        self.daily_tokens = daily_tokens
+        self.daily_requests = daily_requests
+        self.reserve = reserve
+        self.window = window
+        self.clock = clock
+        self.metric_prefix = metric_prefix
+        self._keys = {}
+        self._prompt_chars = 0
+        self._prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.daily_tokens or self.daily_requests)
+
+    def _allowances(self, api_key):
+        ident = key_id(api_key)
+        if ident not in self._keys:
+            self._keys[ident] = {
+                'tokens': _Allowance(self.daily_tokens or math.inf, self.reserve, self.window),
+                'requests': _Allowance(self.daily_requests or math.inf, self.reserve, self.window),
+            }
+        return self._keys[ident]
+
+    # ==================== ESTIMATES ====================
+    def chars_per_token(self):
+        with self._lock:
+            if self._prompt_tokens < 1000:
+                return CHARS_PER_TOKEN
+            return self._prompt_chars / self._prompt_tokens
+
+    def estimate(self, payload, budget_key=None):
+        """Expected total tokens of one call - prompt size plus the completions seen so far"""
+        chars = sum(len(message.get('content', '')) for message in payload.get('messages', []))
+        prompt = math.ceil(chars / self.chars_per_token())
+        completion = None
+        if budget_key is not None:
+            completion = token_budget.mean_completion(budget_key)
+        if completion is None:
+            completion = payload.get('max_tokens') or 0
+        return prompt + math.ceil(completion)
+
+    # ==================== ADMISSION ====================
+    def try_reserve(self, api_key, tokens, priority=INTERACTIVE):
+        """
+        Book one call if it can be sent now - otherwise returns the seconds to wait
+        before asking again (0 means booked). Raises QuotaExceeded when it can't fit:
+        interactive calls once the whole quota is spent, other classes once their share is.
+        """
+        with self._lock:
+            now = self.clock()
+            allowances = self._allowances(api_key)
+            charges = ((allowances['tokens'], tokens), (allowances['requests'], 1))
+            delay = 0.0
+            for allowance, amount in charges:
+                wait = allowance.window_wait(amount, allowance.cap(priority), now)
+                if wait is None or (wait and priority == INTERACTIVE):
+                    metrics.inc(f"{self.metric_prefix}_quota_refused_total")
+                    raise QuotaExceeded(f"Daily quota exhausted for key {key_id(api_key)}")
+                delay = max(delay, wait)
+                if priority != INTERACTIVE and math.isfinite(allowance.limit):
+                    delay = max(delay, allowance.pace_wait(now))
+
+            if delay:
+                metrics.inc(f"{self.metric_prefix}_quota_deferred_total")
+                return delay
+
+            for allowance, amount in charges:
+                allowance.add(amount, now)
+                if priority != INTERACTIVE and math.isfinite(allowance.limit):
+                    allowance.pace(amount, now)
+            return 0.0
+
+    def settle(self, api_key, estimated, usage=None, priority=INTERACTIVE, prompt_chars=None):
+        """Swap a booked estimate for the tokens Groq actually reported (none for failed calls)"""
+        usage = usage or {}
+        actual = usage.get('total_tokens', 0)
+        with self._lock:
+            allowances = self._allowances(api_key)
+            allowances['tokens'].add(actual - estimated, self.clock())
+            if priority != INTERACTIVE and math.isfinite(allowances['tokens'].limit):
+                allowances['tokens'].unpace(estimated - actual)
+            if prompt_chars and usage.get('prompt_tokens'):
+                self._prompt_chars += prompt_chars
+                self._prompt_tokens += usage['prompt_tokens']
+        metrics.inc(f"{self.metric_prefix}_quota_tokens_used_total", actual)
+
+    # ==================== PLANNING ====================
+    def usage(self, api_key):
+        """Tokens and requests used in the last 24 hours and what is left of each cap"""
+        with self._lock:
+            now = self.clock()
+            report = {}
+            for name, allowance in self._allowances(api_key).items():
+                allowance._expire(now)
+                report[f"{name}_used"] = allowance.used
+                report[f"{name}_remaining"] = allowance.limit - allowance.used
+            return report
+
+    def plan_job(self, api_key, tokens, requests, throughput=None):
+        """
+        Fit check and completion projection for a batch job of `tokens` / `requests`.
+        throughput is the expected requests per second without any quota pacing.
+        decision is 'run', 'defer' (can't start yet, will fit later) or 'refuse' (more than
+        a whole day's batch share, so it could never finish inside the window).
+        """
+        with self._lock:
+            now = self.clock()
+            allowances = self._allowances(api_key)
+            decision = 'run'
+            start_in = 0.0
+            eta = 0.0
+            for allowance, amount in ((allowances['tokens'], tokens), (allowances['requests'], requests)):
+                if not math.isfinite(allowance.limit):
+                    continue
+                if amount > allowance.batch_limit:
+                    decision = 'refuse'
+                    continue
+                # The first request must fit in what is left today, the job as a whole is paced
+                first = amount / max(1, requests)
+                wait = allowance.window_wait(first, allowance.batch_limit, now)
+                if wait is None:
+                    decision = 'refuse'
+                    continue
+                start_in = max(start_in, wait, allowance.pace_wait(now))
+                eta = max(eta, allowance.pacing_eta(amount, now))
+
+        if throughput:
+            eta = max(eta, requests / throughput)
+        if decision != 'refuse' and start_in > 0:
+            decision = 'defer'
+        plan = {
+            'decision': decision,
+            'tokens': tokens,
+            'requests': requests,
+            'start_in': start_in,
+            'eta_seconds': eta if decision != 'refuse' else None,
+        }
+        plan.update(self.usage(api_key))
+        return plan
+
+    def reset(self):
+        with self._lock:
+            self._keys.clear()
+            self._prompt_chars = 0
+            self._prompt_tokens = 0
@@ -0,0 +1,176 @@
+"""
+Traffic Replay Test
+Replays a recorded cassette (see cassette.py) through the generation paths with no
+network access and reports throughput, latency percentiles and failures - a performance
+regression check for the engine, scheduler and generation code.
+
+    python replay_test.py record sample.jsonl.gz --listings 100        (mock server -> cassette)
+    python replay_test.py replay day.jsonl.gz --mode calls --speed 10 --compress 60
+    python replay_test.py replay day.jsonl.gz --mode batch --speed 0 --min-throughput 50
+
+Modes: `calls` fires every recorded listing generation through generate_description at
+its recorded arrival time divided by --compress (0 fires everything at once); `batch`
+runs the recorded listings through generate_batch_with_groq; `requests` re-posts the raw
+recorded payloads through the engine. --speed divides recorded model latency.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import generation
+from async_engine import get_engine
+from benchmark import sample_listings
+from cassette import Cassette, RecordingTransport, ReplayTransport
+from load_test import percentile
+from metrics import metrics
+from mock_groq import start_mock_server
+from providers import DEFAULT_PROVIDER
+
+REPLAY_KEY = "replay-key"
+
+
+def recorded_calls(cassette, provider):
+    """(arrival offset, property_data, variation_seed) per recorded listing generation, in arrival order"""
+    calls = {}
+    entries = [entry for entry in cassette.entries if entry.get('provider') == provider]
+    start = min((entry['at'] for entry in entries), default=0)
+    for entry in entries:
+        call = entry.get('call')
+        if call and call.get('kind') == 'generate' and call['id'] not in calls:
+            calls[call['id']] = (entry['at'] - start, call['property_data'], call['variation_seed'])
+    return sorted(calls.values(), key=lambda call: call[0])
+
+
+def replay_calls(calls, provider, compress, workers):
+    """generate_description per call at its (compressed) arrival time - returns (latencies, failures)"""
+    latencies = []
+    fallbacks = metrics.get(f"{get_engine(provider).provider.name}_fallbacks_total")
+    started = time.monotonic()
+
+    def _one(call):
+        offset, property_data, variation_seed = call
+        if compress:
+            time.sleep(max(0.0, started + offset / compress - time.monotonic()))
+        requested = time.monotonic()
+        generation.generate_description(property_data, provider, REPLAY_KEY, variation_seed)
+        latencies.append(time.monotonic() - requested)
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(_one, calls))
+    # Template fallbacks are calls whose every LLM attempt failed
+    return latencies, metrics.get(f"{get_engine(provider).provider.name}_fallbacks_total") - fallbacks
+
+
+def replay_batch(calls, provider):
+    """The recorded listings through the batch path, one batch per variation seed - returns failures"""
+    failures = 0
+    for seed in sorted({call[2] for call in calls}):
+        listings = [call[1] for call in calls if call[2] == seed]
+        results = generation.generate_batch_with_groq(listings, REPLAY_KEY, seed, provider=provider,
+                                                      record_history=False)
+        failures += sum(result is None for result in results)
+    return failures
+
+
+def replay_requests(cassette, engine, compress):
+    """Every recorded payload re-posted through the engine - returns (latencies, failures)"""
+    entries = [entry for entry in cassette.entries if entry.get('provider') == engine.provider.name]
+    start = min((entry['at'] for entry in entries), default=0)
+    latencies = []
+    failures = 0
+
+    async def _one(entry):
+        nonlocal failures
+        if compress:
+            await asyncio.sleep((entry['at'] - start) / compress)
+        requested = time.monotonic()
+        try:
+            response = await engine.post(entry['request'], REPLAY_KEY, call=entry.get('call'))
+            failures += response.status_code != 200
+        except Exception:
+            failures += 1
+        latencies.append(time.monotonic() - requested)
+
+    async def _all():
+        await asyncio.gather(*(_one(entry) for entry in entries))
+
+    engine.run(_all())
+    return latencies, failures
+
+
+def record_sample(path, listings, variations, time_scale, provider):
+    """Record mock-server traffic for sample listings - a cassette to replay without real traffic"""
+    server = start_mock_server(time_scale=time_scale)
+    engine = get_engine(provider)
+    engine.api_url = server.url
+    cassette = Cassette(path)
+    engine.set_transport(RecordingTransport(cassette, engine.provider.name))
+    for seed in range(variations):
+        generation.generate_batch_with_groq(listings, REPLAY_KEY, seed, provider=provider, record_history=False)
+    cassette.close()
+    server.shutdown()
+    return cassette.recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay LLM traffic cassettes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record sample listings against the mock Groq server")
+    record.add_argument("path")
+    record.add_argument("--listings", type=int, default=50)
+    record.add_argument("--variations", type=int, default=1)
+    record.add_argument("--time-scale", type=float, default=0.1, help="scale simulated model latency")
+
+    replay = commands.add_parser("replay", help="replay a cassette through the generation paths")
+    replay.add_argument("path")
+    replay.add_argument("--mode", choices=("calls", "batch", "requests"), default="calls")
+    replay.add_argument("--speed", type=float, default=1.0, help="divide recorded latency (0 = instant)")
+    replay.add_argument("--compress", type=float, default=0.0,
+                        help="divide recorded arrival gaps (0 = everything at once)")
+    replay.add_argument("--workers", type=int, default=32, help="concurrent callers in calls mode")
+    replay.add_argument("--min-throughput", type=float, default=None,
+                        help="exit 1 below this many generations per second")
+
+    for command in (record, replay):
+        command.add_argument("--provider", default=DEFAULT_PROVIDER)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record_sample(args.path, sample_listings(args.listings), args.variations, args.time_scale,
+                              args.provider)
+        print(f"recorded {count} exchanges to {args.path}")
+        sys.exit(0)
+
+    cassette = Cassette.load(args.path)
+    engine = get_engine(args.provider)
+    engine.set_transport(ReplayTransport(cassette, args.speed, engine.provider.name))
+    calls = recorded_calls(cassette, engine.provider.name)
+
+    started = time.perf_counter()
+    latencies = []
+    if args.mode == "calls":
+        latencies, failures = replay_calls(calls, args.provider, args.compress, args.workers)
+        count = len(calls)
+    elif args.mode == "batch":
+        failures = replay_batch(calls, args.provider)
+        count = len(calls)
+    else:
+        latencies, failures = replay_requests(cassette, engine, args.compress)
+        count = len(latencies)
+    elapsed = time.perf_counter() - started
+
+    throughput = count / elapsed if elapsed else 0.0
+    print(f"{args.mode}: {count} from {len(cassette.entries)} recorded exchanges in {elapsed:.2f}s "
+          f"({throughput:.1f}/s), {failures} failed")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 0.5):.3f}s  p95 {percentile(latencies, 0.95):.3f}s  "
+              f"p99 {percentile(latencies, 0.99):.3f}s")
+    print(f"matched exactly: {metrics.get('cassette_exact_total')}, by kind: {metrics.get('cassette_fallback_total')}, "
+          f"throttled: {metrics.get(f'{engine.provider.name}_throttled_total')}")
+    if args.min_throughput is not None and throughput < args.min_throughput:
+        print(f"REGRESSION: {throughput:.1f}/s is below {args.min_throughput}/s")
+        sys.exit(1)
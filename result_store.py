@@ -0,0 +1,313 @@
+"""
+Result Store
+Persists generated listings, their version history and enhanced descriptions outside
+st.session_state, keyed by user and listing content hash, so any replica behind the
+load balancer can serve a user's history after a reload without regenerating it.
+Redis when REDIS_URL is reachable, local disk (RESULT_STORE_DIR) otherwise.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from listing import listing_key
+from metrics import metrics
+from prompts import get_variation
+
+REDIS_URL = os.environ.get("REDIS_URL")
+STORE_DIR = os.environ.get("RESULT_STORE_DIR", os.path.join(os.path.expanduser("~"), ".airent", "results"))
+KEY_PREFIX = "airent"
+PAGE_SIZE = 10
+# Listings kept per user - the least recently updated fall off
+MAX_LISTINGS = 200
+
+_SAFE_USER = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def user_key(user_id):
+    """Path- and key-safe form of a user id"""
+    user_id = str(user_id)
+    if _SAFE_USER.match(user_id):
+        return user_id
+    return hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32]
+
+
+def _page_bounds(total, page, page_size):
+    """Newest-first page -> oldest-first [start, stop) indexes"""
+    stop = max(0, total - page * page_size)
+    return max(0, stop - page_size), stop
+
+
+# ==================== BACKENDS ====================
+class RedisBackend:
+    """
+    {prefix}:{user}:listings           sorted set of listing hashes by last update
+    {prefix}:{user}:listing:{hash}     listing summary JSON
+    {prefix}:{user}:versions:{hash}    list of version records, oldest first
+    {prefix}:{user}:enhanced:{hash}    hash of version -> enhanced description
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, user, *parts):
+        return ':'.join((self.prefix, user) + parts)
+
+    def append_version(self, user, listing_hash, summary, record):
+        # A version number is its 1-based position in the list
+        version = self.client.rpush(self._key(user, 'versions', listing_hash), json.dumps(record, ensure_ascii=False))
+        summary['versions'] = version
+
+        pipe = self.client.pipeline()
+        pipe.set(self._key(user, 'listing', listing_hash), json.dumps(summary, ensure_ascii=False))
+        pipe.zadd(self._key(user, 'listings'), {listing_hash: summary['updated_ts']})
+        pipe.execute()
+        self._trim(user)
+        return version
+
+    def _trim(self, user):
+        listings_key = self._key(user, 'listings')
+        dropped = self.client.zrange(listings_key, 0, -(MAX_LISTINGS + 1))
+        if not dropped:
+            return
+        pipe = self.client.pipeline()
+        for listing_hash in dropped:
+            listing_hash = listing_hash.decode() if isinstance(listing_hash, bytes) else listing_hash
+            pipe.delete(self._key(user, 'listing', listing_hash), self._key(user, 'versions', listing_hash),
+                        self._key(user, 'enhanced', listing_hash))
+        pipe.zrem(listings_key, *dropped)
+        pipe.execute()
+
+    def set_enhanced(self, user, listing_hash, version, text):
+        self.client.hset(self._key(user, 'enhanced', listing_hash), str(version), text)
+
+    def get_enhanced(self, user, listing_hash, version):
+        value = self.client.hget(self._key(user, 'enhanced', listing_hash), str(version))
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def listings(self, user, page, page_size):
+        listings_key = self._key(user, 'listings')
+        total = self.client.zcard(listings_key)
+        start = page * page_size
+        hashes = self.client.zrevrange(listings_key, start, start + page_size - 1)
+        if not hashes:
+            return [], total
+        keys = [self._key(user, 'listing', h.decode() if isinstance(h, bytes) else h) for h in hashes]
+        return [json.loads(raw) for raw in self.client.mget(keys) if raw], total
+
+    def summary(self, user, listing_hash):
+        raw = self.client.get(self._key(user, 'listing', listing_hash))
+        return json.loads(raw) if raw else None
+
+    def versions(self, user, listing_hash, page, page_size):
+        versions_key = self._key(user, 'versions', listing_hash)
+        total = self.client.llen(versions_key)
+        start, stop = _page_bounds(total, page, page_size)
+        if stop <= start:
+            return [], total
+        records = [dict(json.loads(raw), version=start + offset + 1)
+                   for offset, raw in enumerate(self.client.lrange(versions_key, start, stop - 1))]
+        return records[::-1], total
+
+    def version(self, user, listing_hash, version):
+        raw = self.client.lindex(self._key(user, 'versions', listing_hash), version - 1)
+        return dict(json.loads(raw), version=version) if raw else None
+
+
+class DiskBackend:
+    """
+    {root}/{user}/{hash}/listing.json      listing summary
+    {root}/{user}/{hash}/versions.jsonl    one version record per line, oldest first
+    {root}/{user}/{hash}/enhanced.json     version -> enhanced description
+    """
+
+    name = 'disk'
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _dir(self, user, listing_hash=None):
+        parts = [self.root, user] + ([listing_hash] if listing_hash else [])
+        return os.path.join(*parts)
+
+    def _write_json(self, path, value):
+        # Atomic replace so a reader never sees half a file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as handle:
+            json.dump(value, handle, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _read_json(self, path, default=None):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return default
+
+    def _lines(self, user, listing_hash):
+        try:
+            with open(os.path.join(self._dir(user, listing_hash), 'versions.jsonl'), encoding='utf-8') as handle:
+                return handle.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def append_version(self, user, listing_hash, summary, record):
+        directory = self._dir(user, listing_hash)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            # A version number is its 1-based line number
+            version = len(self._lines(user, listing_hash)) + 1
+            with open(os.path.join(directory, 'versions.jsonl'), 'a', encoding='utf-8') as handle:
+                handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+            summary['versions'] = version
+            self._write_json(os.path.join(directory, 'listing.json'), summary)
+            self._trim(user)
+        return version
+
+    def _ordered(self, user):
+        """Listing hashes, most recently updated first (by listing.json mtime)"""
+        try:
+            entries = list(os.scandir(self._dir(user)))
+        except FileNotFoundError:
+            return []
+        stamped = []
+        for entry in entries:
+            try:
+                stamped.append((os.stat(os.path.join(entry.path, "listing.json")).st_mtime_ns, entry.name))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return [name for _, name in sorted(stamped, reverse=True)]
+
+    def _trim(self, user):
+        for listing_hash in self._ordered(user)[MAX_LISTINGS:]:
+            directory = self._dir(user, listing_hash)
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def set_enhanced(self, user, listing_hash, version, text):
+        path = os.path.join(self._dir(user, listing_hash), 'enhanced.json')
+        with self._lock:
+            enhanced = self._read_json(path, {})
+            enhanced[str(version)] = text
+            self._write_json(path, enhanced)
+
+    def get_enhanced(self, user, listing_hash, version):
+        return self._read_json(os.path.join(self._dir(user, listing_hash), 'enhanced.json'), {}).get(str(version))
+
+    def listings(self, user, page, page_size):
+        ordered = self._ordered(user)
+        start = page * page_size
+        summaries = [self.summary(user, listing_hash) for listing_hash in ordered[start:start + page_size]]
+        return [summary for summary in summaries if summary], len(ordered)
+
+    def summary(self, user, listing_hash):
+        return self._read_json(os.path.join(self._dir(user, listing_hash), 'listing.json'))
+
+    def versions(self, user, listing_hash, page, page_size):
+        lines = self._lines(user, listing_hash)
+        start, stop = _page_bounds(len(lines), page, page_size)
+        records = [dict(json.loads(line), version=start + offset + 1) for offset, line in enumerate(lines[start:stop])]
+        return records[::-1], len(lines)
+
+    def version(self, user, listing_hash, version):
+        lines = self._lines(user, listing_hash)
+        if not 1 <= version <= len(lines):
+            return None
+        return dict(json.loads(lines[version - 1]), version=version)
+
+
+# ==================== STORE ====================
+class ResultStore:
+    """Backend-agnostic result history - failures are counted and treated as misses"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _guard(self, default, operation, *args):
+        try:
+            return operation(*args)
+        except Exception:
+            metrics.inc(f"result_store_{self.backend.name}_errors_total")
+            return default
+
+    def save_version(self, user_id, property_data, result, generation_count=0, provider=None):
+        """Store a generated result as the listing's next version - returns (listing hash, version)"""
+        listing_hash = listing_key(property_data)
+        now = time.time()
+        summary = {
+            'listing_hash': listing_hash,
+            'title': result.get('title', ''),
+            'bhk': property_data.get('bhk'),
+            'locality': property_data.get('locality'),
+            'city': property_data.get('city'),
+            'updated_at': datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+            'updated_ts': now,
+            'property_data': property_data,
+        }
+        record = {
+            'generation_count': generation_count,
+            'style': get_variation(generation_count)['focus'],
+            'provider': provider,
+            'created_at': summary['updated_at'],
+            'result': result,
+        }
+        version = self._guard(None, self.backend.append_version, user_key(user_id), listing_hash, summary, record)
+        return listing_hash, version
+
+    def save_enhanced(self, user_id, listing_hash, version, text):
+        """Attach an enhanced description to a stored version"""
+        if listing_hash and version:
+            self._guard(None, self.backend.set_enhanced, user_key(user_id), listing_hash, version, text)
+
+    def list_listings(self, user_id, page=0, page_size=PAGE_SIZE):
+        """One page of listing summaries, most recently updated first - (items, total)"""
+        return self._guard(([], 0), self.backend.listings, user_key(user_id), page, page_size)
+
+    def get_listing(self, user_id, listing_hash):
+        return self._guard(None, self.backend.summary, user_key(user_id), listing_hash)
+
+    def list_versions(self, user_id, listing_hash, page=0, page_size=PAGE_SIZE):
+        """One page of a listing's versions, newest first - (items, total)"""
+        return self._guard(([], 0), self.backend.versions, user_key(user_id), listing_hash, page, page_size)
+
+    def get_version(self, user_id, listing_hash, version):
+        """A stored version with its enhanced description (if any) filled in"""
+        user = user_key(user_id)
+        record = self._guard(None, self.backend.version, user, listing_hash, version)
+        if record is not None:
+            record['enhanced_description'] = self._guard(None, self.backend.get_enhanced, user, listing_hash, version)
+        return record
+
+    def latest(self, user_id):
+        """(summary, newest version) of the most recently updated listing, or None"""
+        items, _ = self.list_listings(user_id, 0, 1)
+        if not items:
+            return None
+        summary = items[0]
+        return summary, self.get_version(user_id, summary['listing_hash'], summary['versions'])
+
+
+def open_store(redis_url=REDIS_URL, root=STORE_DIR):
+    """Redis store when reachable, else the local disk store"""
+    if redis_url:
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+            client.ping()
+            return ResultStore(RedisBackend(client))
+        except Exception:
+            metrics.inc("result_store_redis_unavailable_total")
+    return ResultStore(DiskBackend(root))
+
+
+# Shared by every session in this process
+result_store = open_store()
@@ -0,0 +1,195 @@
+"""
+Request Scheduler
+Orders every Groq call by priority class so UI clicks never queue behind bulk jobs.
+Within a class, tenants are served round-robin. Part of the concurrency limit and of
+the request-rate budget is held back for interactive work only.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from metrics import metrics
+
+# Priority classes - lower value is served first
+INTERACTIVE = 0
+ENHANCEMENT = 1
+BATCH = 2
+BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    INTERACTIVE: 'interactive',
+    ENHANCEMENT: 'enhancement',
+    BATCH: 'batch',
+    BACKGROUND: 'background',
+}
+
+DEFAULT_TENANT = 'default'
+INTERACTIVE_RESERVE = float(os.environ.get("GROQ_INTERACTIVE_RESERVE", "0.2"))
+REQUESTS_PER_MINUTE = float(os.environ.get("GROQ_REQUESTS_PER_MINUTE", "0")) or None
+
+
+class TokenBucket:
+    """Request-rate budget: `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, reserve=0.0):
+        """Take one token if that leaves at least `reserve` behind"""
+        self._refill()
+        if self.tokens - 1 < reserve:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self, reserve=0.0):
+        """Seconds until try_take(reserve) can succeed"""
+        self._refill()
+        return max(0.0, (1 + reserve - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ('future', 'priority', 'tenant', 'queued_at')
+
+    def __init__(self, future, priority, tenant):
+        self.future = future
+        self.priority = priority
+        self.tenant = tenant
+        self.queued_at = time.monotonic()
+
+
+class RequestScheduler:
+    """
+    Grants concurrency slots from a limiter in priority order.
+    Non-interactive classes may not use the last `reserve` share of slots or rate tokens.
+    """
+
+    def __init__(self, limiter, requests_per_minute=REQUESTS_PER_MINUTE, reserve=INTERACTIVE_RESERVE,
+                 metric_prefix='groq'):
+        self.limiter = limiter
+        self.metric_prefix = metric_prefix
+        self.reserve = reserve
+        self.bucket = None
+        if requests_per_minute:
+            # Allow a burst of about ten seconds' worth of requests
+            self.bucket = TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 6.0))
+        # priority -> tenant -> deque of waiters; tenant order rotates for round-robin
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self._timer = None
+        limiter.on_change = self._pump
+
+    # ==================== RESERVATION ====================
+    def _reserved_slots(self, priority):
+        if priority == INTERACTIVE or self.limiter.limit < 2:
+            return 0
+        return max(1, int(self.limiter.limit * self.reserve))
+
+    def _reserved_tokens(self, priority):
+        if priority == INTERACTIVE or self.bucket is None:
+            return 0.0
+        return self.bucket.capacity * self.reserve
+
+    # ==================== QUEUES ====================
+    def _peek(self):
+        """Next waiter to serve: highest priority class, then next tenant in rotation"""
+        for priority in sorted(self._queues):
+            tenants = self._queues[priority]
+            while tenants:
+                tenant, waiters = next(iter(tenants.items()))
+                while waiters and waiters[0].future.done():
+                    # Cancelled while queued
+                    waiters.popleft()
+                if waiters:
+                    return waiters[0]
+                del tenants[tenant]
+        return None
+
+    def _pop(self, waiter):
+        tenants = self._queues[waiter.priority]
+        waiters = tenants[waiter.tenant]
+        waiters.popleft()
+        # Rotate the tenant to the back so the next tenant goes first
+        del tenants[waiter.tenant]
+        if waiters:
+            tenants[waiter.tenant] = waiters
+
+    def _publish(self):
+        for priority, name in PRIORITY_NAMES.items():
+            depth = sum(len(waiters) for waiters in self._queues[priority].values())
+            metrics.set_gauge(f"{self.metric_prefix}_queue_{name}", depth)
+
+    def _pump(self):
+        """Grant as many waiters as the limiter and rate budget allow"""
+        while True:
+            waiter = self._peek()
+            if waiter is None:
+                break
+            if not self.limiter.try_acquire(self._reserved_slots(waiter.priority)):
+                break
+            if self.bucket is not None and not self.bucket.try_take(self._reserved_tokens(waiter.priority)):
+                self.limiter.release(notify=False)
+                self._schedule_retry(self.bucket.wait_time(self._reserved_tokens(waiter.priority)))
+                break
+            self._pop(waiter)
+            name = PRIORITY_NAMES[waiter.priority]
+            metrics.observe(f"{self.metric_prefix}_wait_seconds_{name}", time.monotonic() - waiter.queued_at)
+            waiter.future.set_result(True)
+        self._publish()
+
+    def _schedule_retry(self, delay):
+        """Re-run the pump once the rate bucket has refilled"""
+        if self._timer is not None and not self._timer.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def _fire():
+            self._timer = None
+            self._pump()
+
+        self._timer = loop.call_later(max(delay, 0.01), _fire)
+
+    # ==================== SLOTS ====================
+    async def acquire(self, priority=INTERACTIVE, tenant=DEFAULT_TENANT):
+        """Wait for this request's turn and take a slot"""
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(future, priority, tenant)
+        self._queues[priority].setdefault(tenant, deque()).append(waiter)
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled - hand the slot back
+                self.release()
+            self._publish()
+            raise
+
+    def release(self):
+        self.limiter.release()
+
+    @asynccontextmanager
+    async def slot(self, priority=INTERACTIVE, tenant=DEFAULT_TENANT):
+        """async with scheduler.slot(BATCH, tenant): ..."""
+        await self.acquire(priority, tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queue_depths(self):
+        """Waiting requests per priority class name"""
+        return {
+            name: sum(len(waiters) for waiters in self._queues[priority].values())
+            for priority, name in PRIORITY_NAMES.items()
+        }
@@ -0,0 +1,152 @@
+"""
+Session Memory
+Byte-budgeted storage for what a long session piles up - versions it has generated or
+opened, profiler dumps. Values are kept pickled, zlib-compressed above
+COMPRESS_MIN_BYTES, in least-recently-used order; once a session is over its budget the
+oldest entries go. Versions live in the result store anyway, so an evicted one costs a
+store round trip the next time it's opened, not the version.
+
+Every session's size is published to the metrics - per session as a histogram, per
+process as gauges - so session memory per pod can be planned for. State values are sized
+when they show up or change, not pickled again on every rerun.
+"""
+
+import os
+import pickle
+import sys
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+
+from metrics import metrics
+
+SESSION_MEMORY_BYTES = int(os.environ.get("SESSION_MEMORY_BYTES", str(512 * 1024)))
+# Smaller values aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+# Key, OrderedDict node and tuple per entry, on top of the payload
+ENTRY_OVERHEAD = 160
+
+_live = weakref.WeakSet()
+_live_lock = threading.Lock()
+
+
+class SessionMemory:
+    """One session's LRU store - get() with a loader refetches what was evicted"""
+
+    def __init__(self, budget=SESSION_MEMORY_BYTES):
+        self.budget = budget
+        self.nbytes = 0
+        self.raw_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # Session state key -> (value, length, bytes) as last sized
+        self._state_sizes = {}
+        with _live_lock:
+            _live.add(self)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, value):
+        """Store a value (anything picklable) - returns False if it alone is over the budget"""
+        self.pop(key)
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        blob = zlib.compress(raw, COMPRESS_LEVEL) if len(raw) >= COMPRESS_MIN_BYTES else raw
+        size = len(blob) + ENTRY_OVERHEAD
+        if size > self.budget:
+            metrics.inc("session_memory_oversize_total")
+            return False
+        self._entries[key] = (blob, blob is not raw, size, len(raw))
+        self.nbytes += size
+        self.raw_bytes += len(raw) + ENTRY_OVERHEAD
+        while self.nbytes > self.budget:
+            self._evict()
+        return True
+
+    def get(self, key, loader=None):
+        """The stored value, most recently used from now on. On a miss, loader() (if given) is stored and returned"""
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.inc("session_memory_misses_total")
+            if loader is None:
+                return None
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+            return value
+        self._entries.move_to_end(key)
+        metrics.inc("session_memory_hits_total")
+        blob, compressed = entry[0], entry[1]
+        return pickle.loads(zlib.decompress(blob) if compressed else blob)
+
+    def pop(self, key):
+        """Forget a key (stale after an update elsewhere)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+            self.raw_bytes -= entry[3] + ENTRY_OVERHEAD
+
+    def _evict(self):
+        key = next(iter(self._entries))
+        self.pop(key)
+        self.evictions += 1
+        metrics.inc("session_memory_evictions_total")
+
+    def state_bytes(self, state):
+        """
+        Approximate bytes held by the session state mapping this memory belongs to. A value is
+        pickled again only when it was replaced or its length changed since the last call.
+        """
+        sizes = {}
+        total = 0
+        for key in state:
+            value = state[key]
+            if isinstance(value, SessionMemory):
+                total += value.nbytes
+                continue
+            length = _length(value)
+            known = self._state_sizes.get(key)
+            if known is not None and known[0] is value and known[1] == length:
+                size = known[2]
+            else:
+                size = _value_bytes(value)
+            sizes[key] = (value, length, size)
+            total += size
+        self._state_sizes = sizes
+        return total
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.nbytes, 'budget': self.budget,
+                'raw_bytes': self.raw_bytes, 'ratio': self.raw_bytes / self.nbytes if self.nbytes else 1.0,
+                'evictions': self.evictions}
+
+
+def _length(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _value_bytes(value):
+    """Pickled size of a state value, sys.getsizeof when it can't be pickled"""
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def track_session(state, memory):
+    """Publish one session's size after a rerun, and the totals of every live session in the process"""
+    size = memory.state_bytes(state)
+    metrics.observe("session_state_bytes", size)
+    with _live_lock:
+        memories = list(_live)
+    metrics.set_gauge("session_memory_sessions", len(memories))
+    metrics.set_gauge("session_memory_bytes", sum(memory.nbytes for memory in memories))
+    return size
@@ -0,0 +1,265 @@
+"""
+Near-Duplicate Detection
+MinHash signatures over word shingles with LSH banding, vectorized with NumPy,
+so generated descriptions can be checked against every other listing in the portfolio.
+
+    python similarity.py listings.csv --column Description --threshold 0.8
+"""
+
+import argparse
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8
+# Members of one LSH bucket paired exhaustively - larger buckets are sampled down to this
+MAX_BUCKET = 128
+# Distinct words whose hashes are kept between documents - the cache starts over past this
+WORD_CACHE_SIZE = 200_000
+
+_WORD_RE = re.compile(r"[a-z0-9₹]+")
+# Odd 64-bit multipliers used to fold a shingle's word hashes into one value
+_SHINGLE_MULTIPLIERS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD],
+    dtype=np.uint64
+)
+
+
+class SimilarityIndex:
+    """MinHash index over generated descriptions"""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        # Multiply-shift universal hashing: ((a * x + b) mod 2^64) >> 32, a odd
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_weights = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        # What a text without any words hashes to - never a duplicate of anything
+        self._empty_signature = self.signature('')
+
+        self._word_hashes = {}
+        self._keys = []
+        self._positions = {}
+        # Per band: bucket value -> positions of the signatures in it
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    # ==================== SIGNATURES ====================
+    def _hash_words(self, words):
+        """64-bit hash per word, cached across documents (up to WORD_CACHE_SIZE words)"""
+        cache = self._word_hashes
+        if len(cache) > WORD_CACHE_SIZE:
+            cache.clear()
+        hashes = np.empty(len(words), dtype=np.uint64)
+        for position, word in enumerate(words):
+            value = cache.get(word)
+            if value is None:
+                value = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+                cache[word] = value
+            hashes[position] = value
+        return hashes
+
+    def _shingles(self, text):
+        """Hashes of every k-word shingle in the text"""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return np.zeros(1, dtype=np.uint64)
+        word_hashes = self._hash_words(words)
+        size = min(self.shingle_size, len(words))
+        count = len(words) - size + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            shingles ^= word_hashes[offset:offset + count] * _SHINGLE_MULTIPLIERS[offset]
+        return np.unique(shingles)
+
+    def signature(self, text):
+        """MinHash signature (num_perm uint32 values) of a text"""
+        shingles = self._shingles(text)
+        hashed = (shingles[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def signatures(self, texts):
+        """Signatures for many texts, one row each"""
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for row, text in enumerate(texts):
+            result[row] = self.signature(text)
+        return result
+
+    def _band_hashes(self, signatures):
+        """LSH bucket value of every band, one row per signature"""
+        blocks = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (blocks * self._band_weights[None, None, :]).sum(axis=2)
+
+    def _is_empty(self, signature):
+        return np.array_equal(signature, self._empty_signature)
+
+    # ==================== INDEX ====================
+    def add(self, key, text):
+        """Index a description under key, replacing any earlier text for the same key"""
+        self.add_signatures([key], self.signature(text)[None, :])
+
+    def add_many(self, keys, texts):
+        """Index many descriptions at once"""
+        self.add_signatures(list(keys), self.signatures(list(texts)))
+
+    def add_signatures(self, keys, signatures):
+        """Index precomputed signatures"""
+        band_hashes = self._band_hashes(signatures)
+        with self._lock:
+            for key, signature, bands in zip(keys, signatures, band_hashes):
+                position = self._positions.get(key)
+                if position is not None:
+                    self._unbucket(position)
+                else:
+                    if self._count == len(self._signatures):
+                        capacity = max(1024, len(self._signatures) * 2)
+                        grown = np.empty((capacity, self.num_perm), dtype=np.uint32)
+                        grown[:self._count] = self._signatures[:self._count]
+                        self._signatures = grown
+                    position = self._count
+                    self._count += 1
+                    self._keys.append(key)
+                    self._positions[key] = position
+                self._signatures[position] = signature
+                if not self._is_empty(signature):
+                    for buckets, value in zip(self._buckets, bands.tolist()):
+                        buckets.setdefault(value, set()).add(position)
+
+    def _unbucket(self, position):
+        """Take a signature that is about to be replaced out of its buckets"""
+        old = self._signatures[position]
+        if self._is_empty(old):
+            return
+        for buckets, value in zip(self._buckets, self._band_hashes(old[None, :])[0].tolist()):
+            members = buckets.get(value)
+            if members is not None:
+                members.discard(position)
+                if not members:
+                    del buckets[value]
+
+    def query(self, text, threshold=DUPLICATE_THRESHOLD, exclude=None):
+        """
+        Indexed keys whose estimated Jaccard similarity to text is >= threshold, most similar first.
+        Only texts sharing an LSH bucket with it are compared, so the cost follows the number of
+        candidates rather than the size of the index - at thresholds well under the default some
+        matches near the threshold can be missed.
+        """
+        signature = self.signature(text)
+        if self._is_empty(signature):
+            return []
+        bands = self._band_hashes(signature[None, :])[0].tolist()
+        with self._lock:
+            candidates = set()
+            for buckets, value in zip(self._buckets, bands):
+                candidates.update(buckets.get(value, ()))
+            if not candidates:
+                return []
+            candidates = np.sort(np.fromiter(candidates, dtype=np.int64, count=len(candidates)))
+            stored = self._signatures[candidates]
+            keys = [self._keys[index] for index in candidates]
+
+        similarity = (stored == signature[None, :]).mean(axis=1)
+        hits = np.nonzero(similarity >= threshold)[0]
+        hits = hits[np.argsort(-similarity[hits], kind='stable')]
+        return [(keys[index], float(similarity[index])) for index in hits if keys[index] != exclude]
+
+    def near_duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """
+        Every pair of indexed descriptions at or above threshold as (key_a, key_b, similarity).
+        LSH banding finds candidate pairs, signatures confirm them - no full n^2 comparison.
+        Texts with identical signatures are collapsed first: each copy is reported once against
+        the first key with that signature, and pairs between groups use those first keys.
+        Empty texts are skipped. A bucket over MAX_BUCKET members is sampled, so a large cluster
+        of near copies reports a sample of its pairs rather than all n^2.
+        """
+        with self._lock:
+            signatures = self._signatures[:self._count].copy()
+            keys = list(self._keys)
+        rows = np.flatnonzero((signatures != self._empty_signature[None, :]).any(axis=1))
+        if len(rows) < 2:
+            return []
+
+        # One representative (the first row) per distinct signature
+        _, first, inverse = np.unique(signatures[rows], axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        representatives = rows[first]
+        pairs = [(keys[representatives[group]], keys[row], 1.0)
+                 for row, group in zip(rows, inverse) if row != representatives[group]]
+
+        signatures = signatures[representatives]
+        count = len(representatives)
+        rng = np.random.default_rng(0)
+        codes = np.empty(0, dtype=np.int64)
+        band_hashes = self._band_hashes(signatures)
+        for band in range(self.bands):
+            bucket = band_hashes[:, band]
+
+            order = np.argsort(bucket, kind='stable')
+            sorted_buckets = bucket[order]
+            # Boundaries of runs of equal bucket values
+            starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+            sizes = np.diff(np.r_[starts, count])
+            band_codes = []
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                members = order[start:start + size]
+                if size > MAX_BUCKET:
+                    members = rng.choice(members, MAX_BUCKET, replace=False)
+                members = np.sort(members).astype(np.int64)
+                left, right = np.triu_indices(len(members), k=1)
+                band_codes.append(members[left] * count + members[right])
+            if band_codes:
+                codes = np.union1d(codes, np.concatenate(band_codes))
+
+        left, right = codes // count, codes % count
+        similarity = (signatures[left] == signatures[right]).mean(axis=1)
+        keep = similarity >= threshold
+        pairs.extend(
+            (keys[representatives[a]], keys[representatives[b]], float(score))
+            for a, b, score in zip(left[keep], right[keep], similarity[keep])
+        )
+        return pairs
+
+
+# Shared across sessions so every listing is checked against the whole portfolio
+description_index = SimilarityIndex()
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Flag near-duplicate descriptions in a CSV export")
+    parser.add_argument("csv")
+    parser.add_argument("--column", default="Description")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+
+    frame = pd.read_csv(args.csv)
+    index = SimilarityIndex()
+    started = time.time()
+    index.add_many(frame.index.astype(str), frame[args.column].fillna('').astype(str))
+    indexed = time.time()
+    pairs = index.near_duplicates(args.threshold)
+    finished = time.time()
+
+    for key_a, key_b, score in sorted(pairs, key=lambda pair: -pair[2]):
+        print(f"rows {key_a} and {key_b}: {score:.0%} similar")
+    print(f"\n{len(frame)} descriptions indexed in {indexed - started:.2f}s, "
+          f"{len(pairs)} near-duplicate pairs found in {finished - indexed:.2f}s")
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Keep the stores the modules open at import time out of the user's ~/.airent
+_scratch = tempfile.mkdtemp(prefix="airent-tests-")
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(_scratch, "history.db"))
+os.environ.setdefault("TRANSLATION_DB_PATH", os.path.join(_scratch, "translations.db"))
+os.environ.setdefault("RESULT_STORE_DIR", os.path.join(_scratch, "results"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from async_engine import get_engine
+from feed_pipeline import FeedPipeline, normalize_row, read_feed
+from mock_groq import start_mock_server
+
+ROW = {
+    'property_type': 'flat', 'bhk': '2 BHK', 'area_sqft': 900, 'city': 'Pune', 'locality': 'Baner',
+    'rent_amount': 25000, 'deposit_amount': 100000, 'furnishing_status': 'semi-furnished',
+    'preferred_tenants': ['Family'], 'amenities': ['Gym', 'Lift'], 'nearby_points': ['Metro Station'],
+    'available_from': '2026-11-01',
+}
+
+
+def _write_jsonl(path, rows):
+    with open(path, 'w', encoding='utf-8') as feed:
+        for row in rows:
+            feed.write(json.dumps(row) + '\n')
+
+
+def _rows(path):
+    return [row for chunk in read_feed(str(path)) for row in chunk.to_dict('records')]
+
+
+def test_jsonl_missing_field_is_rejected(tmp_path):
+    path = tmp_path / 'feed.jsonl'
+    without_locality = {key: value for key, value in ROW.items() if key != 'locality'}
+    _write_jsonl(path, [ROW, without_locality])
+
+    first, second = _rows(path)
+    assert normalize_row(first)['locality'] == 'Baner'
+    with pytest.raises(ValueError, match='locality'):
+        normalize_row(second)
+
+
+def test_jsonl_lists_become_sets(tmp_path):
+    path = tmp_path / 'feed.jsonl'
+    _write_jsonl(path, [dict(ROW, landmark=None)])
+
+    property_data = normalize_row(_rows(path)[0])
+    assert property_data['amenities'] == ['Gym', 'Lift']
+    assert property_data['nearby_points'] == ['Metro Station']
+    assert property_data['preferred_tenants'] == 'Family'
+    assert property_data['landmark'] == ''
+
+
+def test_jsonl_feed_run_rejects_incomplete_rows(tmp_path):
+    source, output = tmp_path / 'feed.jsonl', tmp_path / 'out.jsonl'
+    _write_jsonl(source, [ROW, {key: value for key, value in ROW.items() if key != 'locality'}])
+
+    server = start_mock_server(time_scale=0.01)
+    engine = get_engine()
+    api_url, engine.api_url = engine.api_url, server.url
+    try:
+        summary = FeedPipeline(str(source), str(output), "mock-key", use_history=False,
+                               record_history=False).run()
+    finally:
+        engine.api_url = api_url
+        server.shutdown()
+
+    rows = {row['row']: row for row in map(json.loads, output.read_text().splitlines())}
+    assert summary['rows'] == 2
+    assert rows[1]['source'] == 'generated'
+    assert 'locality' in rows[2]['error']
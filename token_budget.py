@@ -0,0 +1,97 @@
+"""
+Output Token Budget
+Sets max_tokens per prompt version and variation from the completion sizes Groq reports in `usage`.
+"""
+
+import math
+import threading
+from collections import deque
+
+DEFAULT_MAX_TOKENS = 2000
+
+
+class TokenBudget:
+    """Tracks completion_tokens per (prompt version, variation) and sizes max_tokens from them"""
+
+    def __init__(self, default=DEFAULT_MAX_TOKENS, floor=400, ceiling=DEFAULT_MAX_TOKENS,
+                 headroom=1.25, window=100, min_samples=5):
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.window = window
+        self._completions = {}
+        self._truncations = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def max_tokens(self, key):
+        """max_tokens to request for this key - the default until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._completions.get(key, ()))
+            truncations = self._truncations.get(key, 0)
+
+        if len(samples) < self.min_samples:
+            return self.default
+
+        p95 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)]
+        # Every truncation observed widens the margin for this key
+        budget = int(p95 * (self.headroom + 0.25 * truncations))
+        return max(self.floor, min(self.ceiling, budget))
+
+    def mean_completion(self, key):
+        """Average completion_tokens seen for this key, or None before any sample"""
+        with self._lock:
+            samples = self._completions.get(key)
+            if not samples:
+                return None
+            return sum(samples) / len(samples)
+
+    def record(self, key, usage, latency=None, truncated=False):
+        """Record the usage block of a completed call"""
+        usage = usage or {}
+        completion = usage.get('completion_tokens')
+        with self._lock:
+            if completion and not truncated:
+                self._completions.setdefault(key, deque(maxlen=self.window)).append(completion)
+            if truncated:
+                self._truncations[key] = self._truncations.get(key, 0) + 1
+
+            totals = self._totals.setdefault(key, {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latency': 0.0, 'truncated': 0
+            })
+            totals['calls'] += 1
+            totals['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            totals['completion_tokens'] += usage.get('completion_tokens', 0)
+            totals['latency'] += latency or 0.0
+            totals['truncated'] += 1 if truncated else 0
+
+    def stats(self):
+        """Per-key averages plus the max_tokens currently in use"""
+        with self._lock:
+            totals = {key: dict(value) for key, value in self._totals.items()}
+
+        report = {}
+        for key, value in totals.items():
+            calls = value['calls'] or 1
+            report[key] = {
+                'calls': value['calls'],
+                'avg_prompt_tokens': value['prompt_tokens'] / calls,
+                'avg_completion_tokens': value['completion_tokens'] / calls,
+                'avg_latency': value['latency'] / calls,
+                'truncated': value['truncated'],
+                'max_tokens': self.max_tokens(key),
+            }
+        return report
+
+    def reset(self):
+        """Forget all observations"""
+        with self._lock:
+            self._completions.clear()
+            self._truncations.clear()
+            self._totals.clear()
+
+
+# Shared by every generation call in this process
+token_budget = TokenBudget()
@@ -0,0 +1,278 @@
+"""
+Listing Translation
+Translates a generated English listing into several Indian languages in one completion
+(all languages at once, not one call per language). Short recurring phrases - bullet
+points, keywords, amenity and nearby-point names - are cached per language on disk with
+their numbers masked ("Monthly rent: ₹{0}"), so they are only ever sent once.
+"""
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from async_engine import get_engine, parse_json_content, retry_delay
+from metrics import metrics
+from providers import DEFAULT_PROVIDER, EDIT_MODEL
+from quota import CHARS_PER_TOKEN, QuotaExceeded
+from scheduler import DEFAULT_TENANT, ENHANCEMENT
+
+LANGUAGES = {
+    'hi': "Hindi (हिन्दी)",
+    'mr': "Marathi (मराठी)",
+    'ta': "Tamil (தமிழ்)",
+    'te': "Telugu (తెలుగు)",
+    'kn': "Kannada (ಕನ್ನಡ)",
+    'bn': "Bengali (বাংলা)",
+    'gu': "Gujarati (ગુજરાતી)",
+    'ml': "Malayalam (മലയാളം)",
+    'pa': "Punjabi (ਪੰਜਾਬੀ)",
+}
+
+TRANSLATION_DB_PATH = os.environ.get("TRANSLATION_DB_PATH",
+                                     os.path.join(os.path.expanduser("~"), ".airent", "translations.db"))
+# Translated fields sent whole on every call
+TEXT_FIELDS = ('title', 'teaser_text', 'full_description', 'meta_title', 'meta_description')
+# Listing lists translated phrase by phrase through the cache
+PHRASE_FIELDS = ('bullet_points', 'seo_keywords')
+DATA_PHRASE_FIELDS = ('amenities', 'nearby_points')
+# Indic scripts cost roughly this many times the tokens of the English source
+TOKEN_EXPANSION = 3.0
+MAX_COMPLETION_TOKENS = 8000
+# In-memory phrases kept in front of the database
+MEMORY_PHRASES = 50000
+
+_NUMBER = re.compile(r'\d[\d,.]*\d|\d')
+_PLACEHOLDER = re.compile(r'\{(\d+)\}')
+
+
+def mask_numbers(text):
+    """'Monthly rent: ₹25,000' -> ('Monthly rent: ₹{0}', ['25,000'])"""
+    numbers = []
+
+    def _mask(match):
+        numbers.append(match.group(0))
+        return '{' + str(len(numbers) - 1) + '}'
+
+    return _NUMBER.sub(_mask, text.replace('{', '(').replace('}', ')')), numbers
+
+
+def unmask_numbers(template, numbers):
+    """Put masked numbers back - None when the translation lost or invented a placeholder"""
+    found = sorted(int(index) for index in _PLACEHOLDER.findall(template))
+    if found != list(range(len(numbers))):
+        return None
+    return _PLACEHOLDER.sub(lambda match: numbers[int(match.group(1))], template)
+
+
+class PhraseCache:
+    """(language, masked phrase) -> translation, in memory over SQLite"""
+
+    def __init__(self, path=TRANSLATION_DB_PATH):
+        self.path = path
+        self._memory = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS phrases (lang TEXT NOT NULL, phrase TEXT NOT NULL, translation TEXT NOT NULL, "
+            "PRIMARY KEY (lang, phrase)) WITHOUT ROWID"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, lang, phrases):
+        """Cached translations of the phrases that have one"""
+        found = {}
+        missing = []
+        for phrase in phrases:
+            value = self._memory.get((lang, phrase))
+            if value is None:
+                missing.append(phrase)
+            else:
+                found[phrase] = value
+        if missing:
+            try:
+                placeholders = ','.join('?' * len(missing))
+                rows = self._connect().execute(
+                    f"SELECT phrase, translation FROM phrases WHERE lang = ? AND phrase IN ({placeholders})",
+                    [lang] + missing
+                ).fetchall()
+            except sqlite3.Error:
+                metrics.inc("translation_cache_errors_total")
+                rows = []
+            for phrase, translation in rows:
+                found[phrase] = translation
+                self._remember(lang, phrase, translation)
+        metrics.inc("translation_cache_hits_total", len(found))
+        metrics.inc("translation_cache_misses_total", len(phrases) - len(found))
+        return found
+
+    def put_many(self, lang, translations):
+        for phrase, translation in translations.items():
+            self._remember(lang, phrase, translation)
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO phrases (lang, phrase, translation) VALUES (?, ?, ?)",
+                                 [(lang, phrase, translation) for phrase, translation in translations.items()])
+        except sqlite3.Error:
+            metrics.inc("translation_cache_errors_total")
+
+    def _remember(self, lang, phrase, translation):
+        with self._lock:
+            if len(self._memory) >= MEMORY_PHRASES:
+                self._memory.clear()
+            self._memory[(lang, phrase)] = translation
+
+
+# Shared by every session and batch job in this process
+phrase_cache = PhraseCache()
+
+
+# ==================== PROMPT ====================
+def _source_phrases(result, property_data):
+    """Every phrase-level string of a listing, masked, in a stable order without repeats"""
+    texts = [text for field in PHRASE_FIELDS for text in result.get(field) or ()]
+    texts += [text for field in DATA_PHRASE_FIELDS for text in (property_data or {}).get(field) or ()]
+    phrases = []
+    for text in texts:
+        if isinstance(text, str) and text.strip():
+            phrase = mask_numbers(text.strip())[0]
+            if phrase not in phrases:
+                phrases.append(phrase)
+    return phrases
+
+
+def translation_messages(result, phrases, languages):
+    """(system, user) messages asking for every language in one JSON object"""
+    targets = ', '.join(f"{code} ({LANGUAGES[code]})" for code in languages)
+    source = {'fields': {field: result.get(field, '') for field in TEXT_FIELDS}, 'phrases': phrases}
+    system = ("You translate Indian rental listings for local readers. Keep numbers, ₹ amounts, placeholders like {0} "
+              "and proper names of places, buildings and brands unchanged. Return only valid JSON.")
+    user = (f"Translate into: {targets}.\n"
+            f"Return a JSON object keyed by language code, each value shaped like the source: "
+            f"{{\"fields\": {{same keys}}, \"phrases\": [same order, same length]}}.\n"
+            f"Source:\n{json.dumps(source, ensure_ascii=False)}")
+    return system, user
+
+
+def _assemble(result, property_data, fields, phrase_map):
+    """Translated listing from its text fields and the per-phrase translations"""
+    translated = {field: fields.get(field) or result.get(field, '') for field in TEXT_FIELDS}
+
+    def _phrase(text):
+        phrase, numbers = mask_numbers(text.strip())
+        template = phrase_map.get(phrase)
+        value = unmask_numbers(template, numbers) if template else None
+        return value if value is not None else text
+
+    for field in PHRASE_FIELDS:
+        translated[field] = [_phrase(text) for text in result.get(field) or ()]
+    for field in DATA_PHRASE_FIELDS:
+        if (property_data or {}).get(field):
+            translated[field] = [_phrase(text) for text in property_data[field]]
+    return translated
+
+
+# ==================== TRANSLATION ====================
+async def translate_async(engine, result, property_data, languages, api_key, retry_count=3,
+                          priority=ENHANCEMENT, tenant=DEFAULT_TENANT):
+    """
+    {language code: translated listing} for one English result - a single completion covers
+    every language (split in halves only if it runs out of tokens). Missing languages failed.
+    """
+    languages = [code for code in dict.fromkeys(languages) if code in LANGUAGES]
+    if not languages or not result:
+        return {}
+    phrases = _source_phrases(result, property_data)
+    cached = {code: phrase_cache.get_many(code, phrases) for code in languages}
+    # A phrase is sent if any requested language is still missing it
+    uncached = [phrase for phrase in phrases if any(phrase not in cached[code] for code in cached)]
+
+    system, user = translation_messages(result, uncached, languages)
+    source_tokens = len(user) / CHARS_PER_TOKEN
+    max_tokens = min(MAX_COMPLETION_TOKENS, int(source_tokens * TOKEN_EXPANSION * len(languages)) + 200)
+
+    for attempt in range(retry_count):
+        try:
+            response = await engine.post({
+                "model": EDIT_MODEL,
+                "messages": [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user}
+                ],
+                "temperature": 0.2,
+                "max_tokens": max_tokens
+            }, api_key, priority=priority, tenant=tenant)
+
+            if response.status_code == 200:
+                choice = response.json()['choices'][0]
+                if choice.get('finish_reason') == 'length' and len(languages) > 1:
+                    # Too much for one completion - do each half of the languages separately
+                    metrics.inc("translation_splits_total")
+                    middle = len(languages) // 2
+                    halves = await asyncio.gather(*(
+                        translate_async(engine, result, property_data, half, api_key, retry_count, priority, tenant)
+                        for half in (languages[:middle], languages[middle:])
+                    ))
+                    return {**halves[0], **halves[1]}
+                translated = parse_json_content(choice['message']['content'])
+                break
+            elif response.status_code == 429 and attempt < retry_count - 1:
+                await asyncio.sleep(retry_delay(response, attempt))
+                continue
+            return {}
+
+        except asyncio.CancelledError:
+            raise
+        except QuotaExceeded:
+            return {}
+        except Exception:
+            if attempt < retry_count - 1:
+                await asyncio.sleep(2)
+                continue
+            return {}
+    else:
+        return {}
+
+    if not isinstance(translated, dict):
+        metrics.inc("translation_missing_total", len(languages))
+        return {}
+    output = {}
+    for code in languages:
+        block = translated.get(code)
+        if not isinstance(block, dict):
+            metrics.inc("translation_missing_total")
+            continue
+        phrase_map = dict(cached[code])
+        returned = block.get('phrases')
+        if isinstance(returned, list) and len(returned) == len(uncached):
+            # Only translations that kept every number placeholder are reusable
+            fresh = {phrase: text for phrase, text in zip(uncached, returned)
+                     if isinstance(text, str) and phrase not in phrase_map
+                     and sorted(_PLACEHOLDER.findall(text)) == sorted(_PLACEHOLDER.findall(phrase))}
+            phrase_cache.put_many(code, fresh)
+            phrase_map.update(fresh)
+        fields = block.get('fields')
+        output[code] = _assemble(result, property_data, fields if isinstance(fields, dict) else {}, phrase_map)
+    metrics.inc("translation_languages_total", len(output))
+    return output
+
+
+def translate_result(result, property_data, languages, api_key=None, provider=DEFAULT_PROVIDER, timeout=None):
+    """Blocking translate_async on a provider's engine"""
+    engine = get_engine(provider)
+    try:
+        return engine.run(translate_async(engine, result, property_data, languages, api_key), timeout)
+    except TimeoutError:
+        return {}
@@ -0,0 +1,145 @@
+"""
+Output Validation
+Checks generated listings against the prompt's hard rules and fixes the cheap violations locally.
+"""
+
+META_TITLE_LIMIT = 60
+META_DESCRIPTION_LIMIT = 160
+BULLET_COUNT = 5
+KEYWORD_COUNT = 5
+TITLE_WORDS = (8, 12)
+BANNED_OPENERS = ('discover', 'welcome')
+
+TEXT_FIELDS = ('title', 'teaser_text', 'full_description', 'meta_title', 'meta_description')
+LIST_FIELDS = ('bullet_points', 'seo_keywords')
+
+# Every rule checked by validate_result, used as the score denominator
+RULES = (
+    'missing', 'meta_title_length', 'meta_description_length',
+    'bullet_count', 'keyword_count', 'title_words', 'title_opener'
+)
+
+
+def _violation(field, rule, message):
+    return {'field': field, 'rule': rule, 'message': message}
+
+
+def truncate_at_word(text, limit):
+    """Shorten text to fewer than `limit` characters without cutting a word"""
+    text = ' '.join(text.split())
+    if len(text) < limit:
+        return text
+    cut = text[:limit - 1]
+    if ' ' in cut and text[limit - 1] != ' ':
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;:-–|')
+
+
+# ==================== VALIDATION ====================
+def validate_result(result):
+    """Return the list of rule violations in a generated listing (empty when clean)"""
+    violations = []
+
+    for field in TEXT_FIELDS:
+        if not isinstance(result.get(field), str) or not result[field].strip():
+            violations.append(_violation(field, 'missing', f"{field} is missing"))
+    for field in LIST_FIELDS:
+        if not isinstance(result.get(field), list) or not result[field]:
+            violations.append(_violation(field, 'missing', f"{field} is missing"))
+
+    meta_title = result.get('meta_title')
+    if isinstance(meta_title, str) and len(meta_title) >= META_TITLE_LIMIT:
+        violations.append(_violation('meta_title', 'meta_title_length',
+                                     f"meta title is {len(meta_title)} chars (limit {META_TITLE_LIMIT})"))
+
+    meta_description = result.get('meta_description')
+    if isinstance(meta_description, str) and len(meta_description) >= META_DESCRIPTION_LIMIT:
+        violations.append(_violation('meta_description', 'meta_description_length',
+                                     f"meta description is {len(meta_description)} chars (limit {META_DESCRIPTION_LIMIT})"))
+
+    bullets = result.get('bullet_points')
+    if isinstance(bullets, list) and bullets and len(bullets) != BULLET_COUNT:
+        violations.append(_violation('bullet_points', 'bullet_count',
+                                     f"{len(bullets)} bullet points (need exactly {BULLET_COUNT})"))
+
+    keywords = result.get('seo_keywords')
+    if isinstance(keywords, list) and keywords and len(keywords) != KEYWORD_COUNT:
+        violations.append(_violation('seo_keywords', 'keyword_count',
+                                     f"{len(keywords)} SEO keywords (need exactly {KEYWORD_COUNT})"))
+
+    title = result.get('title')
+    if isinstance(title, str) and title.strip():
+        words = title.split()
+        if not TITLE_WORDS[0] <= len(words) <= TITLE_WORDS[1]:
+            violations.append(_violation('title', 'title_words',
+                                         f"title has {len(words)} words (need {TITLE_WORDS[0]}-{TITLE_WORDS[1]})"))
+        if words[0].lower().strip('!,.:') in BANNED_OPENERS:
+            violations.append(_violation('title', 'title_opener', f"title starts with \"{words[0]}\""))
+
+    return violations
+
+
+def score_result(result):
+    """Share of rules passed, 1.0 for a fully compliant listing"""
+    failed = {(violation['field'], violation['rule']) for violation in validate_result(result)}
+    # 'missing' is checked once per field, every other rule once
+    total = len(TEXT_FIELDS) + len(LIST_FIELDS) + len(RULES) - 1
+    return max(0.0, 1 - len(failed) / total)
+
+
+# ==================== LOCAL REPAIR ====================
+def _strip_opener(title):
+    """Drop a banned first word ("Discover", "Welcome to") from a title"""
+    words = title.split()
+    if words and words[0].lower().strip('!,.:') in BANNED_OPENERS:
+        words = words[1:]
+        # "Welcome to ..." -> "..."
+        if words and words[0].lower() == 'to':
+            words = words[1:]
+    if not words:
+        return title
+    return ' '.join([words[0][:1].upper() + words[0][1:]] + words[1:])
+
+
+def repair_locally(result):
+    """
+    Fix violations that don't need the model.
+    Returns (repaired_result, remaining_violations).
+    """
+    repaired = dict(result)
+
+    if isinstance(repaired.get('meta_title'), str):
+        repaired['meta_title'] = truncate_at_word(repaired['meta_title'], META_TITLE_LIMIT)
+    if isinstance(repaired.get('meta_description'), str):
+        repaired['meta_description'] = truncate_at_word(repaired['meta_description'], META_DESCRIPTION_LIMIT)
+
+    if isinstance(repaired.get('bullet_points'), list) and len(repaired['bullet_points']) > BULLET_COUNT:
+        repaired['bullet_points'] = repaired['bullet_points'][:BULLET_COUNT]
+    if isinstance(repaired.get('seo_keywords'), list) and len(repaired['seo_keywords']) > KEYWORD_COUNT:
+        repaired['seo_keywords'] = repaired['seo_keywords'][:KEYWORD_COUNT]
+
+    title = repaired.get('title')
+    if isinstance(title, str) and title.strip():
+        stripped = _strip_opener(title)
+        # Only keep the local fix when it doesn't break the word count
+        if stripped != title and TITLE_WORDS[0] <= len(stripped.split()) <= TITLE_WORDS[1]:
+            repaired['title'] = stripped
+
+    return repaired, validate_result(repaired)
+
+
+def pad_from_fallback(result, fallback):
+    """Last resort: fill missing fields and short lists from the template output"""
+    padded = dict(result)
+    for field in TEXT_FIELDS:
+        if not isinstance(padded.get(field), str) or not padded[field].strip():
+            padded[field] = fallback[field]
+    for field, count in (('bullet_points', BULLET_COUNT), ('seo_keywords', KEYWORD_COUNT)):
+        items = padded.get(field) if isinstance(padded.get(field), list) else []
+        for item in fallback[field]:
+            if len(items) >= count:
+                break
+            if item not in items:
+                items = items + [item]
+        padded[field] = items[:count]
+    return padded